@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Answers right away, and always dodges: games last the full number of turns
+and nearly all the time is spent in the harness.
+Usage: instant.py name
+   or: py:instant:Instant name (in-process)
+I can play several games in a row (game_over).
+"""
+import sys
+
+
+class Instant:
+    def __init__(self, name):
+        self.name = name
+
+    def action(self):
+        return "dodge"
+
+    def observe(self, action):
+        pass
+
+
+if __name__ == '__main__':
+    print(sys.argv[1], flush=True)
+    print("dodge", flush=True)
+    for line in sys.stdin:
+        if line.strip() == "game_over":
+            print("game_over")
+        print("dodge", flush=True)
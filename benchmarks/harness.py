@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+Harness throughput benchmarks.
+
+    python benchmarks/harness.py [--games N] [--jobs 1,4] [--output FILE]
+    python benchmarks/harness.py --compare before.json after.json
+
+Games are played with the bundled examples and with instant bots (see
+bots/instant.py), through run_game (one game at a time) and run_game_bulk
+(for every worker count). Results are written as JSON, along with the
+commit they were measured on, so that runs can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import showdown
+from showdown import game
+from showdown.bulk import run_game_bulk
+from showdown.metrics import Histogram
+
+BOTS_DIR = pathlib.Path(__file__).resolve().parent / "bots"
+EXAMPLES_DIR = pathlib.Path(showdown.__file__).resolve().parent / "examples"
+
+# Plugins from bots/ are found by their module name
+sys.path.insert(0, str(BOTS_DIR))
+
+
+def example(name, *args):
+    return [sys.executable, str(EXAMPLES_DIR / f"{name}.py"), *args]
+
+
+def instant(name):
+    return [sys.executable, str(BOTS_DIR / "instant.py"), name]
+
+
+# name: (call_args_a, call_args_b, options for run_game_bulk)
+MATCHES = {
+    "copycat-vs-randomizer": (
+        example("copycat", "C", "shoot"), example("randomizer", "R"), {}),
+    "shuffler-vs-randomizer": (
+        example("shuffler", "S", "3"), example("randomizer", "R"), {}),
+    "shuffler-vs-randomizer-zygote": (
+        example("shuffler", "S", "3"), example("randomizer", "R"),
+        {"zygote": True}),
+    "instant-vs-instant": (instant("I"), instant("J"), {}),
+    "instant-vs-instant-persistent": (
+        instant("I"), instant("J"), {"persistent": True}),
+    "instant-vs-instant-warm": (instant("I"), instant("J"), {"warm": True}),
+    "instant-vs-instant-plugin": (
+        ["py:instant:Instant", "I"], ["py:instant:Instant", "J"], {}),
+    "instant-vs-instant-asyncio": (
+        instant("I"), instant("J"), {"engine": "asyncio"}),
+}
+
+# Bots whose time to start and print their name is measured
+SPAWNS = {
+    "instant": instant("I"),
+    "randomizer": example("randomizer", "R"),
+}
+
+
+def bench_spawn(call_args, n):
+    """
+    Time from starting the process to reading the name.
+    """
+    durations = []
+    for __ in range(n):
+        begin = time.perf_counter()
+        contestant = game.Contestant(call_args)
+        contestant.wait_ready()
+        durations.append(time.perf_counter() - begin)
+        contestant.kill()
+    durations.sort()
+    return {
+        "spawn_to_name_p50": durations[len(durations) // 2],
+        "spawn_to_name_max": durations[-1],
+    }
+
+
+def bench_run_game(call_args_a, call_args_b, n):
+    """
+    Games played one after the other in this process.
+    """
+    turns = 0
+    overhead = Histogram()
+    begin = time.perf_counter()
+    for __ in range(n):
+        state = game.run_game(call_args_a, call_args_b)
+        turns += state.num_turn
+        overhead.merge(state.overhead)
+    duration = time.perf_counter() - begin
+    return summarize(n, turns, duration, overhead)
+
+
+def bench_bulk(call_args_a, call_args_b, n, jobs, options):
+    with tempfile.NamedTemporaryFile("r", suffix=".jsonl") as output:
+        begin = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_game_bulk(n, call_args_a, call_args_b, jobs=jobs,
+                          output=output.name, **options)
+        duration = time.perf_counter() - begin
+
+        turns = 0
+        overhead = Histogram()
+        for line in output:
+            record = json.loads(line)
+            turns += record["turns"]
+            overhead.merge(Histogram.from_dict(record["overhead"]))
+    return summarize(n, turns, duration, overhead)
+
+
+def summarize(n, turns, duration, overhead):
+    return {
+        "games": n,
+        "turns": turns,
+        "seconds": duration,
+        "games_per_second": n / duration,
+        "turns_per_second": turns / duration,
+        "overhead_per_turn_p50": overhead.percentile(50),
+        "overhead_per_turn_p99": overhead.percentile(99),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=BOTS_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(games, jobs_list):
+    results = {}
+
+    for name, call_args in SPAWNS.items():
+        print(f"spawn {name}", file=sys.stderr)
+        results[f"spawn/{name}"] = bench_spawn(call_args, games)
+
+    for name, (call_args_a, call_args_b, options) in MATCHES.items():
+        if not options:
+            print(f"run_game {name}", file=sys.stderr)
+            results[f"run_game/{name}"] = bench_run_game(
+                call_args_a, call_args_b, games)
+        for jobs in jobs_list:
+            print(f"bulk {name} jobs={jobs}", file=sys.stderr)
+            results[f"bulk/{name}/jobs={jobs}"] = bench_bulk(
+                call_args_a, call_args_b, games, jobs, options)
+
+    return {
+        "commit": commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "games": games,
+        "results": results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = json.load(before_file)
+        after = json.load(after_file)
+    print(f"{before['commit']} -> {after['commit']}")
+    for name, after_result in after["results"].items():
+        before_result = before["results"].get(name)
+        if not before_result:
+            continue
+        for metric, value in after_result.items():
+            old_value = before_result.get(metric)
+            if metric in ("games", "turns") or not old_value or not value:
+                continue
+            print(f"{name:<50} {metric:<24} "
+                  f"{old_value:>12.6g} {value:>12.6g} "
+                  f"{value / old_value:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=50,
+                        help="games per benchmark (default: 50)")
+    parser.add_argument("--jobs", default=None,
+                        help="comma separated worker counts for bulk "
+                             "(default: 1 and the number of CPUs)")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="result file (default: benchmark.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files")
+    options = parser.parse_args()
+
+    if options.compare:
+        compare(*options.compare)
+        return
+
+    if options.jobs:
+        jobs_list = [int(jobs) for jobs in options.jobs.split(",")]
+    else:
+        jobs_list = sorted({1, multiprocessing.cpu_count()})
+
+    output = os.path.abspath(options.output)
+    # Games write their log files in the current directory
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        results = run(options.games, jobs_list)
+
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
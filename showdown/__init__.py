@@ -1,17 +1,32 @@
+import argparse
 import os
 import pathlib
 import sys
 
-from showdown.ui import run_game_ui
-from showdown.bulk import run_game_bulk
+# Subcommands import what they need when they run: bot scripts import
+# showdown.plugins, which should not pay for the UI and the engines
 
 
 def usage():
     print(f"Usage:")
     print(f"  Run the contest once with graphical output")
-    print(f"       {sys.argv[0]} ui program_a args -vs- program_b args")
+    print(f"       {sys.argv[0]} ui [--record FILE] program_a args -vs- program_b args")
+    print(f"  Show a recorded game (the first one by default)")
+    print(f"       {sys.argv[0]} replay FILE [--game N]")
     print(f"  Run the contest num times and print results")
-    print(f"       {sys.argv[0]} bulk {{num}} program_a args -vs- program_b args")
+    print(f"       {sys.argv[0]} bulk [options] {{num}} program_a args -vs- program_b args")
+    print(f"       (see {sys.argv[0]} bulk --help for options)")
+    print(f"  Play the games of bulk runs started on other machines")
+    print(f"       {sys.argv[0]} worker --listen [HOST:]PORT [--jobs N]")
+    print(f"  Run a tournament between several programs and rank them")
+    print(f"       {sys.argv[0]} tournament [options] program_a args -vs- program_b args -vs- program_c args ...")
+    print(f"       (see {sys.argv[0]} tournament --help for options)")
+    print(f"  Show head-to-head results from a results store")
+    print(f"       {sys.argv[0]} results FILE")
+    print(f"  Simulate num games between probability table strategies")
+    print(f"       {sys.argv[0]} simulate [--seed S] {{num}} strategy_a args -vs- strategy_b args")
+    print(f"  Compute the optimal strategy and save it for the optimal example")
+    print(f"       {sys.argv[0]} solve [--output FILE]")
     print(f"  List example implementations")
     print(f"       {sys.argv[0]} example -l")
     print(f"  Launch an example implementation")
@@ -29,20 +44,373 @@ def split_args(args):
     return args[:index], args[index + 1:]
 
 
+def split_all_args(args):
+    bots = [[]]
+    for arg in args:
+        if arg == "-vs-":
+            bots.append([])
+        else:
+            bots[-1].append(arg)
+    return bots
+
+
+def add_log_level_argument(parser):
+    from showdown.bulk import LOG_LEVEL
+    from showdown.game import LOG_LEVELS
+
+    parser.add_argument(
+        "--log-level", choices=list(LOG_LEVELS), default=LOG_LEVEL,
+        help="what goes to the {bot_a}-vs-{bot_b}.log files: every turn "
+             "(debug, info), the start and end of each game (summary, "
+             "the default) or nothing (off)")
+
+
+def add_limits_arguments(parser):
+    from showdown.game import TIMINGS
+
+    parser.add_argument(
+        "--cpu-limit", metavar="SECONDS", type=int, default=None,
+        help="CPU time after which a bot process is killed")
+    parser.add_argument(
+        "--memory-limit", metavar="MB", type=int, default=None,
+        help="address space a bot process may use")
+    parser.add_argument(
+        "--timing", choices=TIMINGS, default="wall",
+        help="wall: bots have 1 second of wall clock time per turn "
+             "(default), cpu: 1 second of CPU time, within 5 seconds, "
+             "so that they do not lose on time on a busy machine")
+
+
+def add_zygote_argument(parser):
+    parser.add_argument(
+        "--zygote", action="store_true",
+        help="fork Python bot scripts from a process that already imported "
+             "their modules instead of starting the interpreter for every "
+             "game")
+
+
+def limits(options):
+    limits = {}
+    if options.cpu_limit:
+        limits["cpu"] = options.cpu_limit
+    if options.memory_limit:
+        limits["memory"] = options.memory_limit * 1024 * 1024
+    return limits
+
+
+def positive_int(value):
+    """
+    argparse type of an integer of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not at least 1")
+    return number
+
+
+def probability_between(low, high):
+    """
+    argparse type of a float strictly between low and high.
+    """
+    def check(value):
+        try:
+            number = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+        if not low < number < high:
+            raise argparse.ArgumentTypeError(
+                f"{value} is not strictly between {low:g} and {high:g}")
+        return number
+    return check
+
+
+def add_store_argument(parser):
+    parser.add_argument(
+        "--store", metavar="FILE", default=None,
+        help="SQLite database of results: games already played by the "
+             "same bots (same command line and files) are not played "
+             "again, and new games are added to it (see results)")
+
+
 def ui():
-    call_args_a, call_args_b = split_args(sys.argv[1:])
-    run_game_ui(call_args_a, call_args_b)
+    from showdown.ui import run_game_ui
+
+    parser = argparse.ArgumentParser(
+        prog=f"{sys.argv[0]} ui",
+        usage="%(prog)s [options] program_a args -vs- program_b args")
+    parser.add_argument(
+        "--record", metavar="FILE", default=None,
+        help="save the game to a replay file")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(sys.argv[1:])
+
+    call_args_a, call_args_b = split_args(options.args)
+    run_game_ui(call_args_a, call_args_b, record=options.record)
+
+
+def replay():
+    from showdown.replay import ReplayReader
+    from showdown.ui import run_replay_ui
+
+    parser = argparse.ArgumentParser(prog=f"{sys.argv[0]} replay")
+    parser.add_argument("file", help="replay file (see bulk --replay)")
+    parser.add_argument(
+        "--game", "-g", metavar="N", type=int, default=0,
+        help="number of the game in the file, starting at 0")
+    options = parser.parse_args(sys.argv[1:])
+    try:
+        with ReplayReader(options.file) as reader:
+            num_games = len(reader)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    if not 0 <= options.game < num_games:
+        parser.error(f"argument --game/-g: no game {options.game} in "
+                     f"{options.file}, which has {num_games} games"
+                     + (f" (0 to {num_games - 1})" if num_games else ""))
+
+    run_replay_ui(options.file, num_game=options.game)
 
 
 def bulk():
+    from showdown import plugins
+    from showdown.bulk import run_game_bulk
+    from showdown.distributed import TOKEN_VARIABLE
+    from showdown.sprt import SPRT
+
+    parser = argparse.ArgumentParser(
+        prog=f"{sys.argv[0]} bulk",
+        usage="%(prog)s [options] num program_a args -vs- program_b args")
+    parser.add_argument(
+        "--engine", choices=["pool", "asyncio"], default="pool",
+        help="pool: one game per worker process (default), "
+             "asyncio: many games driven by a single event loop")
+    parser.add_argument(
+        "--jobs", "-j", type=positive_int, default=None,
+        help="number of games played at the same time (default: "
+             "one per CPU for the pool engine, 8 per CPU up to 100 "
+             "for asyncio, 64 with --multiplex)")
+    parser.add_argument(
+        "--workers", metavar="HOST:PORT,...", default=None,
+        help="have the games played by these workers (see worker) "
+             "instead of local processes; bot command lines must work "
+             "on every worker")
+    parser.add_argument(
+        "--persistent", action="store_true",
+        help="keep bot processes alive from one game to the next "
+             "(bots must support the game_over command)")
+    parser.add_argument(
+        "--multiplex", action="store_true",
+        help="play the games on threads of a single process, each bot "
+             "playing all its games in one process if it supports it")
+    parser.add_argument(
+        "--warm", action="store_true",
+        help="start the bots of the next game while the current one "
+             "is played")
+    parser.add_argument(
+        "--output", "-o", metavar="FILE", default=None,
+        help="write one JSON record per game to FILE "
+             "('-' for stdout) as games complete")
+    parser.add_argument(
+        "--replay", metavar="FILE", default=None,
+        help="record the games to a replay file (see replay)")
+    parser.add_argument(
+        "--dashboard", action="store_true",
+        help="show the progress of the run in a curses dashboard")
+    add_store_argument(parser)
+    parser.add_argument(
+        "--until-significant", action="store_true",
+        help="stop as soon as one bot is shown to be stronger, or both "
+             "equal (sequential probability ratio tests), num is then "
+             "a maximum")
+    parser.add_argument(
+        "--delta", type=probability_between(0, 0.5), default=0.05,
+        help="with --until-significant, smallest difference that matters: "
+             "a stronger bot wins at least 50%% + DELTA of the games "
+             "(default: 0.05)")
+    parser.add_argument(
+        "--alpha", type=probability_between(0, 1), default=0.05,
+        help="with --until-significant, probability of wrongly deciding "
+             "that a bot is stronger when both are equal (default: 0.05)")
+    parser.add_argument(
+        "--beta", type=probability_between(0, 1), default=0.05,
+        help="with --until-significant, probability of wrongly deciding "
+             "that both are equal when one is stronger (default: 0.05)")
+    add_log_level_argument(parser)
+    add_limits_arguments(parser)
+    add_zygote_argument(parser)
+    parser.add_argument("n", metavar="num", type=int)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(sys.argv[1:])
+    call_args_a, call_args_b = split_args(options.args)
+    if options.engine == "asyncio" and (
+            plugins.is_plugin(call_args_a) or plugins.is_plugin(call_args_b)):
+        parser.error(f"{plugins.PREFIX} bots are only supported by the "
+                     f"pool engine")
+    if options.persistent and options.engine != "pool":
+        parser.error("--persistent is only supported by the pool engine")
+    if options.dashboard and options.output == "-":
+        parser.error("--dashboard and --output - both need the terminal")
+    if options.timing != "wall" and options.engine != "pool":
+        parser.error("--timing cpu is only supported by the pool engine")
+    if options.warm and (options.persistent or options.engine != "pool"):
+        parser.error("--warm is only supported by the pool engine, "
+                     "without --persistent")
+    if options.workers and options.engine != "pool":
+        parser.error("--workers is only supported by the pool engine")
+    if options.zygote and options.engine != "pool":
+        parser.error("--zygote is only supported by the pool engine")
+    if options.multiplex and (options.engine != "pool" or options.persistent
+                              or options.warm or options.workers
+                              or options.timing != "wall"):
+        parser.error("--multiplex is only supported by the pool engine, "
+                     "without --persistent, --warm, --workers "
+                     "or --timing cpu")
+    if options.alpha + options.beta >= 1:
+        # The bounds of the tests would cross: no decision would make sense
+        parser.error(f"--alpha and --beta must add up to less than 1, "
+                     f"not {options.alpha + options.beta:g}")
+    workers = options.workers.split(",") if options.workers else None
+    token = os.environ.get(TOKEN_VARIABLE)
+    if workers and not token:
+        parser.error(f"--workers needs the token of the workers "
+                     f"in {TOKEN_VARIABLE}")
+
+    sprt = None
+    if options.until_significant:
+        sprt = SPRT(alpha=options.alpha, beta=options.beta,
+                    delta=options.delta)
+
+    run_game_bulk(options.n, call_args_a, call_args_b,
+                  engine=options.engine, jobs=options.jobs,
+                  persistent=options.persistent, output=options.output,
+                  replay=options.replay, log_level=options.log_level,
+                  warm=options.warm, limits=limits(options),
+                  timing=options.timing, sprt=sprt, store=options.store,
+                  dashboard=options.dashboard, workers=workers, token=token,
+                  multiplex=options.multiplex, zygote=options.zygote)
+
+
+def worker():
+    from showdown.distributed import TOKEN_VARIABLE, serve_worker
+
+    parser = argparse.ArgumentParser(prog=f"{sys.argv[0]} worker")
+    parser.add_argument(
+        "--listen", metavar="[HOST:]PORT", required=True,
+        help="address to wait for bulk runs on (localhost by default, "
+             "0.0.0.0:PORT for all interfaces)")
+    parser.add_argument(
+        "--jobs", "-j", type=positive_int, default=None,
+        help="number of games played at the same time "
+             "(default: one per CPU)")
+    options = parser.parse_args(sys.argv[1:])
+    token = os.environ.get(TOKEN_VARIABLE)
+    if not token:
+        parser.error(f"set {TOKEN_VARIABLE} to a secret shared with bulk: "
+                     f"whoever knows it can run commands on this machine")
+
     try:
-        n = int(sys.argv.pop(1))
-    except ValueError:
-        print(f"n should be an integer")
-        usage()
+        serve_worker(options.listen, token, jobs=options.jobs)
+    except KeyboardInterrupt:
+        pass
+
+
+def tournament():
+    from showdown.tournament import run_tournament
+
+    parser = argparse.ArgumentParser(
+        prog=f"{sys.argv[0]} tournament",
+        usage="%(prog)s [options] program_a args -vs- program_b args "
+              "-vs- program_c args ...")
+    parser.add_argument(
+        "--games", "-n", type=int, default=10,
+        help="games played by each pairing, in each seat order "
+             "(default: 10)")
+    parser.add_argument(
+        "--swiss", metavar="ROUNDS", type=int, default=None,
+        help="play ROUNDS rounds of Swiss pairings instead of "
+             "a round-robin")
+    parser.add_argument(
+        "--jobs", "-j", type=positive_int, default=None,
+        help="number of games played at the same time "
+             "(default: one per CPU)")
+    parser.add_argument(
+        "--persistent", action="store_true",
+        help="keep bot processes alive from one game to the next "
+             "(bots must support the game_over command)")
+    add_log_level_argument(parser)
+    add_limits_arguments(parser)
+    add_zygote_argument(parser)
+    add_store_argument(parser)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(sys.argv[1:])
+
+    bots = split_all_args(options.args)
+    if len(bots) < 2 or not all(bots):
+        parser.error("expected at least 2 programs separated by -vs-")
+    run_tournament(bots, games=options.games, swiss_rounds=options.swiss,
+                   jobs=options.jobs, persistent=options.persistent,
+                   log_level=options.log_level, limits=limits(options),
+                   timing=options.timing, store=options.store,
+                   zygote=options.zygote)
+
 
-    call_args_a, call_args_b = split_args(sys.argv[1:])
-    run_game_bulk(n, call_args_a, call_args_b)
+def results():
+    from showdown.store import print_head_to_head
+
+    parser = argparse.ArgumentParser(prog=f"{sys.argv[0]} results")
+    parser.add_argument("file", help="results store (see bulk --store)")
+    options = parser.parse_args(sys.argv[1:])
+
+    print_head_to_head(options.file)
+
+
+def simulate():
+    # NumPy is only needed here (pip install showdown[simulate])
+    from showdown import simulation
+
+    parser = argparse.ArgumentParser(
+        prog=f"{sys.argv[0]} simulate",
+        usage="%(prog)s [options] num strategy_a args -vs- strategy_b args",
+        description="Strategies are among "
+                    f"{', '.join(simulation.STRATEGIES)}, "
+                    "or .npy files containing a table.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("n", metavar="num", type=int)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(sys.argv[1:])
+
+    args_a, args_b = split_args(options.args)
+    results = simulation.simulate(
+        simulation.load(*args_a), simulation.load(*args_b),
+        options.n, seed=options.seed)
+    for key in "ab":
+        by_reason = ", ".join(
+            f"{reason}: {results[key, reason]}"
+            for reason in ["shoots", "dodges", "coin"])
+        total = sum(results[key, reason]
+                    for reason in ["shoots", "dodges", "coin"])
+        print(f"{key}: {total} ({by_reason})")
+
+
+def solve():
+    from showdown import solver
+
+    parser = argparse.ArgumentParser(
+        prog=f"{sys.argv[0]} solve",
+        description="Compute the optimal strategy in every state of "
+                    "the game (this takes a minute or so).")
+    parser.add_argument(
+        "--output", "-o", metavar="FILE", default="policy.bin",
+        help="policy file to write (default: policy.bin)")
+    options = parser.parse_args(sys.argv[1:])
+
+    value, num_states = solver.solve(options.output)
+    print(f"Solved {num_states} states, written to {options.output}")
+    print(f"With both players optimal, a wins {100 * value:.1f}% of the "
+          f"games")
 
 
 def example():
@@ -59,19 +427,29 @@ def example():
     os.execv(filename, args)
 
 
+# Taken before the subcommands run: importing showdown.bulk or
+# showdown.replay binds the submodules over the functions of the same name
+COMMANDS = {
+    "ui": ui,
+    "replay": replay,
+    "bulk": bulk,
+    "worker": worker,
+    "tournament": tournament,
+    "results": results,
+    "simulate": simulate,
+    "solve": solve,
+    "example": example,
+}
+
+
 def main():
     command = sys.argv.pop(1)
     try:
-        func = {
-            "ui": ui,
-            "bulk": bulk,
-            "example": example,
-        }[command]
+        func = COMMANDS[command]
     except KeyError:
         print(f"Unrecognized command {command}")
         usage()
     func()
 
-
 if __name__ == '__main__':
     main()
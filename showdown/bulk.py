@@ -1,28 +1,410 @@
+import asyncio
+import contextlib
+import itertools
+import json
 import multiprocessing
+import multiprocessing.pool
+import multiprocessing.util
+import os
+import queue
+import sys
+import threading
+import time
 
+from showdown import game
 from showdown.game import run_game
+from showdown.metrics import Histogram, Usage, timings_report
+from showdown.replay import ReplayWriter
+from showdown.store import Store, fingerprint
 
+# Number of games played at the same time by the asyncio engine, per CPU
+# and at most. Bots of games in flight share the CPUs: too many of them and
+# they lose on time (or fail to start) because of each other.
+ASYNCIO_GAMES_PER_CPU = 8
+ASYNCIO_CONCURRENCY = 100
+# Number of games played at the same time with multiplexed bots
+MULTIPLEX_CONCURRENCY = 64
+# Number of games queued per worker process, so that a worker
+# never waits for the next game to be submitted
+QUEUED_PER_WORKER = 2
+# Game records are written by batches of OUTPUT_BATCH records,
+# or at least every OUTPUT_INTERVAL seconds
+OUTPUT_BATCH = 1000
+OUTPUT_INTERVAL = 1.
+# Only the start and the end of each game are logged by default
+LOG_LEVEL = "summary"
 
-def process(call_args_a, call_args_b):
-    state = run_game(call_args_a, call_args_b)
-    return state["winner_key"]
+# Where a worker of run_game_bulk_pool tells that it starts a game:
+# the sending end of a pipe. Small messages are written at once, so that
+# neither threads nor processes killed by Pool.terminate need a lock.
+started_pipe = None
+# Set once run_game_bulk_pool has the games it needs: the games not started
+# yet are skipped, so that the pool can be closed without playing them
+stop_event = None
 
-def run_game_bulk(n, call_args_a, call_args_b):
-    a_victories = 0
-    b_victories = 0
 
-    with multiprocessing.Pool() as pool:
-        future_results = [
-            pool.apply_async(process, (call_args_a, call_args_b))
-            for __ in range(n)]
-        for f in future_results:
-            winner_key = f.get()
-            if winner_key == "a":
-                a_victories += 1
-                print("a", end="", flush=True)
-            elif winner_key == "b":
-                b_victories += 1
-                print("b", end="", flush=True)
+def init_worker(pipe=None, stop=None):
+    global started_pipe, stop_event
+    started_pipe = pipe
+    stop_event = stop
+    if multiprocessing.parent_process() is not None:
+        # Pool worker processes end with os._exit(): atexit does not kill
+        # the bots they keep (--persistent, --warm), their finalizers do
+        # when the pool is closed (see closing)
+        multiprocessing.util.Finalize(
+            None, game.kill_idle_contestants, exitpriority=0)
 
-    print(f"a: {a_victories} / b: {b_victories}")
 
+@contextlib.contextmanager
+def closing(pool):
+    """
+    Like `with pool:`, but the workers finish their games and exit on their
+    own instead of being terminated, unless an exception is raised.
+    """
+    try:
+        yield pool
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    pool.join()
+
+
+def process(call_args_a, call_args_b, persistent=False, log_level=LOG_LEVEL,
+            warm=False, limits=None, timing="wall", multiplex=False,
+            zygote=False):
+    if stop_event is not None and stop_event.is_set():
+        return None
+    if started_pipe is not None:
+        started_pipe.send_bytes(str(os.getpid()).encode("ascii"))
+    try:
+        state = run_game(call_args_a, call_args_b, persistent=persistent,
+                         log_level=log_level, warm=warm, limits=limits,
+                         timing=timing, multiplex=multiplex, zygote=zygote)
+    except SystemExit:
+        # setup() exits when a bot cannot start. In a worker, this would
+        # leave the pool waiting forever for the result of the game.
+        raise RuntimeError("Could not start the contestants")
+    record = game.result(state)
+    record["worker"] = os.getpid()
+    return record
+
+
+class ResultWriter:
+    """
+    Write game records as JSON lines, by batches.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.lines = []
+        self.flushed_at = time.monotonic()
+
+    def write(self, record):
+        self.lines.append(json.dumps(record, separators=(",", ":")))
+        if (len(self.lines) >= OUTPUT_BATCH
+                or time.monotonic() - self.flushed_at > OUTPUT_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.file.write("\n".join(self.lines) + "\n")
+            self.lines = []
+        self.file.flush()
+        self.flushed_at = time.monotonic()
+
+
+class Report:
+    """
+    Tally game records as they come. The tallies may be read from another
+    thread (see Dashboard) while holding lock.
+    """
+    def __init__(self, output=None, replay=None, sprt=None, store=None,
+                 bots=None, progress=True):
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        # Games to play, games submitted to the engine and games played
+        self.total = 0
+        self.submitted = 0
+        self.played = 0
+        # Games played by each worker process, by pid
+        self.workers = {}
+        # Games started by each local worker process, by pid (see
+        # run_game_bulk_pool), and games in flight on each remote worker,
+        # by address (see distributed)
+        self.started = {}
+        self.remote_in_flight = {}
+        self.victories = {"a": 0, "b": 0}
+        # Games found in the store rather than played
+        self.previous = 0
+        # Fingerprints of both bots in the store
+        self.store = store
+        self.bots = bots
+        # Stop as soon as it decides (see SPRT)
+        self.sprt = sprt
+        # Games that ended because a bot took too long
+        self.time_losses = 0
+        # Games played at the same time by local processes or threads
+        # (see close)
+        self.concurrency = None
+        self.timeouts = {"a": 0, "b": 0}
+        self.crashes = {"a": 0, "b": 0}
+        self.names = {"a": "", "b": ""}
+        self.latencies = {"a": Histogram(), "b": Histogram()}
+        self.overhead = Histogram()
+        self.usage = {"a": Usage(), "b": Usage()}
+        self.replay_writer = ReplayWriter(replay) if replay else None
+        self.output_file = None
+        self.writer = None
+        if output == "-":
+            self.writer = ResultWriter(sys.stdout)
+        elif output:
+            self.output_file = open(output, "w")
+            self.writer = ResultWriter(self.output_file)
+        # Records go to stdout, keep it clean
+        self.file = sys.stdout if output != "-" else sys.stderr
+        self.progress = progress and output != "-"
+
+    def add(self, record):
+        with self.lock:
+            self.tally(record)
+        if self.writer:
+            self.writer.write(record)
+        if self.store:
+            self.store.add(self.bots["a"], self.bots["b"], record)
+        if self.replay_writer:
+            self.replay_writer.write(record)
+        if self.progress:
+            print(record["winner"], end="", flush=True)
+
+    def tally(self, record):
+        winner_key = record["winner"]
+        self.played += 1
+        worker = record.get("worker")
+        self.workers[worker] = self.workers.get(worker, 0) + 1
+        self.victories[winner_key] += 1
+        if self.sprt:
+            self.sprt.add(winner_key)
+        # A bot found dead (crashed) answers STAND, not GAME_OVER: it does
+        # not count as a time loss (timeout), even when found once its
+        # time is up
+        if record["a"]["timeout"] or record["b"]["timeout"]:
+            self.time_losses += 1
+        for key in "ab":
+            self.names[key] = record[key]["name"]
+            self.timeouts[key] += record[key]["timeout"]
+            self.crashes[key] += record[key]["crashed"]
+            self.latencies[key].merge(
+                Histogram.from_dict(record[key]["latency"]))
+            self.usage[key].add(record[key]["usage"])
+        self.overhead.merge(Histogram.from_dict(record["overhead"]))
+
+    def add_previous(self, winner_key):
+        self.previous += 1
+        self.victories[winner_key] += 1
+        if self.sprt:
+            self.sprt.add(winner_key)
+
+    @property
+    def done(self):
+        return bool(self.sprt and self.sprt.decision)
+
+    def close(self):
+        if self.replay_writer:
+            self.replay_writer.close()
+        if self.writer:
+            self.writer.flush()
+        if self.output_file:
+            self.output_file.close()
+        if self.store:
+            self.store.close()
+
+        summary = f"a: {self.victories['a']} / b: {self.victories['b']}"
+        if self.previous:
+            summary += f" ({self.previous} games from the store)"
+        file = self.file
+        print(summary, file=file)
+        if self.sprt and any(self.victories.values()):
+            for line in self.sprt.report(self.names):
+                print(line, file=file)
+        print(f"games lost on time: {self.time_losses}", file=file)
+        if self.time_losses and self.concurrency \
+                and self.concurrency > multiprocessing.cpu_count():
+            print(f"warning: {self.concurrency} games at the same time on "
+                  f"{multiprocessing.cpu_count()} CPUs, bots may have lost "
+                  f"on time because of each other (see --jobs)", file=file)
+        for line in timings_report(self.names, self.latencies, self.overhead):
+            print(line, file=file)
+        for key in "ab":
+            if self.usage[key].games:
+                print(f"{key} ({self.names[key]}) usage: "
+                      f"{self.usage[key].summary()}", file=file)
+
+
+def imap_bounded(pool, func, args_iterable, window):
+    """
+    Like pool.imap_unordered(), but never more than window tasks are
+    submitted and not yet consumed, whatever the length of args_iterable.
+    Results are yielded as soon as their task completes.
+    """
+    results = queue.Queue()
+    in_flight = 0
+
+    def on_success(result):
+        results.put((True, result))
+
+    def on_error(exc):
+        results.put((False, exc))
+
+    args_iterator = iter(args_iterable)
+    while True:
+        for args in itertools.islice(args_iterator, window - in_flight):
+            pool.apply_async(func, args,
+                             callback=on_success, error_callback=on_error)
+            in_flight += 1
+
+        if not in_flight:
+            return
+
+        success, result = results.get()
+        in_flight -= 1
+        if not success:
+            raise result
+        yield result
+
+
+def run_game_bulk(n, call_args_a, call_args_b, engine="pool", jobs=None,
+                  persistent=False, output=None, replay=None,
+                  log_level=LOG_LEVEL, warm=False, limits=None,
+                  timing="wall", sprt=None, store=None, dashboard=False,
+                  workers=None, token=None, multiplex=False, zygote=False):
+    """
+    Play n games, or fewer if sprt (see SPRT) decides before.
+    With multiplex, games are played by threads of this process, and each
+    bot that supports it plays all its games in one process
+    (see game.SharedBot).
+    With zygote, Python bots are forked from a process that already imported
+    what they need instead of starting the interpreter (see showdown.zygote).
+    With workers (a list of host:port), games are played by remote workers
+    (see distributed) instead of local processes, token being the secret
+    they share with us.
+    With store (a path, see Store), games already played by the same bots
+    count towards n, and new games are added to it.
+    With dashboard, progress is shown in a curses dashboard.
+    """
+    bots = None
+    if store:
+        store = Store(store)
+        bots = {"a": fingerprint(call_args_a), "b": fingerprint(call_args_b)}
+        store.add_bot(bots["a"], call_args_a)
+        store.add_bot(bots["b"], call_args_b)
+    report = Report(output=output, replay=replay, sprt=sprt, store=store,
+                    bots=bots, progress=not dashboard)
+    if store:
+        for winner_key in store.winners(bots["a"], bots["b"], limit=n):
+            report.add_previous(winner_key)
+        n = 0 if report.done else n - report.previous
+    report.total = n
+    if dashboard:
+        from showdown.dashboard import Dashboard
+        dashboard = Dashboard(report, engine=engine,
+                              jobs=jobs or default_jobs(engine, multiplex),
+                              remote=bool(workers))
+        dashboard.start()
+    try:
+        if workers:
+            from showdown.distributed import run_game_bulk_distributed
+            run_game_bulk_distributed(
+                n, report, workers,
+                args=(call_args_a, call_args_b, persistent, log_level, warm,
+                      limits, timing, False, zygote), token=token)
+        elif engine == "asyncio":
+            asyncio.run(run_game_bulk_async(
+                n, call_args_a, call_args_b, report,
+                concurrency=jobs or default_jobs(engine, multiplex),
+                log_level=log_level, limits=limits))
+        else:
+            run_game_bulk_pool(
+                n, call_args_a, call_args_b, report,
+                jobs=jobs or default_jobs(engine, multiplex),
+                persistent=persistent, log_level=log_level, warm=warm,
+                limits=limits, timing=timing, multiplex=multiplex,
+                zygote=zygote)
+    finally:
+        if dashboard:
+            dashboard.stop()
+        report.close()
+
+
+def default_jobs(engine, multiplex):
+    if engine == "asyncio":
+        return min(ASYNCIO_CONCURRENCY,
+                   ASYNCIO_GAMES_PER_CPU * multiprocessing.cpu_count())
+    if multiplex:
+        return MULTIPLEX_CONCURRENCY
+    return multiprocessing.cpu_count()
+
+
+def run_game_bulk_pool(n, call_args_a, call_args_b, report, jobs,
+                       persistent, log_level, warm, limits, timing,
+                       multiplex=False, zygote=False):
+    def tasks():
+        for __ in range(n):
+            report.submitted += 1
+            yield (call_args_a, call_args_b, persistent, log_level, warm,
+                   limits, timing, multiplex, zygote)
+
+    def count_started():
+        for pid in iter(started_read.recv_bytes, b""):
+            pid = int(pid)
+            with report.lock:
+                report.started[pid] = report.started.get(pid, 0) + 1
+
+    report.concurrency = jobs
+    started_read, started_write = multiprocessing.Pipe(duplex=False)
+    stop = multiprocessing.Event()
+    counter = threading.Thread(target=count_started)
+    counter.daemon = True
+    counter.start()
+    # Multiplexed bots are shared by the games of a process
+    pool_class = (multiprocessing.pool.ThreadPool if multiplex
+                  else multiprocessing.Pool)
+    try:
+        with closing(pool_class(jobs, initializer=init_worker,
+                                initargs=(started_write, stop))) as pool:
+            for record in imap_bounded(
+                    pool, process, tasks(),
+                    window=QUEUED_PER_WORKER * jobs):
+                report.add(record)
+                if report.done:
+                    # The games in progress end before the pool
+                    # (see closing) and kill their bots, the others
+                    # are skipped
+                    stop.set()
+                    break
+    finally:
+        # Thread pool workers set it in this process
+        init_worker(None)
+        started_write.send_bytes(b"")
+        counter.join()
+        started_read.close()
+        started_write.close()
+
+
+async def run_game_bulk_async(n, call_args_a, call_args_b, report,
+                              concurrency, log_level, limits):
+    states = game.run_games_async(
+        n, call_args_a, call_args_b, concurrency=concurrency,
+        log_level=log_level, limits=limits)
+    # Games are started as soon as others end
+    report.submitted = min(n, concurrency)
+    report.concurrency = concurrency
+    try:
+        async for state in states:
+            report.submitted = min(n, report.played + 1 + concurrency)
+            report.add(game.result(state))
+            if report.done:
+                break
+    finally:
+        # Cancels the games in progress
+        await states.aclose()
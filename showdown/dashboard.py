@@ -0,0 +1,132 @@
+"""
+Curses dashboard for bulk runs. It only reads the tallies of the Report
+(a few times per second), never the games themselves.
+"""
+import curses
+import threading
+import time
+
+from showdown.metrics import format_duration
+from showdown.sprt import wilson_interval
+
+REFRESH_TIME = 0.5
+
+
+class Dashboard:
+    def __init__(self, report, engine, jobs, remote=False):
+        self.report = report
+        self.engine = engine
+        self.jobs = jobs
+        self.remote = remote
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=curses.wrapper,
+                                       args=(self.loop,))
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def loop(self, window):
+        curses.curs_set(0)
+        window.nodelay(True)
+        while True:
+            with self.report.lock:
+                lines = self.lines()
+            draw(window, lines)
+            if self.stopping.wait(REFRESH_TIME):
+                break
+
+    def lines(self):
+        report = self.report
+        elapsed = time.monotonic() - report.started_at
+        played = report.played
+
+        games = f"games: {played} / {report.total}"
+        if report.previous:
+            games += f" (and {report.previous} from the store)"
+        lines = [
+            "showdown bulk",
+            "",
+            games,
+            f"games per second: {played / elapsed:.1f}   "
+            f"elapsed: {format_duration(elapsed)}",
+        ]
+
+        in_flight = report.submitted - played
+        running = min(in_flight, self.jobs)
+        if self.remote:
+            lines.append(f"in flight: {in_flight} games sent to workers")
+            lines.append("in flight per worker: " + "  ".join(
+                f"{address}: {count}" for address, count
+                in sorted(report.remote_in_flight.items())))
+            lines.append("games per worker: " + "  ".join(
+                f"{worker}: {count}"
+                for worker, count in sorted(report.workers.items())))
+        elif self.engine == "asyncio":
+            lines.append(f"in flight: {running} games on the event loop "
+                         f"(at most {self.jobs})")
+        else:
+            lines.append(f"in flight: {running} games on {self.jobs} "
+                         f"workers, {in_flight - running} queued")
+            lines.append("per worker (in flight/played): " + "  ".join(
+                f"{pid}: {in_flight_on(report, pid)}/{count}"
+                for pid, count in sorted(workers(report).items())))
+        lines.append("")
+
+        names = report.names
+        total = sum(report.victories.values())
+        if total:
+            low, high = wilson_interval(report.victories["a"], total)
+            lines.append(
+                f"a ({names['a']}) wins "
+                f"{100 * report.victories['a'] / total:.1f}% "
+                f"(95% interval {100 * low:.1f}% - {100 * high:.1f}%)")
+        if report.sprt:
+            decision = report.sprt.decision
+            lines.append(f"SPRT: {decision or 'no decision yet'} "
+                         f"(log-likelihood ratios a "
+                         f"{report.sprt.llr['a']:+.2f}  b "
+                         f"{report.sprt.llr['b']:+.2f}, bounds "
+                         f"{report.sprt.lower:+.2f} / "
+                         f"{report.sprt.upper:+.2f})")
+        lines.append(
+            f"timeouts: a {report.timeouts['a']}  b {report.timeouts['b']}"
+            f"   crashes: a {report.crashes['a']}  b {report.crashes['b']}")
+        lines.append("")
+
+        lines.append("slowest bots (response time):")
+        for key in sorted("ab", key=lambda key: -(
+                report.latencies[key].percentile(99) or 0.)):
+            lines.append(f"  {key} ({names[key]}): "
+                         f"{report.latencies[key].summary()}")
+        lines.append(f"harness overhead per turn: "
+                     f"{report.overhead.summary()}")
+        return lines
+
+
+def workers(report):
+    """
+    Games played by each local worker, by pid, including the workers
+    that have not finished a game yet.
+    """
+    return {pid: report.workers.get(pid, 0)
+            for pid in {**report.started, **report.workers}}
+
+
+def in_flight_on(report, pid):
+    # A game may end before its start is counted
+    return max(0, report.started.get(pid, 0) - report.workers.get(pid, 0))
+
+
+def draw(window, lines):
+    window.erase()
+    height, width = window.getmaxyx()
+    for y, line in enumerate(lines[:height]):
+        # The last cell of the window cannot be written to
+        window.addstr(y, 0, line[:width - 1])
+    window.noutrefresh()
+    curses.doupdate()
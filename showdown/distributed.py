@@ -0,0 +1,458 @@
+"""
+Bulk runs over several machines.
+
+Workers (showdown worker --listen PORT) play games with a local pool of
+processes. The coordinator (showdown bulk --workers HOST:PORT,...) connects
+to every worker and hands out batches of games. Both sides send JSON lines:
+
+- worker: {"type": "hello", "jobs": N, "challenge": HEX} once connected
+- coordinator: {"type": "auth", "response": HEX}, the HMAC-SHA256 of the
+  challenge with the token both sides share (see TOKEN_VARIABLE). A worker
+  runs the command lines it is sent: it does nothing else for a coordinator
+  that does not know the token.
+- coordinator: {"type": "batch", "batch": ID, "slots": [SLOT, ...],
+  "args": [...]}, args being those of bulk.process, to play a game
+  for each slot (in that order)
+- worker: {"type": "record", "batch": ID, "slot": SLOT, "record": {...}}
+  for each game, then {"type": "done", "batch": ID}
+- coordinator: {"type": "cancel", "batch": ID, "slots": [SLOT, ...]} when
+  these slots were given to another worker
+- worker: {"type": "error", "message": "..."} if games cannot be played
+
+Every game has a slot, and exactly one record is kept per slot: the record
+of the worker the slot belongs to. A worker with nothing left to do takes
+the last half of the slots left in the biggest batch (work stealing). Were
+both workers to play the same games with the first records to arrive kept,
+short games would be favored. The batches of a worker that disconnects are
+given to the others.
+"""
+import collections
+import hashlib
+import hmac
+import json
+import multiprocessing
+import queue
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+
+from showdown.bulk import (QUEUED_PER_WORKER, closing, imap_bounded,
+                           init_worker, process)
+
+PROTOCOL = 4
+# Environment variable holding the token shared by bulk and its workers
+TOKEN_VARIABLE = "SHOWDOWN_WORKER_TOKEN"
+# Games per batch
+BATCH_GAMES = 10
+CONNECT_TIMEOUT = 10
+
+
+def send(file, message):
+    file.write(json.dumps(message, separators=(",", ":")).encode("utf-8")
+               + b"\n")
+    file.flush()
+
+
+def receive(file):
+    """
+    Next message, or None once the connection is closed.
+    """
+    try:
+        line = file.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def parse_address(address, default_host="localhost"):
+    host, __, port = address.rpartition(":")
+    return host or default_host, int(port)
+
+
+def auth_response(token, challenge):
+    return hmac.new(token.encode("utf-8"), bytes.fromhex(challenge),
+                    hashlib.sha256).hexdigest()
+
+
+# Worker side
+
+def play(batch, slot, *args):
+    record = process(*args)
+    record["worker"] = f"{socket.gethostname()}/{record['worker']}"
+    return batch, slot, record
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        jobs = self.server.jobs
+        challenge = secrets.token_hex(16)
+        send(self.wfile, {"type": "hello", "jobs": jobs,
+                          "protocol": PROTOCOL, "challenge": challenge})
+        auth = receive(self.rfile)
+        if not auth or auth.get("type") != "auth" \
+                or not hmac.compare_digest(
+                    str(auth.get("response")),
+                    auth_response(self.server.token, challenge)):
+            send(self.wfile, {"type": "error",
+                              "message": "authentication failed"})
+            return
+
+        batches = queue.Queue()
+        # (batch, slot) not to play anymore, None once the coordinator left
+        cancelled = set()
+        reader = threading.Thread(target=self.read,
+                                  args=(batches, cancelled))
+        reader.daemon = True
+        reader.start()
+
+        with closing(multiprocessing.Pool(
+                jobs, initializer=init_worker)) as pool:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                try:
+                    self.play_batches(pool, batch, batches, cancelled, jobs)
+                except OSError:
+                    # The coordinator left
+                    break
+                except Exception as exc:  # pylint: disable=broad-except
+                    send(self.wfile, {"type": "error", "message": repr(exc)})
+                    break
+
+    def read(self, batches, cancelled):
+        while True:
+            message = receive(self.rfile)
+            if message is None:
+                cancelled.add(None)
+                batches.put(None)
+                return
+            if message["type"] == "batch":
+                batches.put(message)
+            elif message["type"] == "cancel":
+                cancelled.update((message["batch"], slot)
+                                 for slot in message["slots"])
+
+    def play_batches(self, pool, batch, batches, cancelled, jobs):
+        """
+        Play batch, and the batches that arrive meanwhile.
+        """
+        # Games started and finished, by batch
+        started = collections.Counter()
+        finished = collections.Counter()
+        # Batches whose games were all started
+        exhausted = set()
+
+        def send_done(batch_id):
+            if batch_id in exhausted \
+                    and finished[batch_id] == started[batch_id]:
+                exhausted.discard(batch_id)
+                send(self.wfile, {"type": "done", "batch": batch_id})
+
+        def tasks():
+            current = batch
+            while current:
+                batch_id = current["batch"]
+                for slot in current["slots"]:
+                    if None in cancelled:
+                        break
+                    if (batch_id, slot) in cancelled:
+                        continue
+                    started[batch_id] += 1
+                    yield (batch_id, slot, *current["args"])
+                exhausted.add(batch_id)
+                send_done(batch_id)
+                try:
+                    current = batches.get_nowait()
+                except queue.Empty:
+                    return
+                if current is None:
+                    batches.put(None)
+                    return
+
+        for batch_id, slot, record in imap_bounded(
+                pool, play, tasks(), window=QUEUED_PER_WORKER * jobs):
+            finished[batch_id] += 1
+            if None in cancelled:
+                continue
+            if (batch_id, slot) not in cancelled:
+                send(self.wfile, {"type": "record", "batch": batch_id,
+                                  "slot": slot, "record": record})
+            send_done(batch_id)
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, jobs, token):
+        super().__init__(address, WorkerHandler)
+        self.jobs = jobs
+        self.token = token
+
+
+def serve_worker(address, token, jobs=None):
+    host, port = parse_address(address)
+    with WorkerServer((host, port), jobs or multiprocessing.cpu_count(),
+                      token) as server:
+        print(f"Worker listening on {host}:{server.server_address[1]}"
+              f" with {server.jobs} processes", flush=True)
+        server.serve_forever()
+
+
+# Coordinator side
+
+class Coordinator:
+    """
+    Share n games between the workers, and collect their records
+    in self.results (None once every game is played, or an exception).
+    """
+    def __init__(self, n, args, addresses, token):
+        self.args = args
+        self.token = token
+        self.lock = threading.Lock()
+        self.results = queue.Queue()
+        # batch id: {"slots": slots not received yet, "owner": address
+        # or None}. Slots are numbered from 0 to n - 1.
+        self.batches = {}
+        self.pending = collections.deque()
+        for batch_id, first in enumerate(range(0, n, BATCH_GAMES)):
+            self.batches[batch_id] = {
+                "slots": set(range(first, min(first + BATCH_GAMES, n))),
+                "owner": None,
+            }
+            self.pending.append(batch_id)
+        self.next_batch = len(self.batches)
+        self.remaining = n
+        self.games_sent = 0
+        # address: {"socket", "file", "send_lock", "outstanding", "prefetch"}
+        self.workers = {}
+        self.alive = len(addresses)
+        self.threads = [threading.Thread(target=self.run_worker,
+                                         args=(address,), daemon=True)
+                        for address in addresses]
+        if not n:
+            self.results.put(None)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def close(self):
+        with self.lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            try:
+                worker["socket"].shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run_worker(self, address):
+        try:
+            connection = socket.create_connection(
+                parse_address(address), timeout=CONNECT_TIMEOUT)
+            connection.settimeout(None)
+        except OSError as exc:
+            print(f"Could not connect to worker {address}: {exc}",
+                  file=sys.stderr, flush=True)
+            self.worker_lost(address)
+            return
+
+        file = connection.makefile("rwb")
+        try:
+            hello = receive(file)
+            if not hello or hello.get("protocol") != PROTOCOL:
+                print(f"Worker {address} does not speak protocol {PROTOCOL}",
+                      file=sys.stderr, flush=True)
+                return
+            try:
+                send(file, {"type": "auth", "response": auth_response(
+                    self.token, hello["challenge"])})
+            except OSError:
+                return
+            with self.lock:
+                self.workers[address] = {
+                    "socket": connection,
+                    "file": file,
+                    "send_lock": threading.Lock(),
+                    "outstanding": set(),
+                    "prefetch": max(2, -(-QUEUED_PER_WORKER * hello["jobs"]
+                                         // BATCH_GAMES)),
+                }
+            self.top_up(address)
+            while True:
+                message = receive(file)
+                if message is None:
+                    return
+                if message["type"] == "record":
+                    self.add_record(address, message)
+                elif message["type"] == "done":
+                    self.batch_done(address, message["batch"])
+                elif message["type"] == "error":
+                    self.results.put(RuntimeError(
+                        f"Worker {address}: {message['message']}"))
+                    return
+        finally:
+            connection.close()
+            self.worker_lost(address)
+
+    def send(self, address, message):
+        with self.lock:
+            worker = self.workers.get(address)
+        if not worker:
+            return
+        with worker["send_lock"]:
+            try:
+                send(worker["file"], message)
+            except OSError:
+                # run_worker notices it too
+                pass
+
+    def top_up(self, address):
+        """
+        Send batches to the worker until it has prefetch of them. When there
+        is no batch left to hand out, an idle worker steals half of the
+        batch with the most games left.
+        """
+        messages = []
+        with self.lock:
+            worker = self.workers.get(address)
+            if not worker:
+                return
+            outstanding = worker["outstanding"]
+            while len(outstanding) < worker["prefetch"]:
+                if self.pending:
+                    batch_id = self.pending.popleft()
+                    self.games_sent += self.left(batch_id)
+                elif not outstanding:
+                    batch_id = self.steal(address, messages)
+                    if batch_id is None:
+                        break
+                else:
+                    break
+                self.batches[batch_id]["owner"] = address
+                outstanding.add(batch_id)
+                messages.append((address, {
+                    "type": "batch", "batch": batch_id,
+                    "slots": sorted(self.batches[batch_id]["slots"]),
+                    "args": self.args}))
+        for recipient, message in messages:
+            self.send(recipient, message)
+
+    def top_up_all(self):
+        with self.lock:
+            addresses = list(self.workers)
+        for address in addresses:
+            self.top_up(address)
+
+    def in_flight(self):
+        """
+        Games sent to each worker and not received yet, by address.
+        """
+        with self.lock:
+            return {address: sum(self.left(batch_id)
+                                 for batch_id in worker["outstanding"])
+                    for address, worker in self.workers.items()}
+
+    def left(self, batch_id):
+        return len(self.batches[batch_id]["slots"])
+
+    def steal(self, address, messages):
+        """
+        Move the last half of the slots left in the biggest batch of another
+        worker to a new batch, and return its id, or None if no batch is
+        worth it (called with lock). The owner plays its slots in order,
+        so it is least likely to have started these ones. Messages for the
+        owner are added to messages.
+        """
+        candidates = [batch_id for batch_id, batch in self.batches.items()
+                      if self.left(batch_id) > 1 and batch["owner"]
+                      not in [None, address]]
+        if not candidates:
+            return None
+        victim_id = max(candidates, key=self.left)
+        victim = self.batches[victim_id]
+        slots = sorted(victim["slots"])
+        stolen = slots[len(slots) // 2:]
+        victim["slots"].difference_update(stolen)
+        messages.append((victim["owner"], {
+            "type": "cancel", "batch": victim_id, "slots": stolen}))
+        batch_id = self.next_batch
+        self.next_batch += 1
+        self.batches[batch_id] = {"slots": set(stolen), "owner": None}
+        return batch_id
+
+    def release(self, address, batch_id):
+        """
+        The worker no longer plays batch_id (called with lock).
+        Return whether it went back to the pending batches.
+        """
+        batch = self.batches[batch_id]
+        if batch["owner"] == address:
+            batch["owner"] = None
+        if self.left(batch_id) and batch["owner"] is None \
+                and batch_id not in self.pending:
+            self.pending.appendleft(batch_id)
+            return True
+        return False
+
+    def add_record(self, address, message):
+        batch_id = message["batch"]
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["owner"] != address \
+                    or message["slot"] not in batch["slots"]:
+                # Given to another worker
+                return
+            batch["slots"].remove(message["slot"])
+            self.remaining -= 1
+            self.results.put(message["record"])
+            if not self.remaining:
+                self.results.put(None)
+
+    def batch_done(self, address, batch_id):
+        with self.lock:
+            self.workers[address]["outstanding"].discard(batch_id)
+            requeued = self.release(address, batch_id)
+        if requeued:
+            self.top_up_all()
+        else:
+            self.top_up(address)
+
+    def worker_lost(self, address):
+        with self.lock:
+            worker = self.workers.pop(address, None)
+            requeued = False
+            if worker:
+                for batch_id in worker["outstanding"]:
+                    requeued |= self.release(address, batch_id)
+            self.alive -= 1
+            if not self.alive and self.remaining:
+                self.results.put(RuntimeError("No worker left"))
+        if requeued:
+            self.top_up_all()
+
+
+def run_game_bulk_distributed(n, report, addresses, args, token):
+    coordinator = Coordinator(n, args, addresses, token)
+    coordinator.start()
+    try:
+        while True:
+            result = coordinator.results.get()
+            in_flight = coordinator.in_flight()
+            with report.lock:
+                report.submitted = coordinator.games_sent
+                report.remote_in_flight = in_flight
+            if result is None:
+                return
+            if isinstance(result, Exception):
+                raise result
+            report.add(result)
+            if report.done:
+                return
+    finally:
+        coordinator.close()
@@ -2,17 +2,35 @@
 """
 Meow, I'm the Copycat.
 Usage: showdown-example copycat name first
+   or: py:copycat name first (in-process)
 
 I will do the action you give me as first action
 and then I will repeat my opponent's action
+I can play several games in a row (game_over).
 """
+import os
 import sys
 
-name, first = sys.argv[1:]  # pylint: disable=unbalanced-tuple-unpacking
-print(name)
+OK = set("shoot dodge reload".split())
 
-print(first)
-ok = set("shoot dodge reload".split())
-while True:
-    their_action = input()
-    print(their_action if their_action in ok else first)
+
+class Copycat:
+    def __init__(self, name, first):
+        self.name = name
+        self.first = first
+        self.next_action = first
+
+    def action(self):
+        return self.next_action
+
+    def observe(self, action):
+        self.next_action = action if action in OK else self.first
+
+
+if __name__ == '__main__':
+    # plugins.py only needs the standard library: load it from next door,
+    # with or without showdown installed, and without the rest of showdown
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(here))
+    from plugins import serve
+    serve(Copycat, sys.argv[1:])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Hello, I'm the Optimal.
+Usage: showdown-example optimal name policy
+   or: py:optimal name policy (in-process)
+
+I play the optimal strategy from a policy file
+(see showdown solve): nobody wins more than half
+of the games against me in the long run.
+I can play several games in a row (game_over).
+"""
+import functools
+import random
+import sys
+
+from showdown.game import MAX_BULLETS
+from showdown.solver import ACTIONS, Policy
+
+
+@functools.lru_cache()
+def load(path):
+    return Policy(path)
+
+
+class Optimal:
+    def __init__(self, name, policy):
+        self.name = name
+        self.policy = load(policy)
+        self.turn = 0
+        self.bullets = 1
+        self.opponent_bullets = 1
+        # My dodges minus the opponent's
+        self.dodges = 0
+        self.latest = None
+
+    def action(self):
+        probabilities = self.policy.probabilities(
+            self.turn, self.bullets, self.opponent_bullets, self.dodges)
+        self.latest, = random.choices(ACTIONS, weights=probabilities)
+        return self.latest
+
+    def observe(self, action):
+        self.turn += 1
+        self.bullets, dodged = update(self.bullets, self.latest)
+        self.dodges += dodged
+        self.opponent_bullets, dodged = update(self.opponent_bullets, action)
+        self.dodges -= dodged
+
+
+def update(bullets, action):
+    if action == "shoot" and bullets:
+        return bullets - 1, 0
+    if action == "reload":
+        return min(bullets + 1, MAX_BULLETS), 0
+    return bullets, int(action == "dodge")
+
+
+if __name__ == '__main__':
+    from showdown.plugins import serve
+    serve(Optimal, sys.argv[1:])
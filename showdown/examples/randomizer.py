@@ -2,16 +2,32 @@
 """
 Greetsdlfnj, I'm the Randomizer !
 Usage: showdown-example randomizer name
+   or: py:randomizer name (in-process)
 
 I play randomly shoot, dodge and reload
 with equal probability.
+I can play several games in a row (game_over).
 """
+import os
 import random
 import sys
 
-name = sys.argv[1]
-print(name)
 
-while True:
-    print(random.choice("shoot dodge reload".split()))
-    action = input()
+class Randomizer:
+    def __init__(self, name):
+        self.name = name
+
+    def action(self):
+        return random.choice("shoot dodge reload".split())
+
+    def observe(self, action):
+        pass
+
+
+if __name__ == '__main__':
+    # plugins.py only needs the standard library: load it from next door,
+    # with or without showdown installed, and without the rest of showdown
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(here))
+    from plugins import serve
+    serve(Randomizer, sys.argv[1:])
@@ -2,6 +2,7 @@
 """
 lHeol, I'm the Shuffler !
 Usage: showdown-example shiffler name n
+   or: py:shuffler name n (in-process)
 
 I will do 2 cycles of n turns alternatively:
 ["dodge", "dodge", "dodge", "shoot"].shuffle()
@@ -12,21 +13,36 @@ then
 
 It's a safe strategy, but I dodge a lot, so if
 I miss my shots, I probably lose in the end.
+I can play several games in a row (game_over).
 """
+import os
 import random
 import sys
 
-name, n = sys.argv[1:]  # pylint: disable=unbalanced-tuple-unpacking
-print(name)
-n = int(n)
-k = n + 1
-
-while True:
-    for action in random.sample(
-            ["dodge"] * n + ["shoot"], k=k):
-        print(action)
-        input()
-    for action in random.sample(
-            ["dodge"] * n + ["reload"], k=k):
-        print(action)
-        input()
+
+class Shuffler:
+    def __init__(self, name, n):
+        self.name = name
+        self.n = int(n)
+        self.actions = self.cycle()
+
+    def cycle(self):
+        k = self.n + 1
+        while True:
+            yield from random.sample(["dodge"] * self.n + ["shoot"], k=k)
+            yield from random.sample(["dodge"] * self.n + ["reload"], k=k)
+
+    def action(self):
+        return next(self.actions)
+
+    def observe(self, action):
+        pass
+
+
+if __name__ == '__main__':
+    # plugins.py only needs the standard library: load it from next door,
+    # with or without showdown installed, and without the rest of showdown
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(here))
+    from plugins import serve
+    serve(Shuffler, sys.argv[1:])
@@ -1,26 +1,68 @@
 #!/usr/bin/env python
+import asyncio
+import atexit
 import enum
+import functools
+import itertools
 import logging
+import os
 import queue
 import random
+import resource
+import selectors
+import signal
 import subprocess
 import sys
 import time
 import threading
 
+from showdown import plugins
+from showdown.metrics import Histogram
+from showdown.zygote import ZygoteProcess, spawn_from_zygote
+
 logger = logging.getLogger(__file__)
 logging.basicConfig(level="INFO")
 
+# Log levels of the games: turn by turn, start and end of the game only,
+# or nothing at all.
+SUMMARY = 25
+logging.addLevelName(SUMMARY, "SUMMARY")
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "summary": SUMMARY,
+    "off": logging.CRITICAL + 1,
+}
+
 STARTUP_TIME = 10
 TURN_TIME = 1
 TOTAL_TURNS = 100
 MAX_BULLETS = 6
 
+# Timing modes: "wall" charges a bot for the time until it answers, "cpu"
+# only for the CPU time it uses meanwhile (so that it does not lose because
+# the machine is busy), with WALL_TIME_FACTOR times the wall clock time
+# as a backstop.
+TIMINGS = ["wall", "cpu"]
+WALL_TIME_FACTOR = 5
+# How often the CPU time of a bot is checked while waiting for it
+CPU_CHECK_INTERVAL = 0.05
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+# Bytes of the standard error of a bot kept for the game record
+# (see StderrCapture)
+STDERR_CAPTURE = 4096
+# How long to wait for the rest of the standard error of a dead bot
+STDERR_WAIT = 0.1
+
 
-def run_game(call_args_a, call_args_b):
-    state = {}
+def run_game(call_args_a, call_args_b, persistent=False, log_level="debug",
+             warm=False, limits=None, timing="wall", multiplex=False,
+             zygote=False):
+    state = None
     try:
-        state = setup(call_args_a, call_args_b)
+        state = setup(call_args_a, call_args_b, persistent=persistent,
+                      log_level=log_level, warm=warm, limits=limits,
+                      timing=timing, multiplex=multiplex, zygote=zygote)
         while loop(state):
             pass
         finish(state)
@@ -39,32 +81,63 @@ class Commands(enum.Enum):
     GAME_OVER = "game_over"
 
 
-def enqueue_output(contestant):
-    try:
-        for line in iter(contestant.process.stdout.readline, b''):
-            contestant.stdout_queue.put(line)
-    except ValueError:
-        pass
+# Turn history: the commands of both contestants fit in a byte
+COMMAND_CODES = {command: code for code, command in enumerate(Commands)}
+CODE_COMMANDS = list(Commands)
 
-    contestant.process.stdout.close()
 
+def encode_turn(command_a, command_b):
+    return COMMAND_CODES[command_a] * len(CODE_COMMANDS) \
+        + COMMAND_CODES[command_b]
 
-class Contestant:
-    def __init__(self, call_args):
-        self.call_args = call_args
-        self.exited = False
-        self.start()
-        if self.exited:
-            return
-        self.contestant_name = self.read_name()
+
+def decode_turn(code):
+    code_a, code_b = divmod(code, len(CODE_COMMANDS))
+    return CODE_COMMANDS[code_a], CODE_COMMANDS[code_b]
+
+
+class ContestantState:
+    """
+    What a contestant did so far in a game: all the rules, the UI and
+    replays need to know about it.
+    """
+    __slots__ = ("name", "num_bullets", "num_dodges", "latest_command",
+                 "crashed")
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """
+        Get ready for a new game.
+        """
+        # Whether the bot stopped answering during the game
+        self.crashed = False
         self.num_bullets = 1
         self.num_dodges = 0
         self.latest_command = None
 
-    @property
-    def name(self):
-        return getattr(self, "contestant_name",
-                       " ".join(self.call_args))
+    def copy(self):
+        state = ContestantState(self.name)
+        state.num_bullets = self.num_bullets
+        state.num_dodges = self.num_dodges
+        state.latest_command = self.latest_command
+        state.crashed = self.crashed
+        return state
+
+    def replay(self, command):
+        """
+        Update the state as the rules did when the contestant
+        sent command.
+        """
+        self.latest_command = command
+        if command == Commands.SHOOT:
+            self.num_bullets -= 1
+        elif command == Commands.RELOAD:
+            self.num_bullets = min(self.num_bullets + 1, MAX_BULLETS)
+        elif command == Commands.DODGE:
+            self.num_dodges += 1
 
     @property
     def description(self):
@@ -77,14 +150,423 @@ class Contestant:
         elif self.latest_command == Commands.STAND:
             return f"{self.name} issues an invalid command."
 
+
+class GameState:
+    """
+    A game: the contestants in seats a and b (ContestantState or one of
+    the contestant classes), and what happened so far. Every turn takes
+    a byte of history (see encode_turn), which is all it takes to replay
+    the game (see from_record).
+    """
+    __slots__ = ("a", "b", "num_turn", "winner_key", "description",
+                 "history", "overhead", "logger", "persistent")
+
+    def __init__(self, a, b, persistent=False):
+        self.a = a
+        self.b = b
+        self.num_turn = 0
+        # "a" or "b" once the game is decided
+        self.winner_key = None
+        self.description = None
+        self.history = bytearray()
+        # Time per turn spent by the harness itself
+        self.overhead = Histogram()
+        # See setup_logging
+        self.logger = None
+        self.persistent = persistent
+
+    def __getitem__(self, key):
+        """
+        Contestant in seat key ("a" or "b").
+        """
+        if key == "a":
+            return self.a
+        if key == "b":
+            return self.b
+        raise KeyError(key)
+
+    def snapshot(self):
+        """
+        Copy of the state as it is now, without the bot processes.
+        """
+        state = GameState(self.a.copy(), self.b.copy())
+        state.num_turn = self.num_turn
+        state.winner_key = self.winner_key
+        state.description = self.description
+        state.history = bytes(self.history)
+        return state
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Yield the state after each turn of a game record (see result),
+        as the engine had it.
+        """
+        state = cls(ContestantState(record["a"]["name"]),
+                    ContestantState(record["b"]["name"]))
+        moves = record["moves"]
+        if isinstance(moves, str):
+            moves = bytes.fromhex(moves)
+        for code in moves:
+            state.num_turn += 1
+            state.history.append(code)
+            command_a, command_b = decode_turn(code)
+            state.a.replay(command_a)
+            state.b.replay(command_b)
+            if state.num_turn == len(moves):
+                state.description = record["description"]
+                state.winner_key = record["winner"]
+            yield state
+
+
+def resource_limits(limits):
+    """
+    (resource, soft, hard) for the resource limits of a bot process.
+    limits: {"cpu": seconds, "memory": bytes}, both optional.
+    """
+    rlimits = []
+    if limits.get("cpu"):
+        # SIGXCPU at the limit, SIGKILL one second later
+        rlimits.append((resource.RLIMIT_CPU,
+                        limits["cpu"], limits["cpu"] + 1))
+    if limits.get("memory"):
+        rlimits.append((resource.RLIMIT_AS,
+                        limits["memory"], limits["memory"]))
+    return rlimits
+
+
+def apply_limits(limits):
+    """
+    Resource limits of a bot process, called in the child before it starts.
+    """
+    for limit, soft, hard in resource_limits(limits):
+        resource.setrlimit(limit, (soft, hard))
+
+
+def preexec_limits(limits):
+    if not limits:
+        return None
+    return functools.partial(apply_limits, limits)
+
+
+def process_cpu_time(pid):
+    """
+    CPU time (user and system) used so far by a running process.
+    Linux only, with a resolution of 1 / CLOCK_TICKS.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            # The command name, in parentheses, may contain spaces
+            fields = file.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.
+    # utime and stime are the 14th and 15th fields, fields starts at the 3rd
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def usage_from_rusage(rusage):
+    return {
+        "cpu_user": rusage.ru_utime,
+        "cpu_system": rusage.ru_stime,
+        # Kilobytes on Linux
+        "max_rss": rusage.ru_maxrss,
+        "voluntary_switches": rusage.ru_nvcsw,
+        "involuntary_switches": rusage.ru_nivcsw,
+    }
+
+
+def enqueue_output(contestant):
+    try:
+        for line in iter(contestant.process.stdout.readline, b''):
+            # Timestamp lines as they arrive so that the response time of a
+            # bot does not depend on when the harness gets around to it.
+            # Same for the CPU time of the bot with the cpu timing: it may
+            # keep computing after its answer.
+            received_at = time.monotonic()
+            cpu_time = process_cpu_time(contestant.process.pid) \
+                if contestant.timing == "cpu" else None
+            contestant.stdout_queue.put((received_at, cpu_time, line))
+    except (ValueError, OSError):
+        pass
+
+    # End of the output, so that readers do not wait for a dead bot
+    contestant.stdout_queue.put((time.monotonic(), None, b''))
+    contestant.process.stdout.close()
+
+
+class StderrCapture:
+    """
+    The last STDERR_CAPTURE bytes a bot wrote to its standard error.
+    """
+    __slots__ = ("data", "ended")
+
+    def __init__(self):
+        self.data = bytearray()
+        # Set once the bot closed its standard error
+        self.ended = threading.Event()
+
+    def add(self, data):
+        self.data += data
+        del self.data[:-STDERR_CAPTURE]
+
+    def tail(self, timeout=0.):
+        """
+        What was captured, waiting up to timeout seconds for the end.
+        """
+        self.ended.wait(timeout)
+        return bytes(self.data).decode("utf-8", errors="replace")
+
+
+class StderrDrain:
+    """
+    Reads the standard error of every bot of the process in a single thread,
+    so that a chatty bot does not block on a full pipe.
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        # Files to stop reading, see forget
+        self.forgotten = []
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, file):
+        capture = StderrCapture()
+        os.set_blocking(file.fileno(), False)
+        self.selector.register(file, selectors.EVENT_READ, capture)
+        return capture
+
+    def forget(self, file):
+        """
+        Stop reading file, and close it, once what it holds is read
+        (a killed bot may have left children with the pipe open).
+        """
+        with self.lock:
+            self.forgotten.append(file)
+        os.write(self.wakeup_write, b"\0")
+
+    def run(self):
+        while True:
+            for key, __ in self.selector.select():
+                if key.fileobj != self.wakeup_read:
+                    self.read(key.fileobj, key.data)
+                    continue
+                try:
+                    os.read(self.wakeup_read, 1 << 16)
+                except BlockingIOError:
+                    pass
+                with self.lock:
+                    forgotten, self.forgotten = self.forgotten, []
+                for file in forgotten:
+                    try:
+                        capture = self.selector.get_key(file).data
+                    except (KeyError, ValueError):
+                        # Already at the end
+                        continue
+                    while self.read(file, capture):
+                        pass
+                    if not file.closed:
+                        self.close(file, capture)
+
+    def read(self, file, capture):
+        """
+        Read what file holds, return whether there may be more.
+        """
+        if file.closed:
+            # Forgotten earlier in the same round of select
+            return False
+        try:
+            data = os.read(file.fileno(), 1 << 16)
+        except BlockingIOError:
+            return False
+        except OSError:
+            data = b""
+        if not data:
+            self.close(file, capture)
+            return False
+        capture.add(data)
+        return True
+
+    def close(self, file, capture):
+        self.selector.unregister(file)
+        file.close()
+        capture.ended.set()
+
+
+stderr_drain = None
+stderr_drain_lock = threading.Lock()
+
+
+def drain_stderr(file):
+    """
+    Start reading file in the StderrDrain of the process.
+    """
+    global stderr_drain
+    with stderr_drain_lock:
+        # A forked process (bulk pool workers) does not have the thread
+        if stderr_drain is None or stderr_drain.pid != os.getpid():
+            stderr_drain = StderrDrain()
+    return stderr_drain, stderr_drain.add(file)
+
+
+class BaseContestant(ContestantState):
+    """
+    Protocol and game state of a contestant, independently of the way
+    we talk to its process (see Contestant and AsyncContestant).
+    """
+    __slots__ = ("call_args", "limits", "exited", "logger", "told_at",
+                 "response_time", "waited", "usage", "timing", "cpu_at_tell",
+                 "cpu_at_answer", "stderr", "latencies", "misbehaved")
+
+    def __init__(self, call_args, limits=None):
+        # Until the bot gives its name
+        super().__init__(" ".join(call_args))
+        self.call_args = call_args
+        self.limits = limits
+        self.exited = False
+        # Until it is given the logger of its game
+        self.logger = logger
+        self.told_at = time.monotonic()
+        self.response_time = None
+        # Time the harness spent blocked on the bot during the last ask
+        self.waited = 0.
+        # Resources used by the bot process, once it has ended
+        # (see usage_from_rusage)
+        self.usage = None
+        # See TIMINGS
+        self.timing = "wall"
+        # CPU time used by the bot when it was last told something
+        self.cpu_at_tell = 0.
+        # CPU time used by the bot when its last line arrived, if sampled
+        self.cpu_at_answer = None
+        # See StderrCapture, None for plugins
+        self.stderr = None
+
+    def reset(self):
+        super().reset()
+        self.latencies = Histogram()
+        # Whether the bot sent an invalid command during the game
+        self.misbehaved = False
+
+    def stderr_tail(self):
+        """
+        What the bot last wrote to its standard error.
+        """
+        if self.stderr is None:
+            return None
+        return self.stderr.tail()
+
+    def wait_ready(self):
+        """
+        Wait until the contestant has given its name.
+        """
+
+    def wall_time(self, budget):
+        """
+        Wall clock time a bot has to use budget seconds.
+        """
+        if self.timing == "cpu":
+            return budget * WALL_TIME_FACTOR
+        return budget
+
+    def interpret(self, command):
+        """
+        Turn the line sent by the bot into a command
+        and update our state accordingly.
+        """
+        self.latencies.add(self.response_time)
+
+        # Check for valid command
+        try:
+            command = Commands(command.strip())
+        except ValueError:
+            self.logger.warning(f"{self.name} issued invalid command {command}")
+            self.misbehaved = True
+
+            return Commands.STAND
+
+        if command not in [Commands.SHOOT, Commands.DODGE, Commands.RELOAD]:
+            self.logger.warning(
+                f"{self.name} issued invalid command {command.value}")
+            self.misbehaved = True
+
+            return Commands.STAND
+
+        # Update internal state for shoot
+        if command == Commands.SHOOT:
+            if self.num_bullets:
+                self.num_bullets -= 1
+            else:
+                self.logger.info("%s shot but without bullets", self.name)
+
+                return Commands.SHOOT_NO_BULLET
+
+        # Update internal state for reload
+        if command == Commands.RELOAD:
+            if self.num_bullets == MAX_BULLETS:
+                self.logger.info("%s reloaded but already full", self.name)
+            else:
+                self.num_bullets += 1
+
+        # Update internal state for reload
+        if command == Commands.DODGE:
+            self.num_dodges += 1
+
+        self.logger.info("%s command: %s (%.3fs)",
+                         self.name, command.value, self.response_time)
+        return command
+
+
+class Contestant(BaseContestant):
+    """
+    A bot program. The process is started right away and reads its name
+    in the background: several contestants can be started before waiting
+    for them (see wait_ready).
+    """
+    __slots__ = ("ready", "env", "stdout_ended", "zygote", "process",
+                 "drain", "stdout_queue", "stdout_thread")
+
+    def __init__(self, call_args, limits=None, env=None, zygote=False):
+        super().__init__(call_args, limits)
+        self.ready = False
+        self.env = env
+        # Whether the end of the output was read: the bot will not say
+        # anything anymore, even if it is not reaped yet
+        self.stdout_ended = False
+        # Whether to fork Python bots from a zygote (see showdown.zygote)
+        self.zygote = zygote
+        self.start()
+
+    def wait_ready(self):
+        if not self.exited and not self.ready:
+            self.ready = True
+            self.name = self.read_name() or self.name
+            if self.timing == "cpu":
+                # The first action is timed from the name, like with
+                # the wall timing
+                self.cpu_at_tell = self.cpu_at_answer \
+                    if self.cpu_at_answer is not None \
+                    else process_cpu_time(self.process.pid)
+
     def start(self):
         try:
-            self.process = subprocess.Popen(
+            self.process = None
+            if self.zygote:
+                self.process = spawn_from_zygote(
+                    self.call_args, env=self.env,
+                    rlimits=resource_limits(self.limits or {}))
+            self.process = self.process or subprocess.Popen(
                 self.call_args,
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                bufsize=0, close_fds=True)
+                bufsize=0, close_fds=True, env=self.env,
+                preexec_fn=preexec_limits(self.limits))
         except PermissionError:
             self.exited = True
             print(f"Command '{self.name}': Permission denied")
@@ -94,6 +576,7 @@ class Contestant:
             print(f"Command '{self.name}' not found")
             return
 
+        self.drain, self.stderr = drain_stderr(self.process.stderr)
         self.stdout_queue = queue.Queue(maxsize=1 + TOTAL_TURNS)
         self.stdout_thread = threading.Thread(
             target=enqueue_output,
@@ -104,20 +587,21 @@ class Contestant:
         self.stdout_thread.start()
 
     def read_name(self):
-        time.sleep(0.1)
         try:
-            name = self.read(timeout=STARTUP_TIME)
+            name = self.read_timed(
+                time.monotonic() + self.wall_time(STARTUP_TIME),
+                budget=STARTUP_TIME)
 
         except EOFError:
             self.exited = True
-            logger.warning(f"{self.name} exited")
-            logger.warning(f"{self.name} stderr: {self.process.stderr.read()}")
-            logger.warning(f"{self.name} exit code: {self.process.poll()}")
+            self.logger.warning(f"{self.name} exited")
+            self.logger.warning(f"{self.name} stderr: {self.stderr_tail()}")
+            self.logger.warning(f"{self.name} exit code: {self.poll()}")
 
             return None
         except TimeoutError:
             self.exited = True
-            logger.warning(
+            self.logger.warning(
                 f"{self.name} took more than {STARTUP_TIME}"
                 f" seconds to output its name")
             self.kill()
@@ -125,183 +609,550 @@ class Contestant:
             return None
 
         if not name:
-            logger.warning(f"{self.name} didn't send its name")
+            self.logger.warning(f"{self.name} didn't send its name")
             self.exited = True
 
         return name
 
     def read(self, timeout):
-        if self.process.poll() is not None:
+        if self.stdout_ended or self.poll() is not None:
             raise EOFError
         try:
-            line = self.stdout_queue.get(timeout=timeout)
-            return line.decode("utf-8").strip()
+            received_at, self.cpu_at_answer, line = \
+                self.stdout_queue.get(timeout=timeout)
         except queue.Empty:
             raise TimeoutError
+        if not line:
+            # There is a single end marker in the queue
+            self.stdout_ended = True
+            raise EOFError
+        self.response_time = received_at - self.told_at
+        # The next line is expected right away (e.g. the first command
+        # after the name) unless we tell the bot something in between.
+        self.told_at = received_at
+        return line.decode("utf-8").strip()
+
+    def read_timed(self, deadline, budget):
+        """
+        Read a line before deadline (a time.monotonic() value). With the cpu
+        timing, a bot may also run out of budget seconds of CPU time.
+        """
+        if self.timing != "cpu":
+            return self.read(timeout=max(0., deadline - time.monotonic()))
+
+        while True:
+            try:
+                line = self.read(timeout=max(0., min(
+                    deadline - time.monotonic(), CPU_CHECK_INTERVAL)))
+            except TimeoutError:
+                if time.monotonic() >= deadline or self.cpu_used() > budget:
+                    raise
+                continue
+            if self.cpu_used(self.cpu_at_answer) > budget:
+                raise TimeoutError
+            return line
+
+    def cpu_used(self, cpu_time=None):
+        """
+        CPU time used since the bot was last told something, until
+        cpu_time (now by default).
+        """
+        if cpu_time is None:
+            cpu_time = process_cpu_time(self.process.pid)
+        return cpu_time - self.cpu_at_tell
 
     def is_alive(self):
-        return not self.exited and self.process.poll() is None
+        return not self.exited and self.poll() is None
+
+    def stderr_tail(self):
+        if self.stderr is None:
+            return None
+        # The end of the output of a dead bot may still be on its way
+        return self.stderr.tail(STDERR_WAIT if self.poll() is not None else 0.)
 
-    def ask(self):
-        command = Commands.STAND
+    def poll(self, wait=False):
+        """
+        Like Popen.poll (or Popen.wait), but also get the resources
+        used by the bot when it has ended.
+        """
+        if self.process.returncode is None:
+            try:
+                if isinstance(self.process, ZygoteProcess):
+                    # Reaped by the zygote
+                    pid, status, rusage = self.process.wait4(
+                        0 if wait else os.WNOHANG)
+                else:
+                    pid, status, rusage = os.wait4(
+                        self.process.pid, 0 if wait else os.WNOHANG)
+            except ChildProcessError:
+                return self.process.poll()
+            if pid:
+                self.process.returncode = os.waitstatus_to_exitcode(status)
+                if rusage is not None:
+                    self.usage = usage_from_rusage(rusage)
+        return self.process.returncode
 
+    def ask(self, deadline):
+        """
+        Read the next command, waiting at most until deadline
+        (a time.monotonic() value).
+        """
+        self.waited = 0.
         # Check if process is alive
         if not self.is_alive():
-            logger.warning(
+            self.logger.warning(
                 f"{self.name} has terminated ({self.process.returncode})")
+            self.crashed = True
             return Commands.STAND
 
         # Read stdout, with a hard timeout
+        waiting_since = time.monotonic()
         try:
-            command = self.read(timeout=TURN_TIME)
+            command = self.read_timed(deadline, budget=TURN_TIME)
         except EOFError:
-            logger.warning(
+            self.logger.warning(
                 f"{self.name} has exited.")
+            self.crashed = True
             return Commands.STAND
         except TimeoutError:
-            logger.warning(
+            self.logger.warning(
                 f"{self.name} took more than {TURN_TIME} "
                 f"seconds to answer.")
             return Commands.GAME_OVER
+        finally:
+            self.waited = time.monotonic() - waiting_since
 
-        # Check for valid command
+        return self.interpret(command)
+
+    def tell(self, command):
+        self.logger.debug("Telling %s that opponent did: %s",
+                          self.name, command.value)
         try:
-            command = Commands(command.strip())
-        except ValueError:
-            logger.warning(f"{self.name} issued invalid command {command}")
+            self.write(command.value)
+        except OSError as exc:
+            # Killed by its resource limits, for instance. It will be
+            # found dead on the next ask.
+            self.logger.warning(f"{self.name} has exited: {exc!r}")
+        self.told_at = time.monotonic()
+        if self.timing == "cpu":
+            self.cpu_at_tell = process_cpu_time(self.process.pid)
 
-            return Commands.STAND
+    def write(self, line):
+        self.process.stdin.write(line.encode("utf-8") + b"\n")
+        self.process.stdin.flush()
 
-        if command not in [Commands.SHOOT, Commands.DODGE, Commands.RELOAD]:
-            logger.warning(
-                f"{self.name} issued invalid command {command.value}")
+    def recycle(self):
+        """
+        Tell a persistent bot that the game is over, and wait for it to
+        acknowledge so that it can play the next game.
+        Return whether the bot can be reused.
+        """
+        if not self.is_alive():
+            return False
 
-            return Commands.STAND
+        self.logger.info(f"Recycling {self.name}")
+        try:
+            self.tell(Commands.GAME_OVER)
+            deadline = time.monotonic() + TURN_TIME
+            # Skip what the bot may have sent for a turn that never came
+            while self.read(timeout=max(0., deadline - time.monotonic())) \
+                    != Commands.GAME_OVER.value:
+                pass
+        except (EOFError, TimeoutError, OSError):
+            self.logger.warning(f"{self.name} did not acknowledge the end "
+                           f"of the game")
+            return False
 
-        # Update internal state for shoot
-        if command == Commands.SHOOT:
-            if self.num_bullets:
-                self.num_bullets -= 1
-            else:
-                logger.info(f"{self.name} shot but without bullets")
+        self.reset()
+        return True
 
-                return Commands.SHOOT_NO_BULLET
+    def kill(self):
+        self.logger.info(f"Killing {self.name}")
+        self.exited = True
+        try:
+            self.process.stdin.close()
+            if isinstance(self.process, ZygoteProcess):
+                # Only the zygote knows whether the pid is still the bot
+                self.process.kill()
+            # Not Popen.kill, which may reap the process itself
+            # (and lose its resource usage, see poll)
+            elif self.poll() is None:
+                os.kill(self.process.pid, signal.SIGKILL)
+            # The reader thread closes stdout once it reaches the end of the
+            # pipe. Closing it under its feet would free the descriptor for
+            # the pipes of the next game while the thread still reads it.
+            self.stdout_thread.join(timeout=TURN_TIME)
+            self.drain.forget(self.process.stderr)
+        except AttributeError:
+            # The program could not be started
+            return
+        self.logger.info(f"{self.name} exit code: {self.poll(wait=True)}")
 
-        # Update internal state for reload
-        if command == Commands.RELOAD:
-            if self.num_bullets == MAX_BULLETS:
-                logger.info(f"{self.name} reloaded but already full")
-            else:
-                self.num_bullets += 1
 
-        # Update internal state for reload
-        if command == Commands.DODGE:
-            self.num_dodges += 1
+class PluginTimeout(BaseException):
+    """
+    A plugin call took too long (see call_plugin). Not an Exception,
+    so that the plugin does not catch it by mistake.
+    """
+
+
+# Whether a plugin call is running in the main thread under the alarm,
+# and the SIGALRM handler installed before ours (see call_plugin)
+alarm_armed = False
+previous_alarm_handler = None
+
+
+def alarm(signum, frame):
+    if alarm_armed:
+        raise PluginTimeout
+    if callable(previous_alarm_handler):
+        previous_alarm_handler(signum, frame)
+
+
+def install_alarm():
+    """
+    Make sure SIGALRM interrupts plugins (see call_plugin). Installing
+    a handler, or even looking at it, costs more than the call of most
+    plugins: this is done once per game, not per call.
+    """
+    global previous_alarm_handler
+    if threading.current_thread() is threading.main_thread() \
+            and signal.getsignal(signal.SIGALRM) is not alarm:
+        previous_alarm_handler = signal.signal(signal.SIGALRM, alarm)
 
-        logger.info(f"{self.name} command: {command.value}")
-        return command
+
+def call_plugin(timeout, func, *args):
+    """
+    (func(*args), CPU time it used), raising PluginTimeout once it has run
+    for timeout seconds. An alarm interrupts it in the main thread (see
+    install_alarm); in other threads, which cannot receive signals, it runs
+    in a thread of its own that is left behind if it takes too long.
+    """
+    global alarm_armed
+
+    def timed():
+        begin_cpu = time.thread_time()
+        return func(*args), time.thread_time() - begin_cpu
+
+    if threading.current_thread() is threading.main_thread():
+        alarm_armed = True
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            return timed()
+        finally:
+            alarm_armed = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = timed()
+        except Exception as exc:  # pylint: disable=broad-except
+            outcome["error"] = exc
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise PluginTimeout
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+class PythonContestant(BaseContestant):
+    """
+    A bot plugin (see showdown.plugins) running in the harness process.
+    Calls are interrupted once they run for longer than the bot
+    is allowed to (see call_plugin).
+    """
+    __slots__ = ("bot", "overtime")
+
+    def __init__(self, call_args):
+        super().__init__(call_args)
+        self.bot = None
+        # Whether the bot ran out of time when told the last turn
+        self.overtime = False
+        self.start()
+
+    def start(self):
+        spec, *args = self.call_args
+        install_alarm()
+        try:
+            self.bot, __ = call_plugin(STARTUP_TIME, plugins.load(spec), *args)
+            self.name = str(self.bot.name)
+        except PluginTimeout:
+            self.exited = True
+            self.logger.warning(
+                f"{self.name} took more than {STARTUP_TIME}"
+                f" seconds to output its name")
+            return
+        except Exception as exc:  # pylint: disable=broad-except
+            self.exited = True
+            self.logger.warning(f"{self.name} failed to start: {exc!r}")
+            return
+        self.told_at = time.monotonic()
+
+    def is_alive(self):
+        return not self.exited
+
+    def ask(self, deadline):
+        """
+        The shared deadline would charge a bot for the time taken by the
+        other one, so each call gets its own TURN_TIME.
+        """
+        self.waited = 0.
+        if self.overtime:
+            self.logger.warning(
+                f"{self.name} took more than {TURN_TIME} "
+                f"seconds to observe the last turn.")
+            return Commands.GAME_OVER
+        if not self.is_alive():
+            self.logger.warning(f"{self.name} has terminated")
+            self.crashed = True
+            return Commands.STAND
+
+        begin = time.monotonic()
+        try:
+            command, cpu_time = call_plugin(
+                self.wall_time(TURN_TIME), self.bot.action)
+        except PluginTimeout:
+            # Whatever state the bot was left in, it cannot play anymore
+            self.exited = True
+            cpu_time = TURN_TIME
+        except Exception as exc:  # pylint: disable=broad-except
+            self.exited = self.crashed = True
+            self.logger.warning(f"{self.name} has exited: {exc!r}")
+            return Commands.STAND
+        finally:
+            self.waited = time.monotonic() - begin
+        self.response_time = self.waited
+
+        too_long = self.exited \
+            or self.response_time > self.wall_time(TURN_TIME)
+        if self.timing == "cpu":
+            too_long |= cpu_time > TURN_TIME
+        if too_long:
+            self.logger.warning(
+                f"{self.name} took more than {TURN_TIME} "
+                f"seconds to answer.")
+            return Commands.GAME_OVER
+
+        return self.interpret(str(command))
 
     def tell(self, command):
-        logger.debug(f"Telling {self.name} that opponent did: "
-                     f"{command.value}")
-        self.process.stdin.write(
-            command.value.encode("utf-8") + b"\n")
-        self.process.stdin.flush()
+        self.logger.debug("Telling %s that opponent did: %s",
+                          self.name, command.value)
+        try:
+            call_plugin(self.wall_time(TURN_TIME), self.bot.observe,
+                        command.value)
+        except PluginTimeout:
+            # It loses on its next ask
+            self.exited = self.overtime = True
+        except Exception as exc:  # pylint: disable=broad-except
+            self.exited = self.crashed = True
+            self.logger.warning(f"{self.name} has exited: {exc!r}")
 
+    def recycle(self):
+        if not self.is_alive():
+            return False
+        self.reset()
+        self.start()
+        return self.is_alive()
 
     def kill(self):
-        logger.info(f"Killing {self.name}")
         self.exited = True
-        try:
-            self.process.stdin.close()
-            self.process.stdout.close()
-            self.process.stderr.close()
-            self.process.kill()
-        except AttributeError:
-            pass
-        logger.info(f"{self.name} exit code: {self.process.poll()}")
+        self.bot = None
 
 
-def setup(call_args_a, call_args_b):
-    state = {
-        "num_turn": 0,
-    }
+def make_contestant(call_args, limits=None, zygote=False):
+    # Plugins run in the harness process, limits do not apply
+    if plugins.is_plugin(call_args):
+        return PythonContestant(call_args)
+    return Contestant(call_args, limits, zygote=zygote)
+
+
+# Persistent contestants waiting for their next game,
+# by (seat, call_args)
+idle_contestants = {}
+# Contestants started during a game to play the next one,
+# by (seat, call_args)
+warm_contestants = {}
 
-    state["a"] = Contestant(call_args_a)
-    state["b"] = Contestant(call_args_b)
-    if any(not state[key].is_alive() for key in "ab"):
+
+def setup(call_args_a, call_args_b, persistent=False, log_level="debug",
+          warm=False, limits=None, timing="wall", multiplex=False,
+          zygote=False):
+    """
+    With warm, the contestants of the next game (with the same call_args)
+    are started right away, so that they are ready when it begins.
+    limits are the resource limits of the bot processes (see apply_limits).
+    timing is one of TIMINGS.
+    With multiplex, bots that support it play all their games (from any
+    thread) in a single process (see SharedBot).
+    With zygote, Python bots are forked from a process that already
+    imported what they need (see showdown.zygote).
+    """
+    contestants = []
+    for key, call_args in [("a", call_args_a), ("b", call_args_b)]:
+        contestant = None
+        if multiplex:
+            contestant = shared_contestant(key, call_args, limits, zygote)
+        if persistent:
+            contestant = idle_contestants.pop((key, tuple(call_args)), None)
+        if warm and not contestant:
+            contestant = warm_contestants.pop((key, tuple(call_args)), None)
+        contestant = contestant or make_contestant(call_args, limits, zygote)
+        contestant.timing = timing
+        contestants.append(contestant)
+    state = GameState(*contestants, persistent=persistent)
+    # Both bots start at the same time
+    for contestant in contestants:
+        contestant.wait_ready()
+    if not all(contestant.is_alive() for contestant in contestants):
         sys.exit(1)
-    setup_logging(state["a"].name, state["b"].name)
+    if warm:
+        for key, call_args in [("a", call_args_a), ("b", call_args_b)]:
+            # Plugins would be loaded here and now: no use
+            if plugins.is_plugin(call_args):
+                continue
+            warm_contestants[key, tuple(call_args)] = \
+                make_contestant(call_args, limits, zygote)
+    setup_logging(state, log_level)
     return state
 
 
-def setup_logging(name_a, name_b):
-    hdlr = logging.FileHandler(f"{name_a}-vs-{name_b}.log")
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
-    hdlr.setFormatter(formatter)
-    logger.addHandler(hdlr)
-    logger.setLevel(logging.DEBUG)
-    logger.propagate = False
-    logger.info(f"Starting new showdown: {name_a} vs {name_b}")
+class GameLogHandler(logging.Handler):
+    """
+    Keep the log of a game in memory, and write it
+    to the file with a single write when closed.
+    """
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+    def close(self):
+        if self.lines:
+            with open(self.filename, "a") as file:
+                file.write("\n".join(self.lines) + "\n")
+            self.lines = []
+        super().close()
+
+
+def setup_logging(state, log_level):
+    """
+    Give the game (and its contestants) a logger of its own, that is
+    forgotten along with the game (see clean_logging).
+    """
+    name_a = state.a.name
+    name_b = state.b.name
+    # Not registered with logging.getLogger(), which would keep it forever
+    game_logger = logging.Logger(f"{logger.name}:{name_a}-vs-{name_b}")
+    game_logger.setLevel(LOG_LEVELS[log_level])
+    game_logger.propagate = False
+    if game_logger.isEnabledFor(logging.CRITICAL):
+        handler = GameLogHandler(f"{name_a}-vs-{name_b}.log")
+        handler.setFormatter(
+            logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        game_logger.addHandler(handler)
+
+    state.logger = game_logger
+    state.a.logger = state.b.logger = game_logger
+    game_logger.log(SUMMARY, f"Starting new showdown: {name_a} vs {name_b}")
+
+
+def clean_logging(state):
+    game_logger = state.logger
+    if game_logger is None:
+        return
+    for handler in list(game_logger.handlers):
+        game_logger.removeHandler(handler)
+        handler.close()
 
 
 def loop(state):
-    state["num_turn"] += 1
-    logger.info(f"Turn {state['num_turn']} begins")
-    command_a = state["a"].ask()
-    state["a"].latest_command = command_a
-    command_b = state["b"].ask()
-    state["b"].latest_command = command_b
+    begin = time.monotonic()
+    start_turn(state)
+    # Both bots received the previous turn at the same time and their output
+    # is collected in the background, so they share a single deadline:
+    # waiting for a slow bot does not eat into the time of the other one.
+    deadline = time.monotonic() + state.a.wall_time(TURN_TIME)
+    command_a = state.a.ask(deadline)
+    command_b = state.b.ask(deadline)
+    cont = play_turn(state, command_a, command_b)
+    # Bots are waited for one after the other
+    state.overhead.add(time.monotonic() - begin
+                       - state.a.waited - state.b.waited)
+    return cont
+
+
+def start_turn(state):
+    state.num_turn += 1
+    state.logger.info("Turn %s begins", state.num_turn)
+
+
+def play_turn(state, command_a, command_b):
+    """
+    Apply the rules to the commands of both contestants.
+    Return whether the game goes on.
+    """
+    state.a.latest_command = command_a
+    state.b.latest_command = command_b
+    state.history.append(encode_turn(command_a, command_b))
     if Commands.GAME_OVER in (command_a, command_b):
         winners = list("ab")
         descriptions = []
         if command_a == Commands.GAME_OVER:
             winners.remove("a")
             descriptions.append(
-                f"{state['a'].name} takes too long to answer.")
+                f"{state.a.name} takes too long to answer.")
         if command_b == Commands.GAME_OVER:
             winners.remove("b")
             descriptions.append(
-                f"{state['b'].name} takes too long to answer.")
-        state["description"] = " ".join(descriptions)
-        logger.info(state["description"])
+                f"{state.b.name} takes too long to answer.")
+        state.description = " ".join(descriptions)
+        state.logger.info(state.description)
         winner_key = next(iter(winners), None)
         if winner_key:
-            state["winner_key"] = winner_key
+            state.winner_key = winner_key
 
         return False
 
     unprotected = [Commands.SHOOT_NO_BULLET, Commands.RELOAD, Commands.STAND]
     if command_a == Commands.SHOOT and command_b in unprotected:
-        state["winner_key"] = "a"
-        description = f"{state['a'].name} shoots {state['b'].name}"
-        logger.info(description)
-        state["description"] = description
+        state.winner_key = "a"
+        description = f"{state.a.name} shoots {state.b.name}"
+        state.logger.info(description)
+        state.description = description
 
         return False
     if command_b == Commands.SHOOT and command_a in unprotected:
-        state["winner_key"] = "b"
-        description = f"{state['b'].name} shoots {state['a'].name}"
-        logger.info(description)
-        state["description"] = description
+        state.winner_key = "b"
+        description = f"{state.b.name} shoots {state.a.name}"
+        state.logger.info(description)
+        state.description = description
         return False
 
-    state["a"].tell(command_b)
-    state["b"].tell(command_a)
+    state.a.tell(command_b)
+    state.b.tell(command_a)
 
-    if state["num_turn"] >= TOTAL_TURNS:
+    if state.num_turn >= TOTAL_TURNS:
         return False
 
     return True
 
 
 def finish(state):
-    winner_key = state.get('winner_key')
+    winner_key = state.winner_key
 
     if not winner_key:
-        logger.info(f"{state['a'].name} dodged {state['a'].num_dodges} times")
-        logger.info(f"{state['b'].name} dodged {state['b'].num_dodges} times")
-        diff_dodges = state["a"].num_dodges - state["b"].num_dodges
+        state.logger.info(f"{state.a.name} dodged {state.a.num_dodges} times")
+        state.logger.info(f"{state.b.name} dodged {state.b.num_dodges} times")
+        diff_dodges = state.a.num_dodges - state.b.num_dodges
         if diff_dodges:
             if diff_dodges < 0:
                 winner_key = "a"
@@ -313,19 +1164,455 @@ def finish(state):
             winner_key = random.choice("ab")
             description = "Toss a coin: {winner.name} wins."
 
-        state['description'] = description.format(
+        state.description = description.format(
             winner=state[winner_key])
 
-    state['winner_key'] = winner_key
-    logger.info(state['description'])
+    state.winner_key = winner_key
+    state.logger.log(SUMMARY, state.description)
+
+
+def result(state):
+    """
+    Summary of a finished game, made of plain types
+    so that it can be pickled or dumped as JSON.
+    """
+    return {
+        "winner": state.winner_key,
+        "turns": state.num_turn,
+        "description": state.description,
+        "a": contestant_result(state.a),
+        "b": contestant_result(state.b),
+        # See encode_turn
+        "moves": state.history.hex(),
+        "overhead": state.overhead.to_dict(),
+    }
+
+
+def contestant_result(contestant):
+    return {
+        "name": contestant.name,
+        "bullets": contestant.num_bullets,
+        "dodges": contestant.num_dodges,
+        "timeout": contestant.latest_command == Commands.GAME_OVER,
+        "crashed": contestant.crashed,
+        "latency": contestant.latencies.to_dict(),
+        # None if the process is still running (persistent bots),
+        # or for plugins and the asyncio engine
+        "usage": contestant.usage,
+        # The end of the standard error of a bot that lost by crashing,
+        # taking too long or sending invalid commands (see StderrCapture)
+        "stderr": contestant.stderr_tail() if (
+            contestant.crashed or contestant.misbehaved
+            or contestant.latest_command == Commands.GAME_OVER) else None,
+    }
 
 
 def clean(state):
+    if state is None:
+        return
+    for key in "ab":
+        contestant = state[key]
+        if state.persistent and contestant.recycle():
+            idle_contestants[key, tuple(contestant.call_args)] = contestant
+        else:
+            contestant.kill()
+        contestant.logger = logger
+    clean_logging(state)
+
+
+@atexit.register
+def kill_idle_contestants():
+    for contestants in [idle_contestants, warm_contestants]:
+        while contestants:
+            __, contestant = contestants.popitem()
+            contestant.kill()
+    while shared_bots:
+        __, bot = shared_bots.popitem()
+        bot.contestant.kill()
+
+
+# Multiplexed bots
+# A bot started with MULTIPLEX_ENV set may answer MULTIPLEX right after its
+# name. From then on, it plays several games at once: every line, both ways,
+# starts with the id of its game. "{id} start" begins a game (the bot answers
+# with its first action), "{id} game_over" ends it (no answer).
+
+MULTIPLEX_ENV = "SHOWDOWN_MULTIPLEX"
+MULTIPLEX = "multiplex"
+
+# SharedBot by (seat, call_args)
+shared_bots = {}
+shared_bots_lock = threading.Lock()
+
+
+class SharedBot:
+    """
+    A bot program playing all its games in one process, if it supports it
+    (see multiplexed): each game has its own Channel.
+    """
+    def __init__(self, call_args, limits=None):
+        self.call_args = call_args
+        self.contestant = Contestant(
+            call_args, limits, env={**os.environ, MULTIPLEX_ENV: "1"})
+        # Channel queues by game id
+        self.channels = {}
+        self.game_ids = itertools.count()
+        self.lock = threading.Lock()
+        # Whether the bot closed its output
+        self.ended = False
+        self.multiplexed = self.negotiate()
+        if not self.multiplexed:
+            logger.warning(f"{self.contestant.name} does not play several "
+                           f"games at once, starting it for every game")
+            self.contestant.kill()
+            return
+        self.dispatcher = threading.Thread(target=self.dispatch)
+        self.dispatcher.daemon = True
+        self.dispatcher.start()
+
+    def negotiate(self):
+        self.contestant.wait_ready()
+        if not self.contestant.is_alive():
+            return False
+        try:
+            line = self.contestant.read(timeout=STARTUP_TIME)
+        except (EOFError, TimeoutError):
+            return False
+        return line == MULTIPLEX
+
+    def dispatch(self):
+        """
+        Hand the lines of the bot to the channel of their game.
+        """
+        while True:
+            received_at, __, line = self.contestant.stdout_queue.get()
+            if not line:
+                # End of the output: every game finds out
+                with self.lock:
+                    self.ended = True
+                    for channel in self.channels.values():
+                        channel.put((received_at, None, b""))
+                return
+            game_id, __, line = line.partition(b" ")
+            with self.lock:
+                channel = self.channels.get(game_id.decode("utf-8"))
+            if channel is not None:
+                channel.put((received_at, None, line))
+
+    def open(self, channel):
+        with self.lock:
+            game_id = str(next(self.game_ids))
+            self.channels[game_id] = channel
+            if self.ended:
+                channel.put((time.monotonic(), None, b""))
+        return game_id
+
+    def close(self, game_id):
+        with self.lock:
+            del self.channels[game_id]
+
+    def write(self, game_id, line):
+        with self.lock:
+            self.contestant.write(f"{game_id} {line}")
+
+
+class Channel(Contestant):
+    """
+    One game of a SharedBot, a contestant like the others for the game.
+    """
+    __slots__ = ("bot", "game_id")
+
+    def __init__(self, bot):
+        self.bot = bot
+        super().__init__(bot.call_args)
+
+    def start(self):
+        self.process = self.bot.contestant.process
+        self.stderr = self.bot.contestant.stderr
+        self.name = self.bot.contestant.name
+        self.ready = True
+        self.stdout_queue = queue.Queue()
+        self.game_id = self.bot.open(self.stdout_queue)
+        try:
+            self.write("start")
+        except OSError:
+            self.exited = True
+
+    def write(self, line):
+        self.bot.write(self.game_id, line)
+
+    def poll(self, wait=False):
+        # The process is not ours to wait for
+        return self.bot.contestant.poll()
+
+    def recycle(self):
+        return False
+
+    def kill(self):
+        if self.exited:
+            return
+        self.exited = True
+        try:
+            self.write(Commands.GAME_OVER.value)
+        except OSError:
+            pass
+        self.bot.close(self.game_id)
+
+
+def shared_contestant(key, call_args, limits=None, zygote=False):
+    """
+    Contestant for a new game in seat key: a Channel of the shared process
+    if the bot supports multiplexing, or a contestant of its own.
+    """
+    if plugins.is_plugin(call_args):
+        return make_contestant(call_args, limits)
+    with shared_bots_lock:
+        bot = shared_bots.get((key, tuple(call_args)))
+        if bot is None or (bot.multiplexed and (
+                bot.ended or bot.contestant.poll() is not None)):
+            bot = shared_bots[key, tuple(call_args)] = \
+                SharedBot(call_args, limits)
+    if bot.multiplexed:
+        return Channel(bot)
+    return make_contestant(call_args, limits, zygote)
+
+
+# asyncio engine
+# Same rules as above (play_turn and finish are shared), but a single event
+# loop can drive many games at once: no reader thread per contestant and no
+# process per game.
+
+class AsyncContestant(BaseContestant):
+    __slots__ = ("process", "stderr_task")
+
+    async def start(self):
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.call_args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                close_fds=True,
+                preexec_fn=preexec_limits(self.limits))
+        except PermissionError:
+            self.exited = True
+            print(f"Command '{self.name}': Permission denied")
+            return
+        except FileNotFoundError:
+            self.exited = True
+            print(f"Command '{self.name}' not found")
+            return
+
+        self.stderr = StderrCapture()
+        self.stderr_task = asyncio.ensure_future(self.drain_stderr())
+        self.name = await self.read_name() or self.name
+
+    async def drain_stderr(self):
+        try:
+            while True:
+                data = await self.process.stderr.read(1 << 16)
+                if not data:
+                    return
+                self.stderr.add(data)
+        finally:
+            self.stderr.ended.set()
+
+    async def wait_stderr(self):
+        """
+        Give the end of the standard error of a dead bot some time to arrive.
+        """
+        await asyncio.wait([self.stderr_task], timeout=STDERR_WAIT)
+        self.stderr_task.cancel()
+
+    async def read_name(self):
+        try:
+            name = await self.read(timeout=STARTUP_TIME)
+
+        except EOFError:
+            self.exited = True
+            self.logger.warning(f"{self.name} exited")
+            self.logger.warning(
+                f"{self.name} exit code: {await self.process.wait()}")
+            await self.wait_stderr()
+            self.logger.warning(f"{self.name} stderr: {self.stderr_tail()}")
+
+            return None
+        except TimeoutError:
+            self.exited = True
+            self.logger.warning(
+                f"{self.name} took more than {STARTUP_TIME}"
+                f" seconds to output its name")
+            await self.kill()
+
+            return None
+
+        if not name:
+            self.logger.warning(f"{self.name} didn't send its name")
+            self.exited = True
+
+        return name
+
+    async def read(self, timeout):
+        if self.process.returncode is not None:
+            raise EOFError
+        try:
+            line = await asyncio.wait_for(
+                self.process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError
+        if not line:
+            raise EOFError
+        received_at = time.monotonic()
+        self.response_time = received_at - self.told_at
+        self.told_at = received_at
+        return line.decode("utf-8").strip()
+
+    def is_alive(self):
+        return not self.exited and self.process.returncode is None
+
+    async def ask(self, deadline):
+        self.waited = 0.
+        # Check if process is alive
+        if not self.is_alive():
+            self.logger.warning(
+                f"{self.name} has terminated ({self.process.returncode})")
+            self.crashed = True
+            return Commands.STAND
+
+        # Read stdout, with a hard timeout
+        waiting_since = time.monotonic()
+        try:
+            command = await self.read(
+                timeout=max(0., deadline - time.monotonic()))
+        except EOFError:
+            self.logger.warning(
+                f"{self.name} has exited.")
+            self.crashed = True
+            return Commands.STAND
+        except TimeoutError:
+            self.logger.warning(
+                f"{self.name} took more than {TURN_TIME} "
+                f"seconds to answer.")
+            return Commands.GAME_OVER
+        finally:
+            self.waited = time.monotonic() - waiting_since
+
+        return self.interpret(command)
+
+    def tell(self, command):
+        self.logger.debug("Telling %s that opponent did: %s",
+                          self.name, command.value)
+        # The transport sends the line right away, and a bot that answers
+        # never has more than one line pending, so no need to drain.
+        self.process.stdin.write(
+            command.value.encode("utf-8") + b"\n")
+        self.told_at = time.monotonic()
+
+    async def kill(self):
+        self.logger.info(f"Killing {self.name}")
+        self.exited = True
+        try:
+            self.process.stdin.close()
+            self.process.kill()
+        except AttributeError:
+            pass
+        except ProcessLookupError:
+            pass
+        else:
+            await self.process.wait()
+        if self.stderr is not None:
+            await self.wait_stderr()
+        self.logger.info(f"{self.name} exit code: {self.process.returncode}")
+
+
+async def run_game_async(call_args_a, call_args_b, log_level="debug",
+                         limits=None):
+    state = None
     try:
-        state["a"].kill()
-    except KeyError:
-        pass
+        state = await setup_async(call_args_a, call_args_b, log_level, limits)
+        while await loop_async(state):
+            pass
+        finish(state)
+    finally:
+        await clean_async(state)
+
+    return state
+
+
+async def setup_async(call_args_a, call_args_b, log_level="debug",
+                      limits=None):
+    state = GameState(AsyncContestant(call_args_a, limits),
+                      AsyncContestant(call_args_b, limits))
     try:
-        state["b"].kill()
-    except KeyError:
-        pass
+        await asyncio.gather(state.a.start(), state.b.start())
+        if not (state.a.is_alive() and state.b.is_alive()):
+            sys.exit(1)
+    except BaseException:
+        await clean_async(state)
+        raise
+    setup_logging(state, log_level)
+    return state
+
+
+async def loop_async(state):
+    begin = time.monotonic()
+    start_turn(state)
+    deadline = time.monotonic() + TURN_TIME
+    command_a, command_b = await asyncio.gather(
+        state.a.ask(deadline), state.b.ask(deadline))
+    cont = play_turn(state, command_a, command_b)
+    # Bots are waited for at the same time
+    state.overhead.add(time.monotonic() - begin
+                       - max(state.a.waited, state.b.waited))
+    return cont
+
+
+async def clean_async(state):
+    if state is None:
+        return
+    for key in "ab":
+        contestant = state[key]
+        if hasattr(contestant, "process"):
+            await contestant.kill()
+    clean_logging(state)
+
+
+async def run_games_async(n, call_args_a, call_args_b, concurrency,
+                          log_level="debug", limits=None):
+    """
+    Play n games with at most concurrency of them at the same time.
+    Yield the final states as games complete.
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, not {concurrency}")
+    # AsyncContestant only runs programs
+    for call_args in [call_args_a, call_args_b]:
+        if plugins.is_plugin(call_args):
+            raise ValueError(f"{call_args[0]}: plugins are not supported "
+                             f"by the asyncio engine")
+    remaining = n
+    states = asyncio.Queue()
+
+    async def play():
+        nonlocal remaining
+        while remaining:
+            remaining -= 1
+            try:
+                states.put_nowait(
+                    await run_game_async(call_args_a, call_args_b,
+                                         log_level, limits))
+            except Exception as exc:  # pylint: disable=broad-except
+                states.put_nowait(exc)
+
+    players = [asyncio.ensure_future(play())
+               for __ in range(min(n, concurrency))]
+    try:
+        for __ in range(n):
+            state = await states.get()
+            if isinstance(state, Exception):
+                raise state
+            yield state
+    finally:
+        for player in players:
+            player.cancel()
+        await asyncio.gather(*players, return_exceptions=True)
@@ -0,0 +1,128 @@
+import math
+
+# Histogram buckets are log-scaled: BUCKETS_PER_OCTAVE buckets for each
+# doubling, starting at MIN_VALUE seconds (relative error about 9%)
+MIN_VALUE = 1e-6
+BUCKETS_PER_OCTAVE = 8
+
+
+class Histogram:
+    """
+    Distribution of durations, small enough to be sent with every game
+    record and merged across games.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.max = 0.
+
+    @staticmethod
+    def bucket(value):
+        if value <= MIN_VALUE:
+            return 0
+        return int(math.log2(value / MIN_VALUE) * BUCKETS_PER_OCTAVE) + 1
+
+    @staticmethod
+    def upper_bound(bucket):
+        return MIN_VALUE * 2 ** (bucket / BUCKETS_PER_OCTAVE)
+
+    def add(self, value):
+        bucket = self.bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """
+        Upper bound of the bucket holding the given percentile
+        (never more than the actual maximum).
+        """
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            # JSON keys are strings
+            "buckets": {str(bucket): count
+                        for bucket, count in self.buckets.items()},
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for bucket, count in data["buckets"].items():
+            histogram.buckets[int(bucket)] = count
+            histogram.count += count
+        histogram.max = data["max"]
+        return histogram
+
+    def summary(self):
+        if not self.count:
+            return "no data"
+        return "  ".join(
+            [f"p{percent} {format_duration(self.percentile(percent))}"
+             for percent in (50, 95, 99)]
+            + [f"max {format_duration(self.max)}"])
+
+
+class Usage:
+    """
+    Resources used by a bot over several games (see game.usage_from_rusage).
+    """
+    def __init__(self):
+        self.games = 0
+        self.cpu_user = 0.
+        self.cpu_system = 0.
+        self.max_rss = 0
+        self.switches = 0
+
+    def add(self, usage):
+        if not usage:
+            return
+        self.games += 1
+        self.cpu_user += usage["cpu_user"]
+        self.cpu_system += usage["cpu_system"]
+        self.max_rss = max(self.max_rss, usage["max_rss"])
+        self.switches += (usage["voluntary_switches"]
+                          + usage["involuntary_switches"])
+
+    def summary(self):
+        return (f"cpu per game user {format_duration(self.cpu_user / self.games)}"
+                f" sys {format_duration(self.cpu_system / self.games)}  "
+                f"max rss {self.max_rss / 1024:.1f}MB  "
+                f"context switches per game {self.switches / self.games:.0f}")
+
+
+def format_duration(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+def timings_report(names, latencies, overhead):
+    """
+    Lines describing the response times of both bots (by seat)
+    and the time taken by the harness itself.
+    """
+    lines = [f"{key} ({names[key]}) response time: "
+             f"{latencies[key].summary()}"
+             for key in "ab"]
+    lines.append(f"harness overhead per turn: {overhead.summary()}")
+    return lines
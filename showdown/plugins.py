@@ -0,0 +1,105 @@
+"""
+In-process Python bots.
+
+A bot plugin is a callable (usually a class) that takes the bot arguments
+and returns an object with:
+
+- a ``name`` attribute,
+- an ``action()`` method returning the command for the current turn
+  ("shoot", "dodge" or "reload"),
+- an ``observe(action)`` method receiving what the opponent did
+  ("shoot", "dodge", "reload", "shoot_no_bullet" or "stand").
+
+On the command line, a plugin is given as ``py:module:callable`` or as
+``py:name`` where name is registered in the ``showdown.bots`` entry point
+group, followed by its arguments.
+"""
+import importlib
+import os
+import sys
+
+PREFIX = "py:"
+ENTRY_POINT_GROUP = "showdown.bots"
+
+
+def is_plugin(call_args):
+    return bool(call_args) and call_args[0].startswith(PREFIX)
+
+
+def load(spec):
+    """
+    Return the bot factory designated by spec
+    (with or without the py: prefix).
+    """
+    if spec.startswith(PREFIX):
+        spec = spec[len(PREFIX):]
+
+    if ":" in spec:
+        module_name, attribute = spec.split(":", 1)
+        factory = importlib.import_module(module_name)
+        for part in attribute.split("."):
+            factory = getattr(factory, part)
+        return factory
+
+    from importlib import metadata
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:  # Python < 3.10
+        entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+    for entry_point in entry_points:
+        if entry_point.name == spec:
+            return entry_point.load()
+    raise LookupError(f"No bot named {spec} in {ENTRY_POINT_GROUP}")
+
+
+def serve(factory, args):
+    """
+    Play with a plugin bot over stdin/stdout, so that it can
+    also be used as a regular program.
+    """
+    bot = factory(*args)
+    print(bot.name, flush=True)
+    # See showdown.game.SharedBot
+    if os.environ.get("SHOWDOWN_MULTIPLEX"):
+        serve_multiplexed(factory, args)
+        return
+    while True:
+        print(bot.action(), flush=True)
+        action = input()
+        if action == "game_over":
+            print("game_over", flush=True)
+            bot = factory(*args)
+        else:
+            bot.observe(action)
+
+
+def serve_multiplexed(factory, args):
+    """
+    Play several games at once, each with its own bot.
+    """
+    print("multiplex", flush=True)
+    bots = {}
+    while True:
+        game_id, action = input().split(" ", 1)
+        if action == "game_over":
+            bots.pop(game_id, None)
+            continue
+        if action == "start":
+            bot = bots[game_id] = factory(*args)
+        else:
+            bot = bots[game_id]
+            bot.observe(action)
+        print(f"{game_id} {bot.action()}", flush=True)
+
+
+def main():
+    """
+    python -m showdown.plugins module:callable [arg, ...]
+    """
+    spec, *args = sys.argv[1:]
+    serve(load(spec), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Replay files: game records (see game.result) stored one after the other,
+each as a JSON header followed by the moves (one byte per turn, see
+game.encode_turn). A FILE.idx index holds the offset of every record,
+so that any game can be read without scanning the file.
+"""
+import json
+import os
+import struct
+
+MAGIC = b"showdown-replay-1\n"
+SIZE = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+
+
+def index_path(path):
+    return f"{path}.idx"
+
+
+class ReplayWriter:
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.index = open(index_path(path), "wb")
+        self.file.write(MAGIC)
+
+    def write(self, record):
+        record = dict(record)
+        moves = bytes.fromhex(record.pop("moves"))
+        header = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        self.index.write(OFFSET.pack(self.file.tell()))
+        self.file.write(SIZE.pack(len(header)) + header
+                        + SIZE.pack(len(moves)) + moves)
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a showdown replay file")
+        try:
+            with open(index_path(path), "rb") as index:
+                self.offsets = [offset for offset,
+                                in OFFSET.iter_unpack(index.read())]
+        except FileNotFoundError:
+            self.offsets = self.scan()
+
+    def scan(self):
+        offsets = []
+        self.file.seek(0, os.SEEK_END)
+        end = self.file.tell()
+        offset = len(MAGIC)
+        while offset < end:
+            offsets.append(offset)
+            for __ in "header", "moves":
+                self.file.seek(offset)
+                size, = SIZE.unpack(self.file.read(SIZE.size))
+                offset += SIZE.size + size
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, num_game):
+        """
+        Return the record of game num_game, with moves as bytes.
+        """
+        self.file.seek(self.offsets[num_game])
+        size, = SIZE.unpack(self.file.read(SIZE.size))
+        record = json.loads(self.file.read(size).decode("utf-8"))
+        size, = SIZE.unpack(self.file.read(SIZE.size))
+        record["moves"] = self.file.read(size)
+        return record
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
@@ -0,0 +1,177 @@
+"""
+Batch simulator for strategies given as probability tables.
+
+A table gives, for every turn (0 to TOTAL_TURNS - 1), own number of
+bullets (0 to MAX_BULLETS) and last move of the opponent (see
+LAST_MOVES), the probability to shoot, dodge and reload
+(shape: TOTAL_TURNS x MAX_BULLETS + 1 x len(LAST_MOVES) x 3).
+
+Games are played by whole batches as NumPy arrays, with the same rules
+as showdown.game.play_turn and showdown.game.finish. The cost is per
+turn played, not per game: on one core, about 250,000 games per second
+last all TOTAL_TURNS turns, millions per second end within a few turns.
+"""
+import collections
+
+import numpy as np
+
+from showdown.game import MAX_BULLETS, TOTAL_TURNS
+
+ACTIONS = ["shoot", "dodge", "reload"]
+SHOOT, DODGE, RELOAD = range(len(ACTIONS))
+
+# What a bot may have read from its opponent
+# ("none" is the first turn, where it did not read anything yet)
+LAST_MOVES = ["none", "shoot", "dodge", "reload", "shoot_no_bullet", "stand"]
+(LAST_NONE, LAST_SHOOT, LAST_DODGE, LAST_RELOAD,
+ LAST_SHOOT_NO_BULLET, LAST_STAND) = range(len(LAST_MOVES))
+
+TABLE_SHAPE = (TOTAL_TURNS, MAX_BULLETS + 1, len(LAST_MOVES), len(ACTIONS))
+
+BATCH_SIZE = 1_000_000
+
+
+def constant(action):
+    table = np.zeros(TABLE_SHAPE)
+    table[..., ACTIONS.index(action)] = 1.
+    return table
+
+
+def randomizer():
+    return np.full(TABLE_SHAPE, 1. / len(ACTIONS))
+
+
+def copycat(first):
+    table = constant(first)
+    for last_move in [LAST_SHOOT, LAST_DODGE, LAST_RELOAD]:
+        table[:, :, last_move] = 0.
+        table[:, :, last_move, ACTIONS.index(LAST_MOVES[last_move])] = 1.
+    return table
+
+
+def shuffler(n):
+    """
+    The shuffler plays cycles of n + 1 turns: n dodges and a shot in a
+    random order, then n dodges and a reload. It starts with one bullet,
+    so its bullets tell whether it already shot (or reloaded) in the
+    current cycle: if not, it does it on each of the turns left in the
+    cycle with the same probability.
+    """
+    n = int(n)
+    table = np.zeros(TABLE_SHAPE)
+    table[..., DODGE] = 1.
+    for turn in range(TOTAL_TURNS):
+        cycle, position = divmod(turn, n + 1)
+        # Bullets of the shuffler until it shoots (or reloads)
+        bullets, action = (1, SHOOT) if cycle % 2 == 0 else (0, RELOAD)
+        probability = 1 / (n + 1 - position)
+        table[turn, bullets, :, action] = probability
+        table[turn, bullets, :, DODGE] = 1 - probability
+    return table
+
+
+STRATEGIES = {
+    "constant": constant,
+    "copycat": copycat,
+    "randomizer": randomizer,
+    "shuffler": shuffler,
+}
+
+
+def load(name, *args):
+    """
+    Return the table of a strategy given by name (see STRATEGIES),
+    or stored in a .npy file.
+    """
+    if name in STRATEGIES:
+        return STRATEGIES[name](*args)
+    table = np.load(name)
+    if table.shape != TABLE_SHAPE:
+        raise ValueError(f"{name}: expected a table of shape {TABLE_SHAPE}, "
+                         f"got {table.shape}")
+    return table
+
+
+def thresholds(table):
+    """
+    The cumulative probabilities of shooting, and of shooting or dodging,
+    for every turn and state (bullets * len(LAST_MOVES) + last move).
+    """
+    cumulative = np.cumsum(table, axis=-1).reshape(TOTAL_TURNS, -1, 3)
+    return [np.ascontiguousarray(cumulative[..., action])
+            for action in (SHOOT, DODGE)]
+
+
+def draw(thresholds, turn, bullets, last_moves, rng):
+    # Gathering from flat rows of a few dozen states is much cheaper
+    # than gathering whole probability rows and summing comparisons
+    # (indices are always in range: clipping skips the bounds checks)
+    states = (bullets * len(LAST_MOVES) + last_moves).astype(np.intp)
+    draws = rng.random(len(bullets))
+    shoot, dodge = thresholds
+    return ((draws > shoot[turn].take(states, mode="clip")).view(np.int8)
+            + (draws > dodge[turn].take(states, mode="clip")).view(np.int8))
+
+
+def simulate_batch(thresholds_a, thresholds_b, n, rng, results):
+    bullets_a = np.ones(n, dtype=np.int8)
+    bullets_b = np.ones(n, dtype=np.int8)
+    dodges = np.zeros(n, dtype=np.int16)  # a minus b
+    last_a = np.full(n, LAST_NONE, dtype=np.int8)  # as seen by b
+    last_b = np.full(n, LAST_NONE, dtype=np.int8)  # as seen by a
+
+    for turn in range(TOTAL_TURNS):
+        action_a = draw(thresholds_a, turn, bullets_a, last_b, rng)
+        action_b = draw(thresholds_b, turn, bullets_b, last_a, rng)
+
+        shoot_a = (action_a == SHOOT) & (bullets_a > 0)
+        shoot_b = (action_b == SHOOT) & (bullets_b > 0)
+        no_bullet_a = (action_a == SHOOT) & ~shoot_a
+        no_bullet_b = (action_b == SHOOT) & ~shoot_b
+        reload_a = action_a == RELOAD
+        reload_b = action_b == RELOAD
+
+        a_wins = shoot_a & (no_bullet_b | reload_b)
+        b_wins = shoot_b & (no_bullet_a | reload_a)
+        results["a", "shoots"] += int(a_wins.sum())
+        results["b", "shoots"] += int(b_wins.sum())
+
+        bullets_a -= shoot_a
+        bullets_b -= shoot_b
+        bullets_a += reload_a & (bullets_a < MAX_BULLETS)
+        bullets_b += reload_b & (bullets_b < MAX_BULLETS)
+        dodges += (action_a == DODGE)
+        dodges -= (action_b == DODGE)
+
+        last_a = np.where(no_bullet_a, LAST_SHOOT_NO_BULLET, action_a + 1)
+        last_b = np.where(no_bullet_b, LAST_SHOOT_NO_BULLET, action_b + 1)
+
+        # Only keep going with the games that are not over
+        ongoing = ~(a_wins | b_wins)
+        if not ongoing.all():
+            bullets_a, bullets_b, dodges, last_a, last_b = (
+                array[ongoing]
+                for array in (bullets_a, bullets_b, dodges, last_a, last_b))
+            if not len(dodges):
+                return
+
+    results["a", "dodges"] += int((dodges < 0).sum())
+    results["b", "dodges"] += int((dodges > 0).sum())
+    coin_a = int(rng.binomial(int((dodges == 0).sum()), .5))
+    results["a", "coin"] += coin_a
+    results["b", "coin"] += int((dodges == 0).sum()) - coin_a
+
+
+def simulate(table_a, table_b, n, seed=None, batch_size=BATCH_SIZE):
+    """
+    Play n games between the strategies given as tables.
+    Return a Counter of games by (winner_key, reason), reason being
+    "shoots", "dodges" or "coin".
+    """
+    rng = np.random.default_rng(seed)
+    thresholds_a, thresholds_b = thresholds(table_a), thresholds(table_b)
+    results = collections.Counter()
+    for start in range(0, n, batch_size):
+        simulate_batch(thresholds_a, thresholds_b,
+                       min(batch_size, n - start), rng, results)
+    return results
@@ -0,0 +1,265 @@
+"""
+Exact solution of the game.
+
+Bots see every move of their opponent, so the state of a game is the turn,
+the bullets of both sides and the difference of their dodges (which decides
+the game when nobody gets shot, see game.finish). On every turn both bots
+choose an action at the same time: each state is a zero-sum matrix game
+whose payoffs are the values of the next states. Solving them from the last
+turn back gives the optimal (mixed) strategy in every state.
+
+The strategy is stored in a policy file: MAGIC, then TOTAL_TURNS and
+MAX_BULLETS (see HEADER), then two bytes per state (see Policy.offset), the
+probabilities to shoot and to dodge in 255ths (reload is the rest).
+"""
+import functools
+import itertools
+import struct
+
+from showdown.game import MAX_BULLETS, TOTAL_TURNS
+
+ACTIONS = ["shoot", "dodge", "reload"]
+SHOOT, DODGE, RELOAD = range(len(ACTIONS))
+
+MAGIC = b"showdown-policy-1\n"
+HEADER = struct.Struct("<HH")
+SCALE = 255
+# Dodge differences (own dodges minus the opponent's) go from
+# -MAX_DODGE_DIFF to MAX_DODGE_DIFF, see clamp
+MAX_DODGE_DIFF = TOTAL_TURNS + 1
+EPSILON = 1e-9
+
+
+def clamp(turn, diff):
+    """
+    Past the number of turns left, the dodge difference
+    cannot change the outcome anymore.
+    """
+    limit = TOTAL_TURNS - turn + 1
+    return max(-limit, min(limit, diff))
+
+
+def available(bullets):
+    # Shooting without bullets is worse than reloading
+    return [SHOOT, DODGE, RELOAD] if bullets else [DODGE, RELOAD]
+
+
+def solve_linear(matrix, vector):
+    """
+    Solution of a small linear system, None if it is singular.
+    """
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < EPSILON:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(size):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                rows[row] = [a - factor * b
+                             for a, b in zip(rows[row], rows[column])]
+    return [rows[row][size] / rows[row][row] for row in range(size)]
+
+
+def equalizer(payoffs):
+    """
+    Mixed strategy of the row player that gives the same payoff whatever
+    the column, and that payoff (None if there is none).
+    """
+    size = len(payoffs)
+    if size == 2:
+        (a, b), (c, d) = payoffs
+        denominator = a - b - c + d
+        if abs(denominator) < EPSILON:
+            return None
+        p = (d - c) / denominator
+        if not -EPSILON < p < 1 + EPSILON:
+            return None
+        return [p, 1 - p], p * a + (1 - p) * c
+    # Unknowns: the probabilities, then the payoff
+    matrix = [[payoffs[row][column] for row in range(size)] + [-1.]
+              for column in range(size)]
+    matrix.append([1.] * size + [0.])
+    solution = solve_linear(matrix, [0.] * size + [1.])
+    if solution is None or min(solution[:-1]) < -EPSILON:
+        return None
+    return solution[:-1], solution[-1]
+
+
+def solve_matrix_game(payoffs):
+    """
+    Optimal strategy of the row player (who maximizes payoffs) and value
+    of the game. Some square submatrix has optimal strategies that equalize
+    its rows and columns (Shapley and Snow), so they are tried in turn.
+    """
+    num_rows, num_columns = len(payoffs), len(payoffs[0])
+    # Saddle point: no need to mix
+    lower = max(min(row) for row in payoffs)
+    upper = min(max(payoffs[row][column] for row in range(num_rows))
+                for column in range(num_columns))
+    if upper - lower < EPSILON:
+        best = max(range(num_rows), key=lambda row: min(payoffs[row]))
+        return [float(row == best) for row in range(num_rows)], lower
+
+    transposed = [[-payoffs[row][column] for row in range(num_rows)]
+                  for column in range(num_columns)]
+    for size in range(2, min(num_rows, num_columns) + 1):
+        for rows in itertools.combinations(range(num_rows), size):
+            for columns in itertools.combinations(range(num_columns), size):
+                row_solution = equalizer(
+                    [[payoffs[row][column] for column in columns]
+                     for row in rows])
+                if row_solution is None:
+                    continue
+                column_solution = equalizer(
+                    [[transposed[column][row] for row in rows]
+                     for column in columns])
+                if column_solution is None:
+                    continue
+                row_strategy, value = row_solution
+                column_strategy, __ = column_solution
+                # Neither player can do better with other actions
+                if all(sum(p * payoffs[row][column]
+                           for p, row in zip(row_strategy, rows))
+                       >= value - EPSILON
+                       for column in range(num_columns)) \
+                        and all(sum(p * payoffs[row][column]
+                                    for p, column
+                                    in zip(column_strategy, columns))
+                                <= value + EPSILON
+                                for row in range(num_rows)):
+                    strategy = [0.] * num_rows
+                    for p, row in zip(row_strategy, rows):
+                        strategy[row] = max(p, 0.)
+                    total = sum(strategy)
+                    return [p / total for p in strategy], value
+    raise ArithmeticError(f"No solution found for {payoffs}")
+
+
+class Solver:
+    """
+    Values and optimal strategies of the states, from the point of view
+    of one of the bots ("own", the other one being "opp"), computed as they
+    are needed and kept.
+    """
+    def __init__(self):
+        # (turn, own bullets, opp bullets, dodge difference):
+        # probabilities of ACTIONS
+        self.strategies = {}
+        self.value = functools.lru_cache(maxsize=None)(self.value)
+
+    def value(self, turn, own, opp, diff):
+        """
+        Probability that own wins, turn turns having been played.
+        """
+        if turn == TOTAL_TURNS:
+            return 1. if diff < 0 else 0. if diff > 0 else .5
+        actions = available(own)
+        opp_actions = available(opp)
+        payoffs = [[self.outcome(turn, own, opp, diff, action, opp_action)
+                    for opp_action in opp_actions]
+                   for action in actions]
+        strategy, value = solve_matrix_game(payoffs)
+        probabilities = [0.] * len(ACTIONS)
+        for action, probability in zip(actions, strategy):
+            probabilities[action] = probability
+        self.strategies[turn, own, opp, diff] = probabilities
+        return value
+
+    def outcome(self, turn, own, opp, diff, action, opp_action):
+        """
+        Value once both actions are played, with the rules of
+        game.play_turn.
+        """
+        if action == SHOOT and opp_action == RELOAD:
+            return 1.
+        if opp_action == SHOOT and action == RELOAD:
+            return 0.
+        own = min(own - (action == SHOOT) + (action == RELOAD), MAX_BULLETS)
+        opp = min(opp - (opp_action == SHOOT) + (opp_action == RELOAD),
+                  MAX_BULLETS)
+        diff += (action == DODGE) - (opp_action == DODGE)
+        return self.value(turn + 1, own, opp, clamp(turn + 1, diff))
+
+    def strategy(self, turn, own, opp, diff):
+        diff = clamp(turn, diff)
+        self.value(turn, own, opp, diff)
+        return self.strategies[turn, own, opp, diff]
+
+
+def states():
+    """
+    Every state a game can be in: bullets and dodges
+    can only change by one per turn.
+    """
+    for turn in range(TOTAL_TURNS):
+        bullets = range(min(turn + 1, MAX_BULLETS) + 1)
+        for own, opp in itertools.product(bullets, bullets):
+            for diff in range(-min(turn, MAX_DODGE_DIFF),
+                              min(turn, MAX_DODGE_DIFF) + 1):
+                yield turn, own, opp, diff
+
+
+def quantize(probabilities):
+    shoot = round(probabilities[SHOOT] * SCALE)
+    dodge = min(round(probabilities[DODGE] * SCALE), SCALE - shoot)
+    return shoot, dodge
+
+
+def solve(path):
+    """
+    Write the optimal policy to path. Return the probability that the
+    first player wins if both play it (1/2 as the game is symmetric),
+    and the number of states solved.
+    """
+    solver = Solver()
+    table = bytearray(Policy.size())
+    for turn, own, opp, diff in states():
+        offset = Policy.offset(turn, own, opp, diff)
+        table[offset:offset + 2] = bytes(quantize(
+            solver.strategy(turn, own, opp, diff)))
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(HEADER.pack(TOTAL_TURNS, MAX_BULLETS))
+        file.write(table)
+    return solver.value(0, 1, 1, 0), len(solver.strategies)
+
+
+class Policy:
+    """
+    Optimal policy read from a policy file (see solve).
+    """
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a policy file")
+            bounds = HEADER.unpack(file.read(HEADER.size))
+            if bounds != (TOTAL_TURNS, MAX_BULLETS):
+                raise ValueError(
+                    f"{path} was solved for {bounds[0]} turns and "
+                    f"{bounds[1]} bullets, run showdown solve again")
+            self.table = file.read()
+        if len(self.table) != self.size():
+            raise ValueError(f"{path} is truncated")
+
+    @staticmethod
+    def offset(turn, own, opp, diff):
+        diff = clamp(turn, diff)
+        return 2 * ((((turn * (MAX_BULLETS + 1)) + own) * (MAX_BULLETS + 1)
+                     + opp) * (2 * MAX_DODGE_DIFF + 1)
+                    + diff + MAX_DODGE_DIFF)
+
+    @classmethod
+    def size(cls):
+        return cls.offset(TOTAL_TURNS, 0, 0, -MAX_DODGE_DIFF)
+
+    def probabilities(self, turn, own, opp, diff):
+        """
+        Probabilities to shoot, dodge and reload on turn (starting at 0)
+        with own and opp bullets and diff more dodges than the opponent.
+        """
+        offset = self.offset(turn, own, opp, diff)
+        shoot, dodge = self.table[offset], self.table[offset + 1]
+        return shoot / SCALE, dodge / SCALE, (SCALE - shoot - dodge) / SCALE
@@ -0,0 +1,89 @@
+import math
+
+Z_95 = 1.96
+
+
+class SPRT:
+    """
+    Two one-sided sequential probability ratio tests: "a wins with
+    probability 1/2" against "a wins with probability 1/2 + delta"
+    (a is stronger), and the same for b. Both bots are found equal once
+    both tests decide that they are not stronger, so that the run can
+    stop when they are (within delta).
+    alpha is the probability of deciding that a bot is stronger when they
+    are equal, beta the probability of deciding that they are equal when
+    one of them wins 1/2 + delta of the games.
+    """
+    def __init__(self, alpha=0.05, beta=0.05, delta=0.05):
+        self.alpha = alpha
+        self.beta = beta
+        self.delta = delta
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        # Log-likelihood ratio brought by a win (and a loss)
+        # of the bot tested for being stronger
+        self.win = math.log(1 + 2 * delta)
+        self.loss = math.log(1 - 2 * delta)
+        # Log-likelihood ratio of "a (or b) is stronger", and whether the
+        # test decided it is (True) or not (False), by key
+        self.llr = {"a": 0., "b": 0.}
+        self.stronger = {"a": None, "b": None}
+        self.victories = {"a": 0, "b": 0}
+
+    def add(self, winner_key):
+        self.victories[winner_key] += 1
+        for key in "ab":
+            if self.stronger[key] is not None:
+                # That test is over
+                continue
+            self.llr[key] += self.win if key == winner_key else self.loss
+            if self.llr[key] >= self.upper:
+                self.stronger[key] = True
+            elif self.llr[key] <= self.lower:
+                self.stronger[key] = False
+
+    @property
+    def decision(self):
+        """
+        "a" or "b" once one of them is shown to be stronger, "equal" once
+        neither is, None until then.
+        """
+        for key in "ab":
+            if self.stronger[key]:
+                return key
+        if self.stronger["a"] is False and self.stronger["b"] is False:
+            return "equal"
+        return None
+
+    def report(self, names):
+        games = sum(self.victories.values())
+        decision = self.decision
+        if decision == "equal":
+            line = (f"no difference of {100 * self.delta:g}% or more, "
+                    f"decided after {games} games (error probability "
+                    f"{100 * self.beta:g}%)")
+        elif decision:
+            line = (f"{decision} ({names[decision]}) is stronger, decided "
+                    f"after {games} games (error probability "
+                    f"{100 * self.alpha:g}%)")
+        else:
+            line = f"no decision after {games} games"
+        low, high = wilson_interval(self.victories["a"], games)
+        return [
+            line,
+            f"a wins {100 * self.victories['a'] / games:.1f}% "
+            f"(95% interval {100 * low:.1f}% - {100 * high:.1f}%), "
+            f"test: 50% against 50% ± {100 * self.delta:g}%",
+        ]
+
+
+def wilson_interval(wins, games):
+    if not games:
+        return 0., 1.
+    rate = wins / games
+    z2 = Z_95 ** 2
+    center = (rate + z2 / (2 * games)) / (1 + z2 / games)
+    half_width = (Z_95 * math.sqrt(rate * (1 - rate) / games
+                                   + z2 / (4 * games ** 2))
+                  / (1 + z2 / games))
+    return center - half_width, center + half_width
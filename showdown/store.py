@@ -0,0 +1,160 @@
+"""
+Results store: game records (see game.result) in a SQLite database, by the
+fingerprints of both bots, so that later runs only play the games that are
+missing.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+from showdown import plugins
+from showdown.zygote import example_script
+
+# Records are committed by batches of COMMIT_BATCH records,
+# or at least every COMMIT_INTERVAL seconds
+COMMIT_BATCH = 1000
+COMMIT_INTERVAL = 1.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bots (
+    fingerprint TEXT PRIMARY KEY,
+    command TEXT NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    bot_a TEXT NOT NULL REFERENCES bots (fingerprint),
+    bot_b TEXT NOT NULL REFERENCES bots (fingerprint),
+    winner TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    played_at REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_seat ON games (bot_a, bot_b, winner);
+"""
+
+
+def fingerprint(call_args):
+    """
+    Hash of the command line and of the files it runs: the executable,
+    the script of showdown example NAME, any argument that is a file
+    (a script), or the module of a plugin.
+    """
+    digest = hashlib.sha256()
+    digest.update("\0".join(call_args).encode("utf-8"))
+    for path in bot_files(call_args):
+        digest.update(b"\0")
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 16), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def bot_files(call_args):
+    if plugins.is_plugin(call_args):
+        module = call_args[0][len(plugins.PREFIX):].split(":")[0]
+        try:
+            spec = importlib.util.find_spec(module)
+        except (ImportError, ValueError):
+            spec = None
+        if spec and spec.origin and os.path.isfile(spec.origin):
+            yield spec.origin
+        return
+
+    executable = shutil.which(call_args[0])
+    if executable:
+        yield os.path.realpath(executable)
+    example = example_script(call_args)
+    if example is not None and os.path.isfile(example):
+        # Not an argument of the showdown script, but what it runs
+        yield example
+    for arg in call_args[1:]:
+        if os.path.isfile(arg):
+            yield arg
+
+
+class Store:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+        self.committed_at = time.monotonic()
+
+    def add_bot(self, bot, call_args):
+        self.connection.execute(
+            "INSERT OR IGNORE INTO bots (fingerprint, command) VALUES (?, ?)",
+            (bot, " ".join(call_args)))
+        self.connection.commit()
+
+    def winners(self, bot_a, bot_b, limit):
+        """
+        Winners ("a" or "b") of the first limit games between bot_a
+        and bot_b, in these seats.
+        """
+        return [winner for winner, in self.connection.execute(
+            "SELECT winner FROM games WHERE bot_a = ? AND bot_b = ? "
+            "ORDER BY id LIMIT ?", (bot_a, bot_b, limit))]
+
+    def add(self, bot_a, bot_b, record):
+        for bot, key in [(bot_a, "a"), (bot_b, "b")]:
+            self.connection.execute(
+                "UPDATE bots SET name = ? WHERE fingerprint = ?",
+                (record[key]["name"], bot))
+        self.connection.execute(
+            "INSERT INTO games (bot_a, bot_b, winner, turns, played_at, "
+            "record) VALUES (?, ?, ?, ?, ?, ?)",
+            (bot_a, bot_b, record["winner"], record["turns"], time.time(),
+             json.dumps(record, separators=(",", ":"))))
+        self.pending += 1
+        if (self.pending >= COMMIT_BATCH
+                or time.monotonic() - self.committed_at > COMMIT_INTERVAL):
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+        self.committed_at = time.monotonic()
+
+    def head_to_head(self):
+        """
+        Games and victories by pair of bots and seats. Bots are shown
+        with the beginning of their fingerprint, as several versions of
+        a bot may have the same command line.
+        """
+        return self.connection.execute("""
+            SELECT a.command || ' @' || substr(a.fingerprint, 1, 8),
+                   b.command || ' @' || substr(b.fingerprint, 1, 8),
+                   count(*),
+                   sum(games.winner = 'a'), sum(games.winner = 'b')
+            FROM games
+            JOIN bots AS a ON a.fingerprint = games.bot_a
+            JOIN bots AS b ON b.fingerprint = games.bot_b
+            GROUP BY games.bot_a, games.bot_b
+            ORDER BY a.command, b.command
+        """).fetchall()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def print_head_to_head(path):
+    store = Store(path)
+    try:
+        rows = store.head_to_head()
+    finally:
+        store.close()
+    if not rows:
+        print("No games")
+        return
+    width_a = max(len(row[0]) for row in rows)
+    width_b = max(len(row[1]) for row in rows)
+    print(f"{'a':<{width_a}}  {'b':<{width_b}}  "
+          f"{'games':>6}  {'a wins':>6}  {'b wins':>6}")
+    for command_a, command_b, games, wins_a, wins_b in rows:
+        print(f"{command_a:<{width_a}}  {command_b:<{width_b}}  "
+              f"{games:>6}  {wins_a:>6}  {wins_b:>6}")
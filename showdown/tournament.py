@@ -0,0 +1,246 @@
+import itertools
+import math
+import multiprocessing
+
+from showdown.bulk import (LOG_LEVEL, QUEUED_PER_WORKER, closing,
+                           imap_bounded, init_worker, process)
+from showdown.store import Store, fingerprint
+
+# Elo scale: a difference of 400 points is 10 to 1 odds
+ELO_SCALE = 400 / math.log(10)
+# Virtual draw added to every pairing that was played, so that a bot that
+# never won (or never lost) still gets a finite rating
+PRIOR_GAMES = 1.
+Z_95 = 1.96
+
+
+def play(i, j, call_args_a, call_args_b, persistent, log_level, limits,
+         timing, zygote):
+    return i, j, process(call_args_a, call_args_b, persistent, log_level,
+                         limits=limits, timing=timing, zygote=zygote)
+
+
+def round_robin_pairings(num_bots):
+    return list(itertools.combinations(range(num_bots), 2))
+
+
+def swiss_pairings(scores, played, byes):
+    """
+    Pair bots with close scores that did not meet yet.
+    With an odd number of bots, the lowest ranked bot that did not sit out
+    yet sits out (and is added to byes).
+    """
+    ranking = sorted(range(len(scores)), key=lambda i: -scores[i])
+    if len(ranking) % 2:
+        bye = next((i for i in reversed(ranking) if i not in byes),
+                   ranking[-1])
+        ranking.remove(bye)
+        byes.add(bye)
+    pairings = []
+    while len(ranking) > 1:
+        first = ranking.pop(0)
+        opponent = next((other for other in ranking
+                         if frozenset((first, other)) not in played),
+                        ranking[0])
+        ranking.remove(opponent)
+        pairings.append((first, opponent))
+    return pairings
+
+
+def schedule(pairings, games):
+    """
+    Every pairing plays games games in each seat order.
+    """
+    for i, j in pairings:
+        for __ in range(games):
+            yield i, j
+            yield j, i
+
+
+def bradley_terry(wins, num_bots, iterations=1000, tolerance=1e-9):
+    """
+    Maximum likelihood Bradley-Terry strengths (MM algorithm) from
+    wins[i, j], the number of games won by i against j.
+    Return ratings on the Elo scale (mean 0) and their 95% half-width.
+    Every bot should have played.
+    """
+    if not num_bots:
+        return [], []
+    wins = dict(wins)
+    for i, j in {tuple(sorted(pair)) for pair in wins}:
+        for pair in [(i, j), (j, i)]:
+            wins[pair] = wins.get(pair, 0.) + PRIOR_GAMES / 2
+
+    games = {}
+    for (i, j), count in wins.items():
+        games[frozenset((i, j))] = games.get(frozenset((i, j)), 0.) + count
+    total_wins = [sum(count for (i, __), count in wins.items() if i == k)
+                  for k in range(num_bots)]
+
+    strengths = [1.] * num_bots
+    for __ in range(iterations):
+        new_strengths = []
+        for k in range(num_bots):
+            denominator = sum(
+                count / (strengths[k] + strengths[other])
+                for pair, count in games.items() if k in pair
+                for other in pair - {k})
+            new_strengths.append(
+                total_wins[k] / denominator if denominator else 1.)
+        mean_log = sum(math.log(s) for s in new_strengths) / num_bots
+        new_strengths = [s / math.exp(mean_log) for s in new_strengths]
+        change = max(abs(new - old)
+                     for new, old in zip(new_strengths, strengths))
+        strengths = new_strengths
+        if change < tolerance:
+            break
+
+    # Observed information on log-strengths, a graph Laplacian whose
+    # pseudo-inverse is the covariance of mean-zero ratings.
+    information = [[0.] * num_bots for __ in range(num_bots)]
+    for pair, count in games.items():
+        i, j = sorted(pair)
+        p = strengths[i] / (strengths[i] + strengths[j])
+        weight = count * p * (1 - p)
+        information[i][i] += weight
+        information[j][j] += weight
+        information[i][j] -= weight
+        information[j][i] -= weight
+    covariance = pseudo_inverse(information)
+
+    ratings = [ELO_SCALE * math.log(s) for s in strengths]
+    errors = [Z_95 * ELO_SCALE * math.sqrt(max(covariance[k][k], 0.))
+              for k in range(num_bots)]
+    return ratings, errors
+
+
+def pseudo_inverse(laplacian):
+    """
+    Pseudo-inverse of a connected graph Laplacian L:
+    (L + J/n)^-1 - J/n, J being the all-ones matrix.
+    """
+    n = len(laplacian)
+    matrix = [[laplacian[i][j] + 1 / n for j in range(n)]
+              + [float(i == j) for j in range(n)]
+              for i in range(n)]
+    # Gauss-Jordan elimination with partial pivoting
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda row: abs(matrix[row][col]))
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        pivot_value = matrix[col][col]
+        if abs(pivot_value) < 1e-12:
+            # Disconnected pairing graph: ratings are not comparable
+            return [[math.inf] * n for __ in range(n)]
+        matrix[col] = [value / pivot_value for value in matrix[col]]
+        for row in range(n):
+            if row != col and matrix[row][col]:
+                factor = matrix[row][col]
+                matrix[row] = [value - factor * pivot_row_value
+                               for value, pivot_row_value
+                               in zip(matrix[row], matrix[col])]
+    return [[matrix[i][n + j] - 1 / n for j in range(n)] for i in range(n)]
+
+
+def run_tournament(bots, games, swiss_rounds=None, jobs=None,
+                   persistent=False, log_level=LOG_LEVEL, limits=None,
+                   timing="wall", store=None, zygote=False):
+    """
+    bots is a list of call_args. With swiss_rounds, play that many rounds
+    of Swiss pairings, otherwise every bot meets every other one.
+    With store (a path, see Store), games already played by the same bots
+    are not played again. With zygote, Python bots are forked from
+    a zygote (see showdown.zygote).
+    """
+    num_bots = len(bots)
+    wins = {}
+    scores = [0] * num_bots
+    played = set()
+    byes = set()
+    # Stored games used so far, by seats
+    used = {}
+
+    if store:
+        store = Store(store)
+        fingerprints = [fingerprint(call_args) for call_args in bots]
+        for bot, call_args in zip(fingerprints, bots):
+            store.add_bot(bot, call_args)
+
+    def tally(i, j, winner_key):
+        winner, loser = (i, j) if winner_key == "a" else (j, i)
+        wins[winner, loser] = wins.get((winner, loser), 0) + 1
+        scores[winner] += 1
+
+    if swiss_rounds:
+        rounds = swiss_rounds
+    else:
+        rounds = 1
+
+    jobs = jobs or multiprocessing.cpu_count()
+    with closing(multiprocessing.Pool(jobs, initializer=init_worker)) as pool:
+        for num_round in range(rounds):
+            if swiss_rounds:
+                pairings = swiss_pairings(scores, played, byes)
+                print(f"Round {num_round + 1}: " + ", ".join(
+                    f"{i + 1}-{j + 1}" for i, j in pairings))
+            else:
+                pairings = round_robin_pairings(num_bots)
+            played.update(frozenset(pairing) for pairing in pairings)
+
+            to_play = list(schedule(pairings, games))
+            if store:
+                to_play = []
+                for i, j in sorted(set(schedule(pairings, games))):
+                    stored = store.winners(
+                        fingerprints[i], fingerprints[j],
+                        limit=used.get((i, j), 0) + games)
+                    for winner_key in stored[used.get((i, j), 0):]:
+                        tally(i, j, winner_key)
+                    used[i, j] = used.get((i, j), 0) + games
+                    # Games played now are stored after these ones
+                    to_play += [(i, j)] * (used[i, j] - len(stored))
+
+            tasks = (
+                (i, j, bots[i], bots[j], persistent, log_level, limits,
+                 timing, zygote)
+                for i, j in to_play)
+            for i, j, record in imap_bounded(
+                    pool, play, tasks,
+                    window=QUEUED_PER_WORKER * jobs):
+                tally(i, j, record["winner"])
+                if store:
+                    store.add(fingerprints[i], fingerprints[j], record)
+                print(".", end="", flush=True)
+            print()
+
+    if store:
+        store.close()
+    print_ranking(bots, wins, scores)
+
+
+def print_ranking(bots, wins, scores):
+    num_bots = len(bots)
+    games = [sum(count for pair, count in wins.items() if k in pair)
+             for k in range(num_bots)]
+
+    # Bots that never played cannot be rated
+    rated = [k for k in range(num_bots) if games[k]]
+    index = {k: i for i, k in enumerate(rated)}
+    rated_ratings, rated_errors = bradley_terry(
+        {(index[i], index[j]): count for (i, j), count in wins.items()},
+        len(rated))
+    ratings = [-math.inf] * num_bots
+    errors = [math.inf] * num_bots
+    for k, rating, error in zip(rated, rated_ratings, rated_errors):
+        ratings[k] = rating
+        errors[k] = error
+
+    names = [" ".join(call_args) for call_args in bots]
+    width = max(len(name) for name in names)
+    print(f"{'#':>3}  {'bot':<{width}}  {'rating':>14}  "
+          f"{'games':>6}  {'wins':>6}  {'win %':>6}")
+    ranking = sorted(range(num_bots), key=lambda k: -ratings[k])
+    for rank, k in enumerate(ranking, 1):
+        win_rate = 100 * scores[k] / games[k] if games[k] else 0.
+        print(f"{rank:>3}  {names[k]:<{width}}  "
+              f"{ratings[k]:>+6.0f} ± {errors[k]:<5.0f}  "
+              f"{games[k]:>6}  {scores[k]:>6}  {win_rate:>6.1f}")
@@ -1,10 +1,13 @@
 import curses
+import functools
 import queue
 import time
 import threading
 import sys
 
 from showdown import game
+from showdown.metrics import timings_report
+from showdown.replay import ReplayReader, ReplayWriter
 
 
 DRAWINGS = dict(
@@ -127,31 +130,48 @@ def loop(window, states_queue):
     curses.curs_set(0)
     window.nodelay(True)
 
+    screen = new_screen(window)
     for __ in draw_states(states_queue=states_queue,
-                          window=window):
-        window.refresh()
+                          screen=screen):
+        # Only the cells that changed are sent to the terminal
+        window.noutrefresh()
+        curses.doupdate()
         curses.update_lines_cols()
         time.sleep(REFRESH_TIME)
-        window.erase()
         if get_keypress(window) == "q":
             sys.exit(0)
 
 
-def draw_states(states_queue, window):
+def new_screen(window):
+    """
+    What is on screen: the window, a copy of what only changes with the
+    state (static), and the regions of the window where moving things
+    were drawn (dirty), to be restored from static on the next frame.
+    """
+    return {
+        "window": window,
+        "static": None,
+        # What static was drawn for
+        "static_for": None,
+        "dirty": [],
+    }
+
+
+def draw_states(states_queue, screen):
     while True:
         state = states_queue.get()
-        for __ in draw_state(state=state, window=window):
+        for __ in draw_state(state=state, screen=screen):
             yield
 
-        if "winner_key" in state:
+        if state.winner_key:
             begin = time.time()
             while time.time() - begin < ENDING_TIME:
-                draw_step(window, 0, state, end=True)
+                draw_step(screen, 0, state, end=True)
                 yield
             break
 
 
-def draw_state(state, window):
+def draw_state(state, screen):
     """
     Generator (one may say coroutine...)
     that at each call draws one frame,
@@ -160,7 +180,7 @@ def draw_state(state, window):
     begin = time.time()
     turn_step = 0.
     while turn_step < 1.:
-        draw_step(window, turn_step, state)
+        draw_step(screen, turn_step, state)
         yield
         turn_step = (time.time() - begin) / TURN_TIME
 
@@ -180,6 +200,21 @@ def get_keypress(window):
     return keypress
 
 
+@functools.lru_cache(maxsize=None)
+def sprite(command, initial, dead, side):
+    """
+    Lines of a character, as seen from the given side ("a" on the left,
+    "b" on the right, mirrored).
+    """
+    drawing = DRAWINGS[command].replace(DRAWINGS["initial"], initial)
+    if dead:
+        drawing = drawing.replace(DRAWINGS["eye"], DRAWINGS["eye-dead"])
+    drawing_lines = drawing.splitlines()
+    if side == "b":
+        drawing_lines = mirror_character(drawing_lines)
+    return tuple(drawing_lines)
+
+
 def mirror_character(drawing_lines):
     tmp_char = "@"
     result = []
@@ -204,6 +239,27 @@ def draw(window, x, y, drawing):
         spaces = len(line) - len(line.lstrip())
         window.addstr(y + i, x + spaces, line.lstrip())
 
+
+def draw_moving(screen, x, y, drawing):
+    """
+    Draw something that will be erased on the next frame.
+    """
+    screen["dirty"].append(
+        (y, x, len(drawing), max(len(line) for line in drawing)))
+    draw(screen["window"], x, y, drawing)
+
+
+def restore_dirty(screen):
+    window = screen["window"]
+    total_height, total_width = window.getmaxyx()
+    for y, x, height, width in screen["dirty"]:
+        max_y = min(y + height, total_height) - 1
+        max_x = min(x + width, total_width) - 1
+        if max_y >= y and max_x >= x:
+            screen["static"].overwrite(window, y, x, y, x, max_y, max_x)
+    screen["dirty"] = []
+
+
 def draw_box(window, x1, y1, x2, y2,
              horizontal="-", vertical="|", corner="+"):  # pylint: disable=unbalanced-tuple-unpacking
     draw(window, x1 + 1, y1, [horizontal * (x2 - x1 - 1)])
@@ -215,33 +271,38 @@ def draw_box(window, x1, y1, x2, y2,
     draw(window, x2, y1, [corner])
     draw(window, x2, y2, [corner])
 
-def draw_step(window, turn_step, state, end=False):
-    total_height, total_width = window.getmaxyx()
+def draw_step(screen, turn_step, state, end=False):
+    """
+    Draw one frame. What depends on the state only is drawn once (see
+    draw_static), then only the clock, the bullets and the noises are
+    drawn again, over what they covered on the previous frame.
+    """
+    total_height, total_width = screen["window"].getmaxyx()
 
     a_x = ((total_width - DISTANCE) // 2)  - CHARACTER_SIZE
     b_x = int((total_width + DISTANCE) // 2)
 
     characters_y = total_height - 5 - DRAWINGS["shoot"].count("\n")
 
-    command_a = state["a"]["command"]
-    command_b = state["b"]["command"]
+    command_a = state.a.latest_command.value
+    command_b = state.b.latest_command.value
 
-    draw_clock(window=window,
-               turn_step=turn_step,
-               total_width=total_width)
-    draw_characters(window=window,
+    static_for = (state, end, total_height, total_width)
+    if screen["static_for"] != static_for:
+        draw_static(screen=screen,
                     state=state,
                     end=end,
-                    command_a=command_a,
-                    command_b=command_b,
                     a_x=a_x,
                     b_x=b_x,
                     characters_y=characters_y)
-    draw_description(window=window,
-                     state=state,
-                     total_width=total_width,
-                     total_height=total_height)
-    draw_bullets(window=window,
+        screen["static_for"] = static_for
+    else:
+        restore_dirty(screen)
+
+    draw_clock(screen=screen,
+               turn_step=turn_step,
+               total_width=total_width)
+    draw_bullets(screen=screen,
                  turn_step=turn_step,
                  command_a=command_a,
                  command_b=command_b,
@@ -249,7 +310,7 @@ def draw_step(window, turn_step, state, end=False):
                  b_x=b_x,
                  characters_y=characters_y,
                  end=end)
-    draw_noises(window=window,
+    draw_noises(screen=screen,
                 turn_step=turn_step,
                 command_a=command_a,
                 command_b=command_b,
@@ -257,44 +318,60 @@ def draw_step(window, turn_step, state, end=False):
                 b_x=b_x,
                 characters_y=characters_y,
                 end=end)
-    draw_boxes(window=window,
+
+
+def draw_static(screen, state, end, a_x, b_x, characters_y):
+    """
+    Draw what only changes with the state to screen["static"],
+    and copy it to the window.
+    """
+    window = screen["window"]
+    total_height, total_width = window.getmaxyx()
+    static = screen["static"]
+    if static is None or static.getmaxyx() != (total_height, total_width):
+        static = screen["static"] = curses.newwin(total_height, total_width)
+    static.erase()
+
+    draw_characters(window=static,
+                    state=state,
+                    end=end,
+                    command_a=state.a.latest_command.value,
+                    command_b=state.b.latest_command.value,
+                    a_x=a_x,
+                    b_x=b_x,
+                    characters_y=characters_y)
+    draw_description(window=static,
+                     state=state,
+                     total_width=total_width,
+                     total_height=total_height)
+    draw_boxes(window=static,
                state=state,
                total_width=total_width)
-    draw_turns(window=window,
+    draw_turns(window=static,
                state=state,
                total_width=total_width)
 
+    static.overwrite(window)
+    screen["dirty"] = []
 
-def draw_clock(window, turn_step, total_width):
+
+def draw_clock(screen, turn_step, total_width):
     # Clock
     clock = DRAWINGS["clocks"][int(turn_step * len(DRAWINGS["clocks"]))]
     clock_lines = clock.splitlines()
     clock_x = (total_width - len(clock_lines[0])) // 2
     clock_y = 2
 
-    draw(window=window, x=clock_x, y=clock_y, drawing=clock_lines)
+    draw_moving(screen=screen, x=clock_x, y=clock_y, drawing=clock_lines)
 
 
 def draw_characters(window, state, end, command_a, command_b,
                     a_x, b_x, characters_y):
-    # Characters
-
-    drawing_a = DRAWINGS[command_a].replace(
-        DRAWINGS["initial"], state["a"]["name"][0])
-    drawing_b = DRAWINGS[command_b].replace(
-        DRAWINGS["initial"], state["b"]["name"][0])
-
-    # Eyes
-    if end:
-        if state["winner_key"] == "a":
-            drawing_b = drawing_b.replace(
-                DRAWINGS["eye"], DRAWINGS["eye-dead"])
-        else:
-            drawing_a = drawing_a.replace(
-                DRAWINGS["eye"], DRAWINGS["eye-dead"])
-
-    drawing_lines_a = drawing_a.splitlines()
-    drawing_lines_b = mirror_character(drawing_b.splitlines())
+    # Characters, with dead eyes for the loser
+    drawing_lines_a = sprite(command_a, state.a.name[0],
+                             end and state.winner_key == "b", "a")
+    drawing_lines_b = sprite(command_b, state.b.name[0],
+                             end and state.winner_key == "a", "b")
 
     draw(window=window,
          x=a_x,
@@ -309,7 +386,7 @@ def draw_characters(window, state, end, command_a, command_b,
 
 def draw_description(window, state, total_width, total_height):
     # Description
-    description = state["description"]
+    description = state.description
     description_x = (total_width - len(description)) // 2
     description_y = total_height - 2
 
@@ -319,7 +396,7 @@ def draw_description(window, state, total_width, total_height):
          drawing=[description])
 
 
-def draw_bullets(window, turn_step, command_a, command_b,
+def draw_bullets(screen, turn_step, command_a, command_b,
                  a_x, b_x, characters_y, end):
     shoot_a = command_a == "shoot"
     shoot_b = command_b == "shoot"
@@ -331,51 +408,51 @@ def draw_bullets(window, turn_step, command_a, command_b,
         if shoot_a:
             bullet_ax = a_x + CHARACTER_SIZE + int(DISTANCE * turn_step)
             if not (turn_step > 0.5 and shoot_b):
-                draw(window=window,
-                     x=bullet_ax, y=bullet_y,
-                     drawing=[DRAWINGS["bullet"]])
+                draw_moving(screen=screen,
+                            x=bullet_ax, y=bullet_y,
+                            drawing=[DRAWINGS["bullet"]])
 
         if shoot_b:
             bullet_ax = b_x - int(DISTANCE * turn_step)
 
             if not (turn_step > 0.5 and shoot_a):
-                draw(window=window,
-                     x=bullet_ax, y=bullet_y,
-                     drawing=[DRAWINGS["bullet"]])
+                draw_moving(screen=screen,
+                            x=bullet_ax, y=bullet_y,
+                            drawing=[DRAWINGS["bullet"]])
 
 
-def draw_noises(window, turn_step, command_a, command_b,
+def draw_noises(screen, turn_step, command_a, command_b,
                 a_x, b_x, characters_y, end):
     # Noises
     noisy_commands = "shoot shoot_no_bullet reload".split()
     if not end and turn_step < 0.5:
         if command_a in noisy_commands:
             if command_a == "shoot":
-                draw(window=window,
-                     x=a_x + CHARACTER_SIZE - 2, y=characters_y + 1,
-                     drawing=[DRAWINGS["bang"]])
+                draw_moving(screen=screen,
+                            x=a_x + CHARACTER_SIZE - 2, y=characters_y + 1,
+                            drawing=[DRAWINGS["bang"]])
             elif command_a == "shoot_no_bullet":
-                draw(window=window,
-                     x=a_x + CHARACTER_SIZE - 2, y=characters_y + 1,
-                     drawing=[DRAWINGS["click"]])
+                draw_moving(screen=screen,
+                            x=a_x + CHARACTER_SIZE - 2, y=characters_y + 1,
+                            drawing=[DRAWINGS["click"]])
             else:  # reload
-                draw(window=window,
-                     x=a_x +  - 2 - len(DRAWINGS["click"]), y=characters_y + 1,
-                     drawing=[DRAWINGS["click"]])
+                draw_moving(screen=screen,
+                            x=a_x +  - 2 - len(DRAWINGS["click"]), y=characters_y + 1,
+                            drawing=[DRAWINGS["click"]])
 
         if command_b in noisy_commands:
             if command_b == "shoot":
-                draw(window=window,
-                     x=b_x + 2 - len(DRAWINGS["bang"]), y=characters_y + 1,
-                     drawing=[DRAWINGS["bang"]])
+                draw_moving(screen=screen,
+                            x=b_x + 2 - len(DRAWINGS["bang"]), y=characters_y + 1,
+                            drawing=[DRAWINGS["bang"]])
             elif command_b == "shoot_no_bullet":
-                draw(window=window,
-                     x=b_x + 2 - len(DRAWINGS["click"]), y=characters_y + 1,
-                     drawing=[DRAWINGS["click"]])
+                draw_moving(screen=screen,
+                            x=b_x + 2 - len(DRAWINGS["click"]), y=characters_y + 1,
+                            drawing=[DRAWINGS["click"]])
             else:  # reload
-                draw(window=window,
-                     x=b_x + CHARACTER_SIZE + 2, y=characters_y + 1,
-                     drawing=[DRAWINGS["click"]])
+                draw_moving(screen=screen,
+                            x=b_x + CHARACTER_SIZE + 2, y=characters_y + 1,
+                            drawing=[DRAWINGS["click"]])
 
 
 def draw_boxes(window, state, total_width):
@@ -389,25 +466,25 @@ def draw_boxes(window, state, total_width):
 
     # Names in the boxes
     draw(window=window,
-         x=total_width // 2 - 8 - len(state["a"]["name"]),
+         x=total_width // 2 - 8 - len(state.a.name),
          y=4,
-         drawing=[state["a"]["name"]])
+         drawing=[state.a.name])
 
     draw(window=window,
          x=total_width // 2 + 6,
          y=4,
-         drawing=[state["b"]["name"]])
+         drawing=[state.b.name])
 
     # Bullets left
     draw(window=window,
-         x=total_width // 2 - 8 - state["a"]["bullets"],
+         x=total_width // 2 - 8 - state.a.num_bullets,
          y=5,
-         drawing=[DRAWINGS["stacked-bullet"] * state["a"]["bullets"]])
+         drawing=[DRAWINGS["stacked-bullet"] * state.a.num_bullets])
 
     draw(window=window,
          x=total_width // 2 + 6,
          y=5,
-         drawing=[DRAWINGS["stacked-bullet"] * state["b"]["bullets"]])
+         drawing=[DRAWINGS["stacked-bullet"] * state.b.num_bullets])
 
 
 def draw_turns(window, state, total_width):
@@ -415,47 +492,28 @@ def draw_turns(window, state, total_width):
     draw(window=window,
          x=total_width // 2 - 2,
          y=6,
-         drawing=[f"{state['num_turn']:03}"])
+         drawing=[f"{state.num_turn:03}"])
 
 def write_to_ui_queue(state, state_queue):
-    a = state["a"]
-    b = state["b"]
-    if "description" in state:
-        description = state["description"]
-    else:
-        description = f"{a.description} {b.description}"
-
-    new_state = {
-        "num_turn": state["num_turn"],
-        "description": description,
-        "a": {
-            "name": a.name,
-            "bullets": a.num_bullets,
-            "command": a.latest_command.value,
-            "num_dodges": a.num_dodges
-        },
-        "b": {
-            "name": b.name,
-            "bullets": b.num_bullets,
-            "command": b.latest_command.value,
-            "num_dodges": b.num_dodges
-        },
-    }
-
-    if "winner_key" in state:
-        new_state["winner_key"] = state["winner_key"]
-
+    new_state = state.snapshot()
+    if new_state.description is None:
+        new_state.description = \
+            f"{new_state.a.description} {new_state.b.description}"
     state_queue.put(new_state)
 
 
-def run_game_ui(call_args_a, call_args_b):
+def run_game_ui(call_args_a, call_args_b, record=None):
+    """
+    Play a game and show it. With record, also save it
+    to that replay file.
+    """
     state_queue = queue.Queue()
 
     thread = threading.Thread(
             target=ui,
             args=(state_queue,))
 
-    state = {}
+    state = None
     try:
         state = game.setup(call_args_a, call_args_b)
         thread.start()
@@ -469,4 +527,28 @@ def run_game_ui(call_args_a, call_args_b):
     finally:
         game.clean(state)
 
+    if record:
+        with ReplayWriter(record) as writer:
+            writer.write(game.result(state))
+
     thread.join()
+
+    for line in timings_report(
+            names={key: state[key].name for key in "ab"},
+            latencies={key: state[key].latencies for key in "ab"},
+            overhead=state.overhead):
+        print(line)
+
+
+def run_replay_ui(path, num_game=0):
+    """
+    Show a game from a replay file, without running any bot.
+    """
+    with ReplayReader(path) as reader:
+        game_record = reader[num_game]
+
+    state_queue = queue.Queue()
+    for state in game.GameState.from_record(game_record):
+        write_to_ui_queue(state, state_queue)
+
+    ui(state_queue)
@@ -0,0 +1,421 @@
+"""
+Fork server for Python bots.
+
+Starting a Python bot for every game means starting the interpreter and
+importing its modules again and again. A zygote is a Python process started
+once per bot script (with the interpreter of the bot) that imports what the
+script imports, then forks a child running the script for every game.
+
+The harness sends the zygote a JSON message per child over a Unix socket,
+{"argv": [...], "env": {...} or null, "rlimits": [[resource, soft, hard]]},
+along with the stdin, stdout and stderr of the child. The zygote answers
+{"pid": PID}, then {"exited": PID, "status": STATUS, "rusage": [...]} when
+the child ends (see os.wait4), since only the zygote can wait for it.
+For the same reason, the harness has the zygote kill a child with
+{"kill": PID}: once reaped, its pid may belong to another process.
+
+Children start with the modules imported by the zygote. random reseeds
+itself after a fork, and the zygote reseeds numpy's global generator;
+other generators created when these modules are imported are the same in
+every child.
+
+This file only uses the standard library: the zygote runs it as a script,
+with the interpreter of the bot (which may not have showdown installed).
+"""
+import ast
+import atexit
+import collections
+import importlib
+import json
+import os
+import re
+import resource
+import runpy
+import selectors
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import traceback
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "examples")
+MAX_MESSAGE = 1 << 20
+
+
+def example_script(call_args):
+    """
+    The script of the example if call_args are showdown example NAME ...,
+    None otherwise.
+    """
+    program, *args = call_args
+    if os.path.basename(program) == "showdown" \
+            and args[:1] == ["example"] and len(args) > 1:
+        return os.path.join(EXAMPLES, args[1] + ".py")
+    return None
+
+
+def python_script(call_args):
+    """
+    (interpreter, script, argv) if call_args run a Python script,
+    None otherwise.
+    """
+    example = example_script(call_args)
+    if example is not None:
+        # showdown example execs the script (see showdown.example)
+        return python_script([example, *call_args[3:]])
+    program, *args = call_args
+    name = os.path.basename(program)
+    if re.fullmatch(r"python[0-9.]*", name):
+        if args and args[0].endswith(".py") and os.path.isfile(args[0]):
+            return [program], args[0], args
+        return None
+    path = shutil.which(program)
+    if path is None:
+        return None
+    with open(path, "rb") as file:
+        line = file.readline()
+    if line.startswith(b"#!") and b"python" in line:
+        return shlex.split(line[2:].decode("utf-8")), path, call_args
+    return None
+
+
+# Harness side
+
+class ZygoteProcess:
+    """
+    A child of a Zygote, with the parts of the Popen interface
+    the harness uses.
+    """
+    def __init__(self, zygote, stdin, stdout, stderr):
+        self.zygote = zygote
+        self.stdin = open(stdin, "wb", buffering=0)
+        self.stdout = open(stdout, "rb", buffering=0)
+        self.stderr = open(stderr, "rb", buffering=0)
+        self.pid = None
+        self.returncode = None
+        # Set once the zygote gave the pid (None if it could not fork)
+        self.started = threading.Event()
+        # Set once the zygote reaped the process
+        self.ended = threading.Event()
+        self.status = None
+        self.rusage = None
+
+    def wait4(self, options=0):
+        """
+        Like os.wait4 for the process.
+        """
+        if not options & os.WNOHANG:
+            self.ended.wait()
+        if not self.ended.is_set():
+            return 0, 0, None
+        return self.pid, self.status, self.rusage
+
+    def poll(self):
+        if self.returncode is None and self.ended.is_set():
+            self.returncode = os.waitstatus_to_exitcode(self.status)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self.ended.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.poll()
+
+    def kill(self):
+        if self.poll() is None:
+            self.zygote.kill(self.pid)
+
+    def close(self):
+        for file in [self.stdin, self.stdout, self.stderr]:
+            file.close()
+
+
+class Zygote:
+    """
+    The zygote of a bot script, and a thread reading its messages.
+    """
+    def __init__(self, interpreter, script):
+        self.owner = os.getpid()
+        self.socket, child_socket = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self.process = subprocess.Popen(
+                [*interpreter, os.path.abspath(__file__),
+                 str(child_socket.fileno()), script],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                close_fds=True, pass_fds=[child_socket.fileno()])
+        except OSError:
+            self.socket.close()
+            raise
+        finally:
+            child_socket.close()
+        self.lock = threading.Lock()
+        self.alive = True
+        # Processes waiting for their pid, in the order they were asked for
+        self.pending = collections.deque()
+        # Running processes by pid
+        self.children = {}
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def spawn(self, argv, env=None, rlimits=()):
+        """
+        Fork a child running the script with argv, or return None if the
+        zygote is gone.
+        """
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        process = ZygoteProcess(self, stdin_write, stdout_read, stderr_read)
+        message = json.dumps({"argv": argv, "env": env,
+                              "rlimits": list(rlimits)}).encode("utf-8")
+        sent = False
+        try:
+            with self.lock:
+                if self.alive:
+                    socket.send_fds(self.socket, [message],
+                                    [stdin_read, stdout_write, stderr_write])
+                    self.pending.append(process)
+                    sent = True
+        except OSError:
+            pass
+        finally:
+            for fd in [stdin_read, stdout_write, stderr_write]:
+                os.close(fd)
+        if sent:
+            process.started.wait()
+        if process.pid is None:
+            process.close()
+            return None
+        return process
+
+    def kill(self, pid):
+        """
+        Have the zygote kill its child pid, unless it already reaped it.
+        """
+        message = json.dumps({"kill": pid}).encode("utf-8")
+        try:
+            with self.lock:
+                if self.alive:
+                    self.socket.send(message)
+        except OSError:
+            pass
+
+    def run(self):
+        while True:
+            try:
+                data = self.socket.recv(MAX_MESSAGE)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            message = json.loads(data)
+            with self.lock:
+                if "exited" in message:
+                    process = self.children.pop(message["exited"])
+                    process.status = message["status"]
+                    process.rusage = resource.struct_rusage(message["rusage"])
+                    process.ended.set()
+                    continue
+                process = self.pending.popleft()
+                process.pid = message["pid"]
+                if process.pid is not None:
+                    self.children[process.pid] = process
+            process.started.set()
+        self.exited()
+
+    def exited(self):
+        """
+        The zygote is gone: nobody can reap its children anymore,
+        they are killed and count as such.
+        """
+        with self.lock:
+            self.alive = False
+            pending, self.pending = self.pending, collections.deque()
+            children, self.children = self.children, {}
+        for process in pending:
+            process.started.set()
+        for process in children.values():
+            # Orphans now, reaped by someone else: their pids may already
+            # be reused, which cannot be helped
+            try:
+                os.kill(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.status = signal.SIGKILL
+            process.ended.set()
+        self.socket.close()
+        self.process.wait()
+
+
+# Zygotes by (interpreter, script)
+zygotes = {}
+zygotes_lock = threading.Lock()
+
+
+def spawn_from_zygote(call_args, env=None, rlimits=()):
+    """
+    A ZygoteProcess running call_args, or None if they do not run
+    a Python script (or its zygote is not available): start them as usual.
+    rlimits are the resource limits of the process,
+    as (resource, soft, hard).
+    """
+    script = python_script(call_args)
+    if script is None:
+        return None
+    interpreter, path, argv = script
+    key = tuple(interpreter), os.path.abspath(path)
+    with zygotes_lock:
+        zygote = zygotes.get(key)
+        # A forked process (bulk pool workers) does not have the thread
+        if zygote is None or not zygote.alive \
+                or zygote.owner != os.getpid():
+            zygote = zygotes[key] = Zygote(interpreter, key[1])
+    return zygote.spawn(argv, env=env, rlimits=rlimits)
+
+
+# Zygote side
+
+def preload(script):
+    """
+    Import the modules the script imports (wherever it does), without
+    running it.
+    """
+    with open(script, "rb") as file:
+        tree = ast.parse(file.read(), script)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level \
+                and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception:  # pylint: disable=broad-except
+                # The child will fail the same way, if it gets there
+                pass
+
+
+def serve(control, script):
+    # As if the script was run by the interpreter
+    sys.path[0] = os.path.dirname(script)
+    preload(script)
+    # The harness is interrupted, the zygote ends with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_read, False)
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    selector = selectors.DefaultSelector()
+    selector.register(control, selectors.EVENT_READ)
+    selector.register(wakeup_read, selectors.EVENT_READ)
+    # Children not reaped yet: their pids are still theirs
+    children = set()
+
+    while True:
+        for key, __ in selector.select():
+            if key.fileobj == wakeup_read:
+                reap(control, wakeup_read, children)
+                continue
+            data, fds, __, __ = socket.recv_fds(control, MAX_MESSAGE, 3)
+            if not data:
+                # The harness is gone, the children are its business
+                return
+            message = json.loads(data)
+            if "kill" in message:
+                if message["kill"] in children:
+                    os.kill(message["kill"], signal.SIGKILL)
+                continue
+            try:
+                pid = os.fork()
+            except OSError:
+                pid = None
+            if pid == 0:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                selector.close()
+                for fd in [control.fileno(), wakeup_read, wakeup_write]:
+                    os.close(fd)
+                run_child(message, fds, script)
+            if pid is not None:
+                children.add(pid)
+            for fd in fds:
+                os.close(fd)
+            control.send(json.dumps({"pid": pid}).encode("utf-8"))
+
+
+def reap(control, wakeup_read, children):
+    try:
+        while os.read(wakeup_read, 1 << 16):
+            pass
+    except BlockingIOError:
+        pass
+    while True:
+        try:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not pid:
+            return
+        children.discard(pid)
+        control.send(json.dumps({"exited": pid, "status": status,
+                                 "rusage": list(rusage)}).encode("utf-8"))
+
+
+def run_child(message, fds, script):
+    """
+    Run the script as the interpreter would with message["argv"],
+    and exit.
+    """
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    if message["env"] is not None:
+        os.environ.clear()
+        os.environ.update(message["env"])
+    for limit, soft, hard in message["rlimits"]:
+        resource.setrlimit(limit, (soft, hard))
+    # Children would all draw the same numbers (random does it on its own)
+    numpy_random = sys.modules.get("numpy.random")
+    if numpy_random is not None:
+        numpy_random.seed()
+    sys.argv = message["argv"]
+
+    code = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            code = exc.code or 0
+        else:
+            print(exc.code, file=sys.stderr)
+            code = 1
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        code = 1
+    try:
+        atexit._run_exitfuncs()  # pylint: disable=protected-access
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BrokenPipeError:
+        code = code or 120
+    os._exit(code)
+
+
+if __name__ == "__main__":
+    try:
+        serve(socket.socket(fileno=int(sys.argv[1])),
+              os.path.abspath(sys.argv[2]))
+    except ConnectionError:
+        # The harness is gone
+        pass
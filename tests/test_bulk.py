@@ -0,0 +1,253 @@
+import io
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+import showdown
+from showdown.bulk import (ASYNCIO_CONCURRENCY, ASYNCIO_GAMES_PER_CPU,
+                           MULTIPLEX_CONCURRENCY, OUTPUT_BATCH,
+                           OUTPUT_INTERVAL, QUEUED_PER_WORKER, Report,
+                           ResultWriter, default_jobs, imap_bounded,
+                           run_game_bulk, run_game_bulk_pool)
+from showdown.dashboard import Dashboard
+from showdown.metrics import Histogram
+
+
+def contestant_record(timeout=False, crashed=False):
+    return {
+        "name": "bot",
+        "bullets": 1,
+        "dodges": 0,
+        "timeout": timeout,
+        "crashed": crashed,
+        "latency": Histogram().to_dict(),
+        "usage": None,
+        "stderr": None,
+    }
+
+
+def record(winner="a", a=None, b=None):
+    return {
+        "winner": winner,
+        "turns": 1,
+        "description": "",
+        "a": a or contestant_record(),
+        "b": b or contestant_record(),
+        "moves": "",
+        "overhead": Histogram().to_dict(),
+        "worker": 1,
+    }
+
+
+def test_report_time_losses():
+    report = Report(progress=False)
+    report.tally(record())
+    report.tally(record(b=contestant_record(timeout=True)))
+    report.tally(record(b=contestant_record(crashed=True)))
+
+    assert report.time_losses == 1
+    assert report.timeouts == {"a": 0, "b": 1}
+    assert report.crashes == {"a": 0, "b": 1}
+
+
+def test_result_writer_batches():
+    file = io.StringIO()
+    writer = ResultWriter(file)
+    for __ in range(OUTPUT_BATCH - 1):
+        writer.write({"winner": "a"})
+    assert file.getvalue() == ""
+    writer.write({"winner": "a"})
+    assert file.getvalue().splitlines() == ['{"winner":"a"}'] * OUTPUT_BATCH
+    writer.write({"winner": "b"})
+    writer.flush()
+    assert file.getvalue().splitlines()[-1] == '{"winner":"b"}'
+
+
+def test_result_writer_interval():
+    file = io.StringIO()
+    writer = ResultWriter(file)
+    writer.write({"winner": "a"})
+    assert file.getvalue() == ""
+    writer.flushed_at -= OUTPUT_INTERVAL + 1
+    writer.write({"winner": "b"})
+    assert len(file.getvalue().splitlines()) == 2
+
+
+def test_run_game_bulk_output(tmp_path, capsys):
+    output = tmp_path / "results.jsonl"
+    run_game_bulk(5, ["py:randomizer", "R"], ["py:copycat", "C", "shoot"],
+                  jobs=1, log_level="off", output=str(output))
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(records) == 5
+    for record in records:
+        assert record["winner"] in "ab"
+        assert record["a"]["name"] == "R" and record["b"]["name"] == "C"
+        assert 1 <= record["turns"] <= 100
+    # The progress line still shows the winners
+    assert "".join(record["winner"] for record in records) \
+        in capsys.readouterr().out
+
+
+def test_default_jobs(monkeypatch):
+    monkeypatch.setattr(multiprocessing, "cpu_count", lambda: 1)
+    assert default_jobs("asyncio", False) == ASYNCIO_GAMES_PER_CPU
+    assert default_jobs("pool", False) == 1
+    assert default_jobs("pool", True) == MULTIPLEX_CONCURRENCY
+    monkeypatch.setattr(multiprocessing, "cpu_count", lambda: 64)
+    assert default_jobs("asyncio", False) == ASYNCIO_CONCURRENCY
+
+
+def test_report_warns_about_time_losses_on_busy_cpus(monkeypatch, capsys):
+    monkeypatch.setattr(multiprocessing, "cpu_count", lambda: 2)
+    report = Report(progress=False)
+    report.concurrency = 50
+    report.tally(record())
+    report.close()
+    assert "warning" not in capsys.readouterr().out
+    report = Report(progress=False)
+    report.concurrency = 50
+    report.tally(record(b=contestant_record(timeout=True)))
+    report.close()
+    assert "50 games at the same time on 2 CPUs" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("multiplex", [False, True])
+def test_pool_counts_games_started_per_worker(multiplex):
+    report = Report(progress=False)
+    report.total = 20
+    run_game_bulk_pool(
+        20, ["py:randomizer", "R"], ["py:copycat", "C", "shoot"], report,
+        jobs=2, persistent=False, log_level="off", warm=False, limits=None,
+        timing="wall", multiplex=multiplex)
+    assert sum(report.started.values()) == 20
+    assert report.started == report.workers
+    lines = Dashboard(report, engine="pool", jobs=2).lines()
+    line = next(line for line in lines if line.startswith("per worker"))
+    for pid, count in report.workers.items():
+        assert f"{pid}: 0/{count}" in line
+
+
+def processes_with_arg(arg):
+    pids = []
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as file:
+                cmdline = file.read().split(b"\0")
+        except OSError:
+            continue
+        if arg.encode() in cmdline:
+            pids.append(int(pid))
+    return pids
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+@pytest.mark.parametrize("option", ["persistent", "warm"])
+def test_pool_kills_the_bots_it_keeps(option, capsys):
+    script = os.path.join(os.path.dirname(showdown.__file__),
+                          "examples", "randomizer.py")
+    name = uuid.uuid4().hex
+    bot = [sys.executable, script, name]
+    run_game_bulk(6, bot, bot, jobs=2, log_level="off", **{option: True})
+    wins = re.search(r"a: (\d+) / b: (\d+)", capsys.readouterr().out)
+    assert sum(map(int, wins.groups())) == 6
+    assert processes_with_arg(name) == []
+
+
+class DecideAfter:
+    """
+    Stand-in for an SPRT that decides after a number of games.
+    """
+    def __init__(self, games):
+        self.games = games
+
+    def add(self, winner_key):
+        self.games -= 1
+
+    @property
+    def decision(self):
+        return "H1" if self.games <= 0 else None
+
+    def report(self, names):
+        return []
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_pool_stops_cleanly_once_decided():
+    script = os.path.join(os.path.dirname(showdown.__file__),
+                          "examples", "randomizer.py")
+    name = uuid.uuid4().hex
+    bot = [sys.executable, script, name]
+    report = Report(sprt=DecideAfter(3), progress=False)
+    report.total = 100
+    run_game_bulk_pool(
+        100, bot, bot, report, jobs=2, persistent=False, log_level="off",
+        warm=False, limits=None, timing="wall")
+    assert report.played >= 3
+    # At most the games in progress when the decision came
+    assert sum(report.started.values()) <= 3 + QUEUED_PER_WORKER * 2
+    assert processes_with_arg(name) == []
+
+
+def test_dashboard_in_flight_per_worker():
+    report = Report(progress=False)
+    report.started = {10: 3, 11: 1}
+    report.workers = {10: 1}
+    lines = Dashboard(report, engine="pool", jobs=2).lines()
+    assert "per worker (in flight/played): 10: 2/1  11: 1/0" in lines
+
+
+def test_imap_bounded_window():
+    lock = threading.Lock()
+    running = [0]
+    most = [0]
+
+    def work(value):
+        with lock:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return value * 2
+
+    consumed = []
+
+    def args():
+        for value in range(50):
+            consumed.append(value)
+            yield (value,)
+
+    with multiprocessing.pool.ThreadPool(8) as pool:
+        results = imap_bounded(pool, work, args(), window=3)
+        first = next(results)
+        # Only the window was submitted
+        assert len(consumed) == 3
+        assert sorted([first, *results]) == list(range(0, 100, 2))
+    assert most[0] <= 3
+
+
+def test_imap_bounded_error():
+    def work(value):
+        if value == 3:
+            raise ValueError(value)
+        return value
+
+    with multiprocessing.pool.ThreadPool(2) as pool:
+        with pytest.raises(ValueError):
+            list(imap_bounded(pool, work, ((value,) for value in range(10)),
+                              window=2))
+
+
+def test_imap_bounded_empty():
+    with multiprocessing.pool.ThreadPool(2) as pool:
+        assert list(imap_bounded(pool, abs, iter([]), window=2)) == []
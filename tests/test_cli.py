@@ -0,0 +1,93 @@
+import sys
+
+import pytest
+
+import showdown
+from showdown.distributed import TOKEN_VARIABLE
+from showdown.replay import ReplayWriter
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["showdown", *args])
+    showdown.main()
+
+
+@pytest.mark.parametrize("option,value", [
+    ("--delta", "0"),
+    ("--delta", "0.5"),
+    ("--alpha", "0"),
+    ("--alpha", "1"),
+    ("--beta", "-0.1"),
+    ("--beta", "x"),
+])
+def test_bulk_sprt_options(monkeypatch, capsys, option, value):
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, "bulk", "--until-significant", option, value,
+            "10", "a", "-vs-", "b")
+    assert excinfo.value.code == 2
+    assert f"argument {option}" in capsys.readouterr().err
+
+
+def test_bulk_sprt_error_rates_add_up_to_less_than_1(monkeypatch, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, "bulk", "--until-significant", "--alpha", "0.6",
+            "--beta", "0.4", "10", "a", "-vs-", "b")
+    assert excinfo.value.code == 2
+    assert "--alpha and --beta" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("command", ["bulk", "tournament"])
+@pytest.mark.parametrize("jobs", ["0", "-2"])
+def test_jobs_at_least_1(monkeypatch, capsys, command, jobs):
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, command, "--jobs", jobs, "10", "a", "-vs-", "b")
+    assert excinfo.value.code == 2
+    assert "argument --jobs/-j" in capsys.readouterr().err
+
+
+def test_asyncio_engine_rejects_plugins(monkeypatch, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, "bulk", "--engine", "asyncio", "10",
+            "py:randomizer", "R", "-vs-", "b")
+    assert excinfo.value.code == 2
+    assert "py: bots are only supported by the pool engine" \
+        in capsys.readouterr().err
+
+
+@pytest.fixture
+def replay_file(tmp_path):
+    path = str(tmp_path / "games.replay")
+    with ReplayWriter(path) as writer:
+        for __ in range(3):
+            writer.write({"winner": "a", "moves": ""})
+    return path
+
+
+@pytest.mark.parametrize("num_game", ["3", "-1"])
+def test_replay_game_out_of_range(monkeypatch, capsys, replay_file,
+                                  num_game):
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, "replay", replay_file, "--game", num_game)
+    assert excinfo.value.code == 2
+    assert "which has 3 games (0 to 2)" in capsys.readouterr().err
+
+
+def test_replay_not_a_replay_file(monkeypatch, capsys, tmp_path):
+    path = tmp_path / "games.jsonl"
+    path.write_text("{}\n")
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, "replay", str(path))
+    assert excinfo.value.code == 2
+    assert "is not a showdown replay file" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("args", [
+    ["worker", "--listen", "7300"],
+    ["bulk", "--workers", "node1:7300", "10", "a", "-vs-", "b"],
+])
+def test_workers_need_a_token(monkeypatch, capsys, args):
+    monkeypatch.delenv(TOKEN_VARIABLE, raising=False)
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, *args)
+    assert excinfo.value.code == 2
+    assert TOKEN_VARIABLE in capsys.readouterr().err
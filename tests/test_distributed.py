@@ -0,0 +1,134 @@
+import socket
+import threading
+
+import pytest
+
+from showdown import distributed
+from showdown.bulk import Report
+from showdown.distributed import Coordinator
+
+TOKEN = "secret"
+
+
+def connected(n, addresses):
+    """
+    A Coordinator whose workers are connected, and the messages it sends.
+    """
+    coordinator = Coordinator(n, args=[], addresses=addresses, token=TOKEN)
+    sent = []
+    coordinator.send = lambda address, message: sent.append(
+        (address, message))
+    for address in addresses:
+        coordinator.workers[address] = {"outstanding": set(), "prefetch": 1}
+        coordinator.top_up(address)
+    return coordinator, sent
+
+
+def record(coordinator, address, batch_id, slot):
+    coordinator.add_record(address, {
+        "batch": batch_id, "slot": slot,
+        "record": {"slot": slot, "worker": address}})
+
+
+def results(coordinator):
+    records = []
+    while True:
+        result = coordinator.results.get_nowait()
+        if result is None:
+            return records
+        records.append(result)
+
+
+def test_coordinator_steals_half_of_a_batch():
+    coordinator, sent = connected(20, ["a", "b"])
+    assert sent == [
+        ("a", {"type": "batch", "batch": 0, "slots": list(range(10)),
+               "args": []}),
+        ("b", {"type": "batch", "batch": 1, "slots": list(range(10, 20)),
+               "args": []}),
+    ]
+    assert coordinator.in_flight() == {"a": 10, "b": 10}
+    sent.clear()
+    for slot in range(10, 20):
+        record(coordinator, "b", 1, slot)
+    coordinator.batch_done("b", 1)
+    # b is idle and takes the slots a is the least likely to have started
+    assert sent == [
+        ("a", {"type": "cancel", "batch": 0, "slots": [5, 6, 7, 8, 9]}),
+        ("b", {"type": "batch", "batch": 2, "slots": [5, 6, 7, 8, 9],
+               "args": []}),
+    ]
+    assert coordinator.in_flight() == {"a": 5, "b": 5}
+
+    # a played slots 5 and 6 before it was told: whichever comes first,
+    # only the records of b count for them
+    for slot in range(7):
+        record(coordinator, "a", 0, slot)
+    for slot in range(5, 10):
+        record(coordinator, "b", 2, slot)
+    records = results(coordinator)
+    assert sorted(record["slot"] for record in records) == list(range(20))
+    assert {record["worker"] for record in records
+            if record["slot"] in range(5, 10)} == {"b"}
+
+
+def test_coordinator_gives_the_batches_of_a_lost_worker():
+    coordinator, sent = connected(20, ["a", "b"])
+    record(coordinator, "a", 0, 0)
+    coordinator.worker_lost("a")
+    sent.clear()
+    for slot in range(10, 20):
+        record(coordinator, "b", 1, slot)
+    coordinator.batch_done("b", 1)
+    assert sent == [("b", {"type": "batch", "batch": 0,
+                           "slots": list(range(1, 10)), "args": []})]
+    # Too late
+    record(coordinator, "a", 0, 1)
+    for slot in range(1, 10):
+        record(coordinator, "b", 0, slot)
+    assert len(results(coordinator)) == 20
+
+
+@pytest.fixture
+def worker():
+    """
+    Address of a worker with 2 processes.
+    """
+    server = distributed.WorkerServer(("localhost", 0), jobs=2, token=TOKEN)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+ARGS = (["py:randomizer", "R"], ["py:copycat", "C", "shoot"],
+        False, "off", False, None, "wall", False, False)
+
+
+def test_run_game_bulk_distributed(worker):
+    report = Report(progress=False)
+    distributed.run_game_bulk_distributed(25, report, [worker], ARGS, TOKEN)
+    assert report.played == 25
+    assert sum(report.victories.values()) == 25
+
+
+def test_worker_needs_the_token(worker):
+    report = Report(progress=False)
+    with pytest.raises(RuntimeError, match="authentication failed"):
+        distributed.run_game_bulk_distributed(
+            5, report, [worker], ARGS, "guess")
+    assert report.played == 0
+
+
+def test_worker_plays_nothing_before_auth(worker):
+    host, port = distributed.parse_address(worker)
+    with socket.create_connection((host, port)) as connection:
+        file = connection.makefile("rwb")
+        hello = distributed.receive(file)
+        assert hello["type"] == "hello"
+        distributed.send(file, {"type": "batch", "batch": 0, "slots": [0],
+                                "args": list(ARGS)})
+        assert distributed.receive(file) == {
+            "type": "error", "message": "authentication failed"}
+        assert distributed.receive(file) is None
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import showdown
+
+EXAMPLES = os.path.join(os.path.dirname(showdown.__file__), "examples")
+ACTIONS = {b"shoot\n", b"dodge\n", b"reload\n"}
+
+# Run an example as a script, as if showdown was not installed
+WITHOUT_SHOWDOWN = """
+import runpy, sys
+sys.modules["showdown"] = None
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+@pytest.mark.parametrize("installed", [True, False])
+@pytest.mark.parametrize("name,args", [
+    ("copycat", ["shoot"]),
+    ("randomizer", []),
+    ("shuffler", ["3"]),
+])
+def test_example_script(name, args, installed):
+    script = os.path.join(EXAMPLES, f"{name}.py")
+    command = [sys.executable, script] if installed \
+        else [sys.executable, "-c", WITHOUT_SHOWDOWN, script]
+    # Answers must be flushed by the bot, not by the environment
+    env = {key: value for key, value in os.environ.items()
+           if key not in ["PYTHONUNBUFFERED", "SHOWDOWN_MULTIPLEX"]}
+    with subprocess.Popen(
+            [*command, "Bot", *args], env=env, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+        try:
+            assert process.stdout.readline() == b"Bot\n"
+            for opponent in [b"reload\n", b"game_over\n", b"dodge\n"]:
+                assert process.stdout.readline() in ACTIONS
+                process.stdin.write(opponent)
+                process.stdin.flush()
+                if opponent == b"game_over\n":
+                    assert process.stdout.readline() == b"game_over\n"
+            assert process.stdout.readline() in ACTIONS
+        finally:
+            process.kill()
@@ -0,0 +1,516 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import resource
+import signal
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from showdown import game
+from showdown.metrics import Histogram
+
+
+@pytest.fixture
+def bot(tmp_path):
+    """
+    Call args of a bot program made of source.
+    """
+    def make(name, source):
+        path = tmp_path / f"{name}.py"
+        path.write_text(textwrap.dedent(source))
+        return [sys.executable, str(path)]
+    return make
+
+
+@pytest.fixture
+def reloader(bot):
+    return bot("reloader", """
+        print("reloader", flush=True)
+        print("reload", flush=True)
+        while input() != "game_over":
+            print("reload", flush=True)
+    """)
+
+
+def test_turns_fit_in_a_byte():
+    for command_a, command_b in itertools.product(game.Commands, repeat=2):
+        code = game.encode_turn(command_a, command_b)
+        assert 0 <= code < 256
+        assert game.decode_turn(code) == (command_a, command_b)
+
+
+@pytest.mark.parametrize("cls", [
+    game.ContestantState, game.GameState, game.Contestant,
+    game.PythonContestant, game.Channel, game.AsyncContestant,
+])
+def test_states_have_slots(cls):
+    # A class without __slots__ anywhere in its bases gives its
+    # instances a __dict__
+    assert not any("__dict__" in vars(base) for base in cls.__mro__)
+
+
+def test_snapshot_is_independent():
+    state = game.GameState(game.ContestantState("A"),
+                           game.ContestantState("B"))
+    state.history.append(game.encode_turn(game.Commands.RELOAD,
+                                          game.Commands.DODGE))
+    state.a.replay(game.Commands.RELOAD)
+    snapshot = state.snapshot()
+    state.a.replay(game.Commands.SHOOT)
+    state.history.append(0)
+    assert snapshot.a.num_bullets == 2
+    assert snapshot.history == bytes(state.history[:1])
+
+
+def test_record_replays_the_game():
+    state = game.run_game(["py:randomizer", "R"], ["py:shuffler", "S", "3"],
+                          log_level="off")
+    record = json.loads(json.dumps(game.result(state)))
+    assert len(record["moves"]) == 2 * record["turns"]
+    *__, replayed = game.GameState.from_record(record)
+    assert replayed.num_turn == state.num_turn
+    assert replayed.winner_key == state.winner_key
+    assert replayed.description == state.description
+    for key in "ab":
+        assert replayed[key].num_bullets == state[key].num_bullets
+        assert replayed[key].num_dodges == state[key].num_dodges
+        assert replayed[key].latest_command == state[key].latest_command
+
+
+def test_run_game_measures_latencies(bot, reloader):
+    state = game.run_game(reloader, reloader, log_level="off")
+    result = game.result(state)
+    for key in "ab":
+        latencies = Histogram.from_dict(result[key]["latency"])
+        assert latencies.count == result["turns"]
+        assert 0 < latencies.max < game.TURN_TIME
+    assert Histogram.from_dict(result["overhead"]).count == result["turns"]
+
+
+def test_game_log_handler_writes_once(tmp_path):
+    path = tmp_path / "game.log"
+    path.write_text("previous game\n")
+    handler = game.GameLogHandler(str(path))
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    game_logger = logging.Logger("test")
+    game_logger.addHandler(handler)
+    game_logger.warning("first")
+    game_logger.warning("second")
+    assert path.read_text() == "previous game\n"
+    handler.close()
+    assert path.read_text() == "previous game\nfirst\nsecond\n"
+
+
+@pytest.mark.parametrize("log_level,turns_logged", [
+    ("debug", True),
+    ("summary", False),
+])
+def test_run_game_log_levels(bot, reloader, tmp_path, monkeypatch,
+                             log_level, turns_logged):
+    monkeypatch.chdir(tmp_path)
+    for __ in range(2):
+        state = game.run_game(reloader, reloader, log_level=log_level)
+        # Released with the game
+        assert state.logger.handlers == []
+    log = (tmp_path / "reloader-vs-reloader.log").read_text()
+    # Each game logs to its own file handler, once
+    assert log.count("Starting new showdown") == 2
+    assert ("Turn 1 begins" in log) == turns_logged
+
+
+def test_run_game_log_off(bot, reloader, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    game.run_game(reloader, reloader, log_level="off")
+    assert list(tmp_path.glob("*.log")) == []
+
+
+def test_run_game_crash_is_not_timeout(bot, reloader):
+    crasher = bot("crasher", """
+        print("crasher", flush=True)
+        print("dodge", flush=True)
+        input()
+        print("dodge", flush=True)
+    """)
+    for __ in range(4):
+        state = game.run_game(crasher, reloader, log_level="off")
+        result = game.result(state)
+        assert result["a"]["crashed"]
+        assert not result["a"]["timeout"]
+        assert result["winner"] == "b"
+
+
+def test_turn_waits_for_both_bots_at_once(bot):
+    slow = bot("slow", f"""
+        import time
+        print("slow", flush=True)
+        while True:
+            time.sleep({0.6 * game.TURN_TIME})
+            print("reload", flush=True)
+            input()
+    """)
+    state = game.setup(slow, slow, log_level="off")
+    try:
+        for __ in range(2):
+            begin = time.monotonic()
+            assert game.loop(state)
+            # Not one after the other
+            assert time.monotonic() - begin < game.TURN_TIME
+            for key in "ab":
+                assert 0.5 * game.TURN_TIME < state[key].response_time \
+                    < game.TURN_TIME
+    finally:
+        game.clean(state)
+
+
+def test_silent_bots_share_the_deadline(bot):
+    silent = bot("silent", """
+        print("silent", flush=True)
+        input()
+    """)
+    state = game.setup(silent, silent, log_level="off")
+    try:
+        begin = time.monotonic()
+        assert not game.loop(state)
+        assert time.monotonic() - begin < 1.5 * game.TURN_TIME
+        for key in "ab":
+            assert state[key].latest_command == game.Commands.GAME_OVER
+    finally:
+        game.clean(state)
+
+
+def test_contestant_read_eof_is_sticky(bot, monkeypatch):
+    quitter = bot("quitter", """
+        print("quitter", flush=True)
+    """)
+    contestant = game.Contestant(quitter)
+    try:
+        contestant.wait_ready()
+        with pytest.raises(EOFError):
+            contestant.read(timeout=game.TURN_TIME)
+        # Even before the process is reaped
+        monkeypatch.setattr(game.Contestant, "poll",
+                            lambda self, wait=False: None)
+        with pytest.raises(EOFError):
+            contestant.read(timeout=game.TURN_TIME)
+    finally:
+        monkeypatch.undo()
+        contestant.kill()
+
+
+def test_cpu_time_is_sampled_when_the_answer_arrives(bot):
+    # Answers right away, then keeps computing
+    busy = bot("busy", """
+        import time
+        print("busy", flush=True)
+        input()
+        print("reload", flush=True)
+        while time.process_time() < 10:
+            pass
+    """)
+    contestant = game.Contestant(busy)
+    contestant.timing = "cpu"
+    try:
+        contestant.wait_ready()
+        contestant.tell(game.Commands.RELOAD)
+        # The harness reads the answer late
+        time.sleep(1.5 * game.TURN_TIME)
+        assert contestant.read_timed(
+            time.monotonic() + game.TURN_TIME,
+            budget=game.TURN_TIME) == "reload"
+        assert contestant.cpu_used() > game.TURN_TIME
+    finally:
+        contestant.kill()
+
+
+def test_run_game_collects_resource_usage(bot, reloader):
+    burner = bot("burner", """
+        import time
+        print("burner", flush=True)
+        while True:
+            begin = time.process_time()
+            while time.process_time() - begin < 0.01:
+                pass
+            print("reload", flush=True)
+            if input() == "game_over":
+                break
+    """)
+    state = game.run_game(burner, reloader, log_level="off")
+    usage = game.result(state)["a"]["usage"]
+    assert usage["cpu_user"] + usage["cpu_system"] >= 0.01 * state.num_turn
+    assert usage["max_rss"] > 0
+    assert game.result(state)["b"]["usage"]["max_rss"] > 0
+
+
+def test_resource_limits():
+    assert game.resource_limits({}) == []
+    assert game.resource_limits({"cpu": 2, "memory": 1 << 30}) == [
+        (resource.RLIMIT_CPU, 2, 3),
+        (resource.RLIMIT_AS, 1 << 30, 1 << 30),
+    ]
+
+
+@pytest.mark.parametrize("zygote", [False, True])
+def test_cpu_limit_kills_the_bot(bot, zygote):
+    burner = bot("burner", """
+        while True:
+            pass
+    """)
+    contestant = game.Contestant(burner, limits={"cpu": 1}, zygote=zygote)
+    try:
+        contestant.wait_ready()
+        assert contestant.exited
+        assert contestant.poll(wait=True) == -signal.SIGXCPU
+        assert contestant.usage["cpu_user"] + contestant.usage["cpu_system"] \
+            >= 0.9
+    finally:
+        contestant.kill()
+
+
+@pytest.mark.parametrize("zygote", [False, True])
+def test_memory_limit(bot, zygote):
+    hog = bot("hog", """
+        data = bytearray(256 * 1024 * 1024)
+        print("hog", flush=True)
+    """)
+    contestant = game.Contestant(hog, limits={"memory": 128 * 1024 * 1024},
+                                 zygote=zygote)
+    try:
+        contestant.wait_ready()
+        assert contestant.exited
+        assert contestant.poll(wait=True) == 1
+        assert "MemoryError" in contestant.stderr_tail()
+    finally:
+        contestant.kill()
+
+
+def test_stderr_capture_keeps_the_tail():
+    capture = game.StderrCapture()
+    capture.add(b"a" * game.STDERR_CAPTURE)
+    capture.add(b"bc")
+    assert capture.tail() == "a" * (game.STDERR_CAPTURE - 2) + "bc"
+
+
+def test_stderr_drain():
+    drain = game.StderrDrain()
+    read_fd, write_fd = os.pipe()
+    file = open(read_fd, "rb", buffering=0)
+    capture = drain.add(file)
+    # More than the pipe holds
+    os.write(write_fd, b"x" * (1 << 20))
+    os.write(write_fd, b"end")
+    os.close(write_fd)
+    assert capture.tail(timeout=5) == "x" * (game.STDERR_CAPTURE - 3) + "end"
+    assert file.closed
+
+
+def test_stderr_drain_forget():
+    drain = game.StderrDrain()
+    read_fd, write_fd = os.pipe()
+    file = open(read_fd, "rb", buffering=0)
+    capture = drain.add(file)
+    os.write(write_fd, b"last words")
+    # The write end stays open, as if a child of the bot kept it
+    try:
+        drain.forget(file)
+        assert capture.tail(timeout=5) == "last words"
+        assert file.closed
+    finally:
+        os.close(write_fd)
+
+
+def test_chatty_bot_does_not_block(bot):
+    chatty = bot("chatty", """
+        import sys
+        print("chatty", flush=True)
+        for turn in range(5):
+            input()
+            # Several times what a pipe holds
+            sys.stderr.write("x" * (1 << 18) + f"<{turn}>\\n")
+            sys.stderr.flush()
+            print("reload", flush=True)
+    """)
+    contestant = game.Contestant(chatty)
+    try:
+        contestant.wait_ready()
+        for __ in range(5):
+            contestant.tell(game.Commands.RELOAD)
+            assert contestant.read_timed(
+                time.monotonic() + game.TURN_TIME,
+                budget=game.TURN_TIME) == "reload"
+    finally:
+        contestant.kill()
+    tail = contestant.stderr_tail()
+    assert len(tail) == game.STDERR_CAPTURE
+    assert tail.endswith("x<4>\n")
+
+
+class Looper:
+    """
+    A plugin that does not answer when loop is "action" or "observe",
+    until the test is over.
+    """
+    looping = False
+
+    def __init__(self, name, loop):
+        self.name = name
+        self.loop = loop
+
+    def action(self):
+        while self.loop == "action" and Looper.looping:
+            pass
+        return "reload"
+
+    def observe(self, action):
+        while self.loop == "observe" and Looper.looping:
+            pass
+
+
+class Reloader:
+    name = "reloader"
+
+    def action(self):
+        return "reload"
+
+    def observe(self, action):
+        pass
+
+
+@pytest.mark.parametrize("in_thread", [False, True])
+@pytest.mark.parametrize("loop", ["action", "observe"])
+def test_run_game_plugin_timeout(monkeypatch, loop, in_thread):
+    monkeypatch.setattr(game, "TURN_TIME", 0.2)
+    # Left behind in a thread, the plugin stops at teardown
+    monkeypatch.setattr(Looper, "looping", True)
+    states = []
+
+    def run():
+        states.append(game.run_game(
+            [f"py:{__name__}:Looper", "looper", loop],
+            [f"py:{__name__}:Reloader"], log_level="off"))
+    if in_thread:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(timeout=10)
+    else:
+        run()
+    result = game.result(states[0])
+    assert result["a"]["timeout"]
+    assert not result["a"]["crashed"]
+    assert result["winner"] == "b"
+
+
+async def play_async(n, call_args_a, call_args_b, concurrency):
+    return [state async for state in game.run_games_async(
+        n, call_args_a, call_args_b, concurrency, log_level="off")]
+
+
+def test_run_games_async(bot, reloader):
+    shooter = bot("shooter", """
+        print("shooter", flush=True)
+        while True:
+            print("reload", flush=True)
+            if input() == "game_over":
+                break
+            print("shoot", flush=True)
+            if input() == "game_over":
+                break
+    """)
+    states = asyncio.run(play_async(5, shooter, reloader, concurrency=2))
+    assert len(states) == 5
+    for state in states:
+        result = game.result(state)
+        assert result["winner"] == "a"
+        assert result["a"]["name"] == "shooter"
+        assert not result["b"]["crashed"]
+
+
+def test_run_games_async_crash_is_not_timeout(bot, reloader):
+    crasher = bot("crasher", """
+        print("crasher", flush=True)
+        print("dodge", flush=True)
+        input()
+        raise SystemExit(3)
+    """)
+    states = asyncio.run(play_async(3, crasher, reloader, concurrency=3))
+    for state in states:
+        result = game.result(state)
+        assert result["winner"] == "b"
+        assert result["a"]["crashed"]
+        assert not result["a"]["timeout"]
+
+
+@pytest.mark.parametrize("call_args,concurrency", [
+    (["a"], 0),
+    (["py:randomizer", "R"], 1),
+])
+def test_run_games_async_invalid(call_args, concurrency):
+    with pytest.raises(ValueError):
+        asyncio.run(play_async(1, call_args, ["b"], concurrency))
+
+
+RANDOMIZER = os.path.join(os.path.dirname(game.__file__),
+                          "examples", "randomizer.py")
+ACTIONS = {"shoot", "dodge", "reload"}
+
+
+def test_shared_bot_plays_several_games():
+    bot = game.SharedBot([sys.executable, RANDOMIZER, "R"])
+    try:
+        assert bot.multiplexed
+        first, second = game.Channel(bot), game.Channel(bot)
+        assert first.process is second.process
+        assert first.name == second.name == "R"
+        for channel in [first, second, first]:
+            assert channel.read(timeout=game.TURN_TIME) in ACTIONS
+            channel.tell(game.Commands.RELOAD)
+        first.kill()
+        # The other game goes on
+        for __ in range(3):
+            assert second.read(timeout=game.TURN_TIME) in ACTIONS
+            second.tell(game.Commands.DODGE)
+        assert second.read(timeout=game.TURN_TIME) in ACTIONS
+        second.kill()
+    finally:
+        bot.contestant.kill()
+
+
+def test_shared_bot_without_multiplex(reloader):
+    bot = game.SharedBot(reloader)
+    assert not bot.multiplexed
+    assert not bot.contestant.is_alive()
+
+
+@pytest.mark.parametrize("multiplexed", [True, False])
+def test_run_game_multiplex(reloader, multiplexed):
+    randomizer = [sys.executable, RANDOMIZER, "R"]
+    call_args = randomizer if multiplexed else reloader
+    states = []
+
+    def play():
+        for __ in range(3):
+            states.append(game.run_game(call_args, randomizer,
+                                        log_level="off", multiplex=True))
+
+    threads = [threading.Thread(target=play) for __ in range(3)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(states) == 9
+        for state in states:
+            assert state.winner_key in ("a", "b")
+            assert not state.a.crashed and not state.b.crashed
+        # One process for all the games of each seat
+        assert {state.b.process.pid for state in states} == {
+            game.shared_bots["b", tuple(randomizer)].contestant.process.pid}
+        assert len({state.a.process.pid for state in states}) \
+            == (1 if multiplexed else 9)
+    finally:
+        game.kill_idle_contestants()
@@ -0,0 +1,81 @@
+import pytest
+
+from showdown.metrics import (BUCKETS_PER_OCTAVE, Histogram, Usage,
+                              format_duration, timings_report)
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for millis in range(1, 101):
+        histogram.add(millis / 1000)
+    assert histogram.count == 100
+    assert histogram.max == 0.1
+    # Within a bucket of the actual value
+    precision = 2 ** (1 / BUCKETS_PER_OCTAVE)
+    for percent in (50, 95, 99):
+        assert percent / 1000 <= histogram.percentile(percent) \
+            <= percent / 1000 * precision
+    assert histogram.percentile(100) == 0.1
+
+
+def test_histogram_never_above_max():
+    histogram = Histogram()
+    histogram.add(0.3)
+    assert histogram.percentile(50) == histogram.percentile(99) == 0.3
+
+
+def test_histogram_empty():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    assert histogram.summary() == "no data"
+
+
+def test_histogram_tiny_values():
+    histogram = Histogram()
+    histogram.add(0.)
+    histogram.add(1e-9)
+    assert histogram.buckets == {0: 2}
+
+
+def test_histogram_merge_and_dict():
+    first, second = Histogram(), Histogram()
+    for value in [0.001, 0.002]:
+        first.add(value)
+    second.add(0.5)
+    first.merge(second)
+    assert first.count == 3
+    assert first.max == 0.5
+
+    copy = Histogram.from_dict(first.to_dict())
+    assert copy.buckets == first.buckets
+    assert copy.count == 3
+    assert copy.max == 0.5
+
+
+def test_usage():
+    usage = Usage()
+    usage.add(None)
+    for rss in [1024, 2048]:
+        usage.add({"cpu_user": 0.5, "cpu_system": 0.1, "max_rss": rss,
+                   "voluntary_switches": 3, "involuntary_switches": 1})
+    assert usage.games == 2
+    assert usage.summary() == ("cpu per game user 500.0ms sys 100.0ms  "
+                               "max rss 2.0MB  context switches per game 4")
+
+
+@pytest.mark.parametrize("seconds,text", [
+    (0.000012, "12µs"),
+    (0.0123, "12.3ms"),
+    (1.5, "1.50s"),
+])
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+
+def test_timings_report():
+    latencies = {"a": Histogram(), "b": Histogram()}
+    latencies["a"].add(0.001)
+    lines = timings_report({"a": "A", "b": "B"}, latencies, Histogram())
+    assert lines[0].startswith("a (A) response time: p50 ")
+    assert lines[1] == "b (B) response time: no data"
+    assert lines[2] == "harness overhead per turn: no data"
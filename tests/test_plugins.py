@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from showdown import plugins
+from showdown.examples.copycat import Copycat
+
+
+def test_load():
+    assert plugins.load("py:showdown.examples.copycat:Copycat") is Copycat
+    assert plugins.is_plugin(["py:copycat", "C"])
+    assert not plugins.is_plugin(["./copycat", "C"])
+    with pytest.raises(LookupError):
+        plugins.load("py:no_such_bot")
+
+
+def test_serve_multiplexed():
+    env = {**os.environ, "SHOWDOWN_MULTIPLEX": "1"}
+    with subprocess.Popen(
+            [sys.executable, "-m", "showdown.plugins",
+             "showdown.examples.copycat:Copycat", "C", "shoot"],
+            env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL) as process:
+        def exchange(line, answer):
+            process.stdin.write(line.encode() + b"\n")
+            process.stdin.flush()
+            if answer is not None:
+                assert process.stdout.readline() == answer.encode() + b"\n"
+
+        try:
+            assert process.stdout.readline() == b"C\n"
+            assert process.stdout.readline() == b"multiplex\n"
+            exchange("1 start", "1 shoot")
+            exchange("2 start", "2 shoot")
+            # Each game has its own bot
+            exchange("1 dodge", "1 dodge")
+            exchange("2 reload", "2 reload")
+            # No answer to the end of a game
+            exchange("1 game_over", None)
+            exchange("3 start", "3 shoot")
+            exchange("2 dodge", "2 dodge")
+        finally:
+            process.kill()
@@ -0,0 +1,52 @@
+import os
+import random
+
+import pytest
+
+from showdown import game
+from showdown.replay import ReplayReader, ReplayWriter, index_path
+
+
+@pytest.fixture
+def records():
+    random.seed(0)
+    return [game.result(game.run_game(
+        ["py:randomizer", "R"], ["py:shuffler", "S", "3"], log_level="off"))
+        for __ in range(5)]
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_replay_round_trip(tmp_path, records, indexed):
+    path = str(tmp_path / "games.replay")
+    with ReplayWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    if not indexed:
+        # The reader finds the records by itself
+        os.remove(index_path(path))
+
+    with ReplayReader(path) as reader:
+        assert len(reader) == len(records)
+        for num_game in [3, 0, 4]:
+            record = reader[num_game]
+            assert record["moves"] == bytes.fromhex(
+                records[num_game]["moves"])
+            assert {**record, "moves": records[num_game]["moves"]} \
+                == records[num_game]
+
+
+def test_replay_ends_like_the_game(records):
+    for record in records:
+        *__, state = game.GameState.from_record(record)
+        assert state.num_turn == record["turns"]
+        assert state.winner_key == record["winner"]
+        for key in "ab":
+            assert state[key].num_bullets == record[key]["bullets"]
+            assert state[key].num_dodges == record[key]["dodges"]
+
+
+def test_replay_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "games.jsonl"
+    path.write_text("{}\n")
+    with pytest.raises(ValueError):
+        ReplayReader(str(path))
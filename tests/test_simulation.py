@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from showdown import game
+
+np = pytest.importorskip("numpy")
+simulation = pytest.importorskip("showdown.simulation")
+
+ENGINE_GAMES = 1000
+SIMULATED_GAMES = 100_000
+
+
+def engine_win_rate(call_args_a, call_args_b, n):
+    random.seed(0)
+    wins = 0
+    for __ in range(n):
+        state = game.run_game(call_args_a, call_args_b, log_level="off")
+        wins += state.winner_key == "a"
+    return wins / n
+
+
+def simulated_win_rate(table_a, table_b, n):
+    results = simulation.simulate(table_a, table_b, n, seed=0)
+    return sum(count for (winner_key, __), count in results.items()
+               if winner_key == "a") / n
+
+
+@pytest.mark.parametrize("name,args", [
+    ("randomizer", []),
+    ("copycat", ["shoot"]),
+    ("shuffler", ["1"]),
+    ("shuffler", ["3"]),
+])
+def test_tables_are_probabilities(name, args):
+    table = simulation.load(name, *args)
+    assert table.shape == simulation.TABLE_SHAPE
+    assert (table >= 0).all()
+    assert np.allclose(table.sum(axis=-1), 1.)
+
+
+@pytest.mark.parametrize("n", ["1", "3"])
+def test_shuffler_table_plays_like_the_shuffler(n):
+    # 3 standard errors of the engine rate
+    tolerance = 3 * (.25 / ENGINE_GAMES) ** .5
+    engine = engine_win_rate(
+        ["py:randomizer", "R"], ["py:shuffler", "S", n], ENGINE_GAMES)
+    simulated = simulated_win_rate(
+        simulation.randomizer(), simulation.shuffler(n), SIMULATED_GAMES)
+    assert abs(engine - simulated) < tolerance
+
+
+def test_shuffler_table():
+    table = simulation.shuffler(3)
+    # Shoot cycle: one bullet until it shoots, once in the 4 turns
+    assert table[0, 1, 0, simulation.SHOOT] == pytest.approx(1 / 4)
+    assert table[3, 1, 0, simulation.SHOOT] == pytest.approx(1)
+    assert table[2, 0, 0, simulation.DODGE] == pytest.approx(1)
+    # Reload cycle: no bullet until it reloads
+    assert table[4, 0, 0, simulation.RELOAD] == pytest.approx(1 / 4)
+    assert table[6, 0, 0, simulation.RELOAD] == pytest.approx(1 / 2)
+    assert table[6, 1, 0, simulation.DODGE] == pytest.approx(1)
@@ -0,0 +1,95 @@
+import itertools
+
+import pytest
+
+from showdown import solver
+from showdown.solver import (DODGE, RELOAD, SHOOT, Policy, Solver,
+                             solve_matrix_game)
+
+TURNS = 6
+
+
+@pytest.fixture
+def short_game(monkeypatch):
+    """
+    A game of TURNS turns, quick to solve.
+    """
+    monkeypatch.setattr(solver, "TOTAL_TURNS", TURNS)
+    monkeypatch.setattr(solver, "MAX_DODGE_DIFF", TURNS + 1)
+
+
+def test_solve_matrix_game_saddle_point():
+    strategy, value = solve_matrix_game([[.3, .6], [.2, .1]])
+    assert strategy == [1., 0.]
+    assert value == pytest.approx(.3)
+
+
+def test_solve_matrix_game_matching_pennies():
+    strategy, value = solve_matrix_game([[1., 0.], [0., 1.]])
+    assert strategy == pytest.approx([.5, .5])
+    assert value == pytest.approx(.5)
+
+
+def test_solve_matrix_game_rock_paper_scissors():
+    strategy, value = solve_matrix_game(
+        [[.5, 0., 1.], [1., .5, 0.], [0., 1., .5]])
+    assert strategy == pytest.approx([1 / 3] * 3)
+    assert value == pytest.approx(.5)
+
+
+def test_solve_matrix_game_dominated_row():
+    # The last row is never worth playing
+    strategy, value = solve_matrix_game([[1., 0.], [0., 1.], [0., 0.]])
+    assert strategy == pytest.approx([.5, .5, 0.])
+    assert value == pytest.approx(.5)
+
+
+def test_solver_symmetric_game(short_game):
+    assert Solver().value(0, 1, 1, 0) == pytest.approx(.5)
+
+
+def test_solver_last_turn(short_game):
+    # The opponent has no bullet: shooting wins whether it dodges
+    # (one dodge more) or reloads
+    assert Solver().strategy(TURNS - 1, 1, 0, 0) == [1., 0., 0.]
+    # Nobody has bullets: the one with fewer dodges wins
+    assert Solver().value(TURNS - 1, 0, 0, -1) == 1.
+    strategy = Solver().strategy(TURNS - 1, 0, 0, 0)
+    assert strategy[SHOOT] == 0.
+    assert strategy[RELOAD] == 1.
+
+
+def test_solve_and_policy(short_game, tmp_path):
+    path = str(tmp_path / "policy.bin")
+    value, __ = solver.solve(path)
+    assert value == pytest.approx(.5)
+    policy = Policy(path)
+    reference = Solver()
+    for state in solver.states():
+        shoot, dodge, reload = policy.probabilities(*state)
+        expected = reference.strategy(*state)
+        assert shoot == pytest.approx(expected[SHOOT], abs=1 / 255)
+        assert dodge == pytest.approx(expected[DODGE], abs=1 / 255)
+        assert shoot + dodge + reload == pytest.approx(1.)
+
+
+def test_policy_offsets(short_game):
+    offsets = {}
+    for turn, own, opp, diff in solver.states():
+        offsets[Policy.offset(turn, own, opp, diff)] = \
+            turn, own, opp, solver.clamp(turn, diff)
+    # One per state, once the dodge difference is clamped
+    assert len(offsets) == len(set(offsets.values()))
+    assert all(0 <= offset < Policy.size() for offset in offsets)
+    # Dodge differences out of reach share the state of the largest one
+    for turn, diff in itertools.product(range(TURNS), [TURNS + 1, 50]):
+        assert Policy.offset(turn, 1, 1, diff) \
+            == Policy.offset(turn, 1, 1, TURNS - turn + 1)
+
+
+def test_policy_rejects_other_bounds(short_game, tmp_path, monkeypatch):
+    path = str(tmp_path / "policy.bin")
+    solver.solve(path)
+    monkeypatch.setattr(solver, "TOTAL_TURNS", TURNS + 1)
+    with pytest.raises(ValueError, match="run showdown solve again"):
+        Policy(path)
@@ -0,0 +1,70 @@
+import math
+import random
+
+import pytest
+
+from showdown.sprt import SPRT, wilson_interval
+
+RUNS = 400
+MAX_GAMES = 20_000
+
+
+def decide(probability, rng, **kwargs):
+    sprt = SPRT(**kwargs)
+    for __ in range(MAX_GAMES):
+        sprt.add("a" if rng.random() < probability else "b")
+        if sprt.decision:
+            return sprt.decision
+    return None
+
+
+def decisions(probability, **kwargs):
+    rng = random.Random(0)
+    counts = {"a": 0, "b": 0, "equal": 0, None: 0}
+    for __ in range(RUNS):
+        counts[decide(probability, rng, **kwargs)] += 1
+    return counts
+
+
+def test_sprt_a_always_wins():
+    sprt = SPRT(alpha=0.05, beta=0.05, delta=0.05)
+    games = math.ceil(math.log(0.95 / 0.05) / math.log(1.1))
+    for __ in range(games - 1):
+        sprt.add("a")
+        assert sprt.decision is None
+    sprt.add("a")
+    assert sprt.decision == "a"
+    assert sprt.report({"a": "A", "b": "B"})[0].startswith(
+        f"a (A) is stronger, decided after {games} games")
+
+
+def test_sprt_equal_bots_are_found_equal():
+    counts = decisions(0.5, delta=0.1)
+    # Each side is wrongly found stronger with probability alpha at most
+    assert counts["a"] <= 0.05 * RUNS * 1.5
+    assert counts["b"] <= 0.05 * RUNS * 1.5
+    assert counts[None] == 0
+    assert counts["equal"] >= 0.85 * RUNS
+
+
+@pytest.mark.parametrize("probability,stronger", [(0.6, "a"), (0.4, "b")])
+def test_sprt_stronger_bot_is_found(probability, stronger):
+    counts = decisions(probability, delta=0.1)
+    assert counts[stronger] >= 0.9 * RUNS
+
+
+def test_sprt_report_equal():
+    sprt = SPRT(delta=0.1)
+    while not sprt.decision:
+        sprt.add("a")
+        sprt.add("b")
+    assert sprt.decision == "equal"
+    assert sprt.report({"a": "A", "b": "B"})[0].startswith(
+        "no difference of 10% or more")
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0., 1.)
+    low, high = wilson_interval(50, 100)
+    assert low == pytest.approx(1 - high)
+    assert low == pytest.approx(0.4038, abs=1e-4)
@@ -0,0 +1,75 @@
+import os
+import sys
+
+from showdown import zygote
+from showdown.store import Store, bot_files, fingerprint, print_head_to_head
+
+
+def record(winner, name_a="A", name_b="B"):
+    return {"winner": winner, "turns": 10,
+            "a": {"name": name_a}, "b": {"name": name_b}}
+
+
+def test_fingerprint_follows_the_script(tmp_path):
+    script = tmp_path / "bot.py"
+    script.write_text("print('bot')\n")
+    call_args = [sys.executable, str(script)]
+    before = fingerprint(call_args)
+    assert fingerprint(call_args) == before
+    assert fingerprint([*call_args, "other"]) != before
+    script.write_text("print('bot, improved')\n")
+    assert fingerprint(call_args) != before
+
+
+def test_fingerprint_of_an_example(tmp_path, monkeypatch):
+    monkeypatch.setattr(zygote, "EXAMPLES", str(tmp_path))
+    script = tmp_path / "bot.py"
+    script.write_text("print('bot')\n")
+    call_args = ["showdown", "example", "bot", "B"]
+    assert str(script) in bot_files(call_args)
+    before = fingerprint(call_args)
+    script.write_text("print('bot, improved')\n")
+    assert fingerprint(call_args) != before
+
+
+def test_bot_files_of_a_plugin():
+    files = list(bot_files(["py:showdown.examples.copycat:Copycat", "C"]))
+    assert [os.path.basename(path) for path in files] == ["copycat.py"]
+    assert list(bot_files(["py:no_such_module:Bot"])) == []
+
+
+def test_store(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = Store(path)
+    store.add_bot("fa", ["./a"])
+    store.add_bot("fb", ["./b"])
+    for winner in "abaa":
+        store.add("fa", "fb", record(winner))
+    store.add("fb", "fa", record("b"))
+    store.close()
+
+    store = Store(path)
+    try:
+        assert store.winners("fa", "fb", limit=3) == ["a", "b", "a"]
+        assert store.winners("fb", "fa", limit=10) == ["b"]
+        assert store.winners("fa", "fa", limit=10) == []
+        assert store.head_to_head() == [
+            ("./a @fa", "./b @fb", 4, 3, 1),
+            ("./b @fb", "./a @fa", 1, 0, 1),
+        ]
+    finally:
+        store.close()
+
+
+def test_print_head_to_head(tmp_path, capsys):
+    path = str(tmp_path / "results.db")
+    print_head_to_head(path)
+    assert capsys.readouterr().out == "No games\n"
+    store = Store(path)
+    store.add_bot("fa", ["./a"])
+    store.add_bot("fb", ["./b"])
+    store.add("fa", "fb", record("a"))
+    store.close()
+    print_head_to_head(path)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split() == ["./a", "@fa", "./b", "@fb", "1", "1", "0"]
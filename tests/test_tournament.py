@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from showdown.tournament import (ELO_SCALE, Z_95, bradley_terry,
+                                 pseudo_inverse, round_robin_pairings,
+                                 schedule, swiss_pairings)
+
+
+def test_bradley_terry_two_bots():
+    ratings, errors = bradley_terry({(0, 1): 30, (1, 0): 10}, 2)
+    # Closed form, with the virtual draw of PRIOR_GAMES
+    wins, losses = 30.5, 10.5
+    difference = ELO_SCALE * math.log(wins / losses)
+    assert ratings == pytest.approx([difference / 2, -difference / 2])
+    p = wins / (wins + losses)
+    information = (wins + losses) * p * (1 - p)
+    expected = Z_95 * ELO_SCALE * math.sqrt(1 / (4 * information))
+    assert errors == pytest.approx([expected, expected])
+
+
+def test_bradley_terry_equal_bots():
+    ratings, __ = bradley_terry({(0, 1): 5, (1, 0): 5, (1, 2): 5,
+                                 (2, 1): 5, (0, 2): 5, (2, 0): 5}, 3)
+    assert ratings == pytest.approx([0., 0., 0.], abs=1e-6)
+
+
+def test_bradley_terry_ranking():
+    # 0 beats 1 beats 2, and 0 never lost to 2
+    ratings, errors = bradley_terry(
+        {(0, 1): 15, (1, 0): 5, (1, 2): 15, (2, 1): 5, (0, 2): 20}, 3)
+    assert ratings[0] > ratings[1] > ratings[2]
+    assert sum(ratings) == pytest.approx(0., abs=1e-6)
+    assert all(0 < error < math.inf for error in errors)
+
+
+def test_bradley_terry_disconnected():
+    __, errors = bradley_terry({(0, 1): 3, (2, 3): 3}, 4)
+    assert errors == [math.inf] * 4
+
+
+def test_pseudo_inverse():
+    laplacian = [[2., -1., -1.], [-1., 1., 0.], [-1., 0., 1.]]
+    inverse = pseudo_inverse(laplacian)
+
+    def product(a, b):
+        return [[sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)]
+                for i in range(3)]
+    for row, expected in zip(product(product(laplacian, inverse), laplacian),
+                             laplacian):
+        assert row == pytest.approx(expected)
+
+
+def test_round_robin_schedule():
+    pairings = round_robin_pairings(3)
+    assert pairings == [(0, 1), (0, 2), (1, 2)]
+    games = list(schedule(pairings, 2))
+    assert len(games) == 12
+    # Both seat orders as often
+    for i, j in pairings:
+        assert games.count((i, j)) == games.count((j, i)) == 2
+
+
+def test_swiss_pairings():
+    played = {frozenset((0, 1))}
+    byes = set()
+    pairings = swiss_pairings([3, 2, 1, 0, 0], played, byes)
+    # The last bot sits out, the first two already met
+    assert byes == {4}
+    assert pairings == [(0, 2), (1, 3)]
+    # Not the same bot twice
+    swiss_pairings([3, 2, 1, 0, 0], played, byes)
+    assert byes == {3, 4}
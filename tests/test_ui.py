@@ -0,0 +1,108 @@
+import curses
+
+import pytest
+
+from showdown import game
+from showdown.game import Commands
+from showdown.ui import (CHARACTER_SIZE, DRAWINGS, draw_step,
+                         mirror_character, new_screen, sprite)
+
+
+class FakeWindow:
+    """
+    The parts of a curses window the UI uses, as a grid of characters.
+    """
+    def __init__(self, height=30, width=120):
+        self.height = height
+        self.width = width
+        self.cells = [[" "] * width for __ in range(height)]
+        self.erases = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def erase(self):
+        self.erases += 1
+        self.cells = [[" "] * self.width for __ in range(self.height)]
+
+    def addstr(self, y, x, text):
+        for i, char in enumerate(text):
+            if 0 <= y < self.height and 0 <= x + i < self.width:
+                self.cells[y][x + i] = char
+
+    def overwrite(self, window, *region):
+        if not region:
+            region = (0, 0, 0, 0, self.height - 1, self.width - 1)
+        source_y, source_x, min_y, min_x, max_y, max_x = region
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+                window.cells[y][x] = \
+                    self.cells[source_y + y - min_y][source_x + x - min_x]
+
+    def text(self):
+        return "\n".join("".join(row) for row in self.cells)
+
+
+@pytest.fixture
+def newwin(monkeypatch):
+    """
+    The windows created with curses.newwin.
+    """
+    windows = []
+
+    def newwin(height, width):
+        windows.append(FakeWindow(height, width))
+        return windows[-1]
+    monkeypatch.setattr(curses, "newwin", newwin)
+    return windows
+
+
+def state_after(*turns):
+    moves = bytes(game.encode_turn(command_a, command_b)
+                  for command_a, command_b in turns)
+    *__, state = game.GameState.from_record({
+        "a": {"name": "Alice"}, "b": {"name": "Bob"}, "moves": moves,
+        "description": "", "winner": None})
+    return state
+
+
+def frame(state, turn_step, end=False):
+    screen = new_screen(FakeWindow())
+    draw_step(screen, turn_step, state, end=end)
+    return screen["window"].text()
+
+
+def test_sprite():
+    lines = sprite("shoot", "A", False, "a")
+    assert lines == tuple(
+        DRAWINGS["shoot"].replace("i", "A").splitlines())
+    # Computed once
+    assert sprite("shoot", "A", False, "a") is lines
+    assert "x" in "".join(sprite("shoot", "A", True, "a"))
+    assert "o" not in "".join(sprite("shoot", "A", True, "a"))
+
+
+def test_sprite_mirrored():
+    lines = sprite("dodge", "B", False, "b")
+    assert all(len(line) == CHARACTER_SIZE for line in lines)
+    assert lines[1] == "/===\\ (o  )"
+    assert mirror_character(["(/"]) == [
+        " " * (CHARACTER_SIZE - 2) + "\\)"]
+
+
+def test_frames_match_full_redraws(newwin):
+    first = state_after((Commands.RELOAD, Commands.RELOAD))
+    second = state_after((Commands.RELOAD, Commands.RELOAD),
+                         (Commands.SHOOT, Commands.DODGE))
+    screen = new_screen(FakeWindow())
+    for state in [first, second]:
+        for turn_step in [0., 0.2, 0.4, 0.6, 0.8, 0.99]:
+            draw_step(screen, turn_step, state)
+            # Whatever moved on the previous frame is gone
+            assert screen["window"].text() == frame(state, turn_step)
+    draw_step(screen, 0., second, end=True)
+    assert screen["window"].text() == frame(second, 0., end=True)
+
+    # What only depends on the state is drawn once per state
+    static = newwin[0]
+    assert static.erases == 3
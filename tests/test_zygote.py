@@ -0,0 +1,123 @@
+import os
+import signal
+import sys
+import textwrap
+
+import pytest
+
+from showdown import game, zygote
+
+
+@pytest.fixture
+def script(tmp_path):
+    """
+    Call args of a Python script made of source.
+    """
+    def make(name, source):
+        path = tmp_path / f"{name}.py"
+        path.write_text(textwrap.dedent(source))
+        return [sys.executable, str(path)]
+    return make
+
+
+def run(call_args, stdin=b""):
+    """
+    Run call_args from their zygote: (stdout, exit code, rusage).
+    """
+    process = zygote.spawn_from_zygote(call_args)
+    try:
+        process.stdin.write(stdin)
+        process.stdin.close()
+        stdout = process.stdout.read()
+        __, __, rusage = process.wait4()
+        return stdout, process.poll(), rusage
+    finally:
+        process.close()
+
+
+def test_python_script(script, tmp_path):
+    call_args = script("bot", "")
+    assert zygote.python_script(call_args) == (
+        [sys.executable], call_args[1], call_args[1:])
+    assert zygote.python_script([sys.executable, "-c", "pass"]) is None
+    assert zygote.python_script(["true"]) is None
+    interpreter, path, argv = zygote.python_script(
+        ["showdown", "example", "randomizer", "R"])
+    assert path == os.path.join(zygote.EXAMPLES, "randomizer.py")
+    assert argv == [path, "R"]
+
+
+def test_spawn_runs_the_script(script):
+    echo = script("echo", """
+        import sys
+        print(*sys.argv[1:], input())
+        sys.exit(3)
+    """)
+    stdout, code, rusage = run([*echo, "a", "b"], stdin=b"c\n")
+    assert stdout == b"a b c\n"
+    assert code == 3
+    assert rusage.ru_utime >= 0
+
+
+def test_children_draw_different_numbers(script):
+    draw = script("draw", """
+        import random
+        print(random.random())
+    """)
+    assert len({run(draw)[0] for __ in range(3)}) == 3
+
+
+def test_children_reseed_numpy(script):
+    pytest.importorskip("numpy")
+    draw = script("draw", """
+        import numpy.random
+        print(numpy.random.random())
+    """)
+    assert len({run(draw)[0] for __ in range(3)}) == 3
+
+
+def test_kill(script):
+    sleeper = script("sleeper", """
+        print("ready", flush=True)
+        input()
+    """)
+    process = zygote.spawn_from_zygote(sleeper)
+    try:
+        assert process.stdout.readline() == b"ready\n"
+        assert process.poll() is None
+        process.kill()
+        assert process.wait(timeout=5) == -signal.SIGKILL
+    finally:
+        process.close()
+
+
+def test_kill_after_exit_does_not_signal(script, monkeypatch):
+    quitter = script("quitter", "")
+    process = zygote.spawn_from_zygote(quitter)
+    try:
+        assert process.wait(timeout=5) == 0
+        # The pid may belong to another process by now
+        monkeypatch.setattr(os, "kill", pytest.fail)
+        process.kill()
+        monkeypatch.undo()
+        # The zygote ignores children it already reaped
+        process.zygote.kill(process.pid)
+        assert run(quitter)[1] == 0
+    finally:
+        process.close()
+
+
+def test_run_game_with_zygote(script):
+    reloader = script("reloader", """
+        print("reloader", flush=True)
+        print("reload", flush=True)
+        while input() != "game_over":
+            print("reload", flush=True)
+    """)
+    for __ in range(2):
+        state = game.run_game(reloader, reloader, log_level="off",
+                              zygote=True)
+        result = game.result(state)
+        assert result["a"]["name"] == result["b"]["name"] == "reloader"
+        assert not result["a"]["crashed"] and not result["b"]["crashed"]
+        assert result["a"]["usage"] is not None